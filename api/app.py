@@ -1,17 +1,60 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
-import pyodbc
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import sys
+import threading
 from dotenv import load_dotenv
 import traceback
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.controllers.flight_controller import (
+    airline_list, cache_invalidator, cached_reference, flight_blueprint, load_top_routes, prefetch_top_routes,
+    render_search_snapshot, search_snapshot_store, snapshot_response, warm_reference_data
+)
+from api.database import AirlineRow, get_database, read_all, start_tracking, stop_tracking
+from api.services.flight_read_model import FlightReadModel
+from api.services.search_snapshots import SnapshotMaterializer
+from api.services.warmup import WarmUp
+
 load_dotenv()  # 載入 .env 檔案中的環境變數
 
+# 啟動預熱設定
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+# 預取今天與明天航班最多的航線數量
+WARMUP_TOP_ROUTES = int(os.getenv('WARMUP_TOP_ROUTES', '20'))
+# 等待讀取模型第一次載入的最長秒數
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '60'))
+
+# 熱門航線搜尋結果快照設定 (航線數量設為0時停用)
+SNAPSHOT_TOP_ROUTES = int(os.getenv('SNAPSHOT_TOP_ROUTES', '20'))
+SNAPSHOT_DAYS = int(os.getenv('SNAPSHOT_DAYS', '14'))
+# 重新選出熱門航線並產生所有快照的間隔(秒)，期間依航班變更紀錄只重新產生受影響的快照
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv('SNAPSHOT_REFRESH_SECONDS', '600'))
+
 app = Flask(__name__)
 CORS(app)  # 啟用跨域資源共享
 
+# 依請求統計資料庫查詢與連接次數，有查詢的請求會記錄摘要，便於發現逐筆查詢
+@app.before_request
+def start_query_tracking():
+    g.query_stats, g.query_tracking_token = start_tracking(f"{request.method} {request.path}")
+
+@app.teardown_request
+def stop_query_tracking(exception=None):
+    token = g.pop('query_tracking_token', None)
+    if token is None:
+        return
+    stop_tracking(token)
+    stats = g.pop('query_stats')
+    if stats.queries or stats.connections:
+        app.logger.info(stats.summary())
+
 # 添加根路由
 @app.route('/')
 def index():
@@ -23,59 +66,50 @@ def index():
             "GET /api/destinations?departure=AIRPORT_CODE": "獲取可直飛的目的地列表",
             "GET /api/airlines": "獲取航空公司列表",
             "GET /api/airlines?departure=AIRPORT_CODE&destination=AIRPORT_CODE": "獲取特定航線的航空公司",
-            "GET /api/flights?departure=AIRPORT_CODE&destination=AIRPORT_CODE&date=YYYY-MM-DD&airline=AIRLINE_CODE": "搜尋航班"
+            "GET /api/flights?departure=AIRPORT_CODE&destination=AIRPORT_CODE&date=YYYY-MM-DD&airline=AIRLINE_CODE": "搜尋航班",
+            "GET /api/airports/suggest?q=QUERY": "機場自動完成建議",
+            "GET /api/flights/stream?flights=FLIGHT_NUMBERS&routes=DEP-ARR&airports=AIRPORT_CODES": "航班狀態變更事件串流 (SSE)",
+            "GET /api/replica/status": "本地唯讀副本同步狀態",
+            "GET /ready": "啟動預熱是否完成 (未完成時返回503)"
         },
         "documentation": "請參閱 README.md 了解更多信息"
     })
 
-# 資料庫連接設定
-DB_CONFIG = {
-    'driver': '{SQL Server}',
-    'server': 'LAPTOP-QJNCMBU4',
-    'database': 'FlightBookingDB',
-    'uid': 'sa',
-    'pwd': 'Id1001624',
-    'trusted_connection': 'no'
-}
-
-def get_db_connection():
-    """建立與 MSSQL 資料庫的連接"""
-    try:
-        connection_string = f"DRIVER={DB_CONFIG['driver']};SERVER={DB_CONFIG['server']};DATABASE={DB_CONFIG['database']};UID={DB_CONFIG['uid']};PWD={DB_CONFIG['pwd']}"
-        print(f"嘗試連接資料庫，連接字串: {connection_string}")
-        conn = pyodbc.connect(connection_string)
-        print("成功連接到資料庫!")
-        return conn
-    except Exception as e:
-        print(f"資料庫連接錯誤: {str(e)}")
-        traceback.print_exc()
-        raise e
+def domestic_airports():
+    """國內出發機場列表 (參考資料快取)"""
+    return cached_reference('airports.domestic', lambda: read_all('airports.domestic', row_type=dict))
+
+def destinations_from(departure):
+    """可從指定機場直飛的目的地列表 (參考資料快取)"""
+    return cached_reference(
+        f'airports.destinations:{departure.upper()}',
+        lambda: read_all('airports.destinations', (departure,), row_type=dict)
+    )
+
+def airlines_for_route(departure, destination):
+    """經營指定航線的航空公司列表 (參考資料快取)"""
+    return cached_reference(
+        f'airlines.for_route:{departure.upper()}-{destination.upper()}',
+        lambda: read_all('airlines.for_route', (departure, destination), row_type=AirlineRow)
+    )
 
 @app.route('/api/airports', methods=['GET'])
 def get_airports():
     """獲取國內出發機場列表"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # 查詢國內機場
         print("執行機場查詢...")
-        cursor.execute("""
-            SELECT airport_id as code, airport_name_zh as name, city_zh as city 
-            FROM Airports 
-            WHERE airport_id IN ('TPE', 'TSA', 'KHH', 'RMQ', 'TNN', 'TTT', 'HUN')
-        """)
+        rows = domestic_airports()
         
         airports = []
-        for row in cursor.fetchall():
+        for row in rows:
             airports.append({
-                'code': row.code,
-                'name': row.name,
-                'city': row.city
+                'code': row['code'],
+                'name': row['name'],
+                'city': row['city']
             })
         
         print(f"找到 {len(airports)} 個機場")
-        conn.close()
         return jsonify(airports)
     
     except Exception as e:
@@ -92,28 +126,19 @@ def get_destinations():
         return jsonify({"error": "需要提供出發機場代碼"}), 400
         
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # 查詢可直飛的目的地
         print(f"查詢從 {departure} 出發的目的地...")
-        cursor.execute("""
-            SELECT DISTINCT f.arrival_airport_code as code, a.airport_name_zh as name, a.city_zh as city 
-            FROM Flights f 
-            JOIN Airports a ON f.arrival_airport_code = a.airport_id 
-            WHERE f.departure_airport_code = ?
-        """, (departure,))
+        rows = destinations_from(departure)
         
         destinations = []
-        for row in cursor.fetchall():
+        for row in rows:
             destinations.append({
-                'code': row.code,
-                'name': row.name,
-                'city': row.city
+                'code': row['code'],
+                'name': row['name'],
+                'city': row['city']
             })
         
         print(f"找到 {len(destinations)} 個從 {departure} 可直飛的目的地")
-        conn.close()
         return jsonify(destinations)
     
     except Exception as e:
@@ -131,21 +156,17 @@ def get_airlines():
         # 如果沒有指定出發地和目的地，返回所有航空公司
         if not departure and not destination:
             try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
                 print("獲取所有航空公司...")
-                cursor.execute("SELECT airline_id as id, airline_name_zh as name FROM Airlines")
+                rows = airline_list()
                 
                 airlines = []
-                for row in cursor.fetchall():
+                for row in rows:
                     airlines.append({
                         'id': row.id,
                         'name': row.name
                     })
                 
                 print(f"找到 {len(airlines)} 個航空公司")
-                conn.close()
                 return jsonify(airlines)
             
             except Exception as e:
@@ -156,27 +177,18 @@ def get_airlines():
             return jsonify({"error": "需要同時提供出發機場和目的地機場"}), 400
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # 查詢特定航線的航空公司
         print(f"查詢 {departure} -> {destination} 航線的航空公司...")
-        cursor.execute("""
-            SELECT DISTINCT al.airline_id as id, al.airline_name_zh as name 
-            FROM Flights f 
-            JOIN Airlines al ON f.airline_id = al.airline_id 
-            WHERE f.departure_airport_code = ? AND f.arrival_airport_code = ?
-        """, (departure, destination))
+        rows = airlines_for_route(departure, destination)
         
         airlines = []
-        for row in cursor.fetchall():
+        for row in rows:
             airlines.append({
                 'id': row.id,
                 'name': row.name
             })
         
         print(f"找到 {len(airlines)} 個經營 {departure} -> {destination} 航線的航空公司")
-        conn.close()
         return jsonify(airlines)
     
     except Exception as e:
@@ -184,6 +196,129 @@ def get_airlines():
         traceback.print_exc()
         return jsonify({"error": str(e), "error_details": traceback.format_exc()}), 500
 
+def load_read_model_flights(start, end, since):
+    """取得讀取模型所需的航班 (起飛時間在 [start, end) 之間且 updated_at 不早於 since)"""
+    return get_database().fetch_all('flights.read_model', [start, end, since], row_type=dict)
+
+# 記憶體航班讀取模型，第一次查詢航班時才開始載入
+flight_read_model = FlightReadModel(load_read_model_flights)
+
+def query_read_model(departure, destination, date, airline):
+    """
+    從讀取模型查詢指定日期的航班
+
+    返回:
+        航班列表，日期不在讀取模型範圍內或資料過期時返回None
+    """
+    try:
+        day_start = datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        return None
+    if not flight_read_model.covers(day_start.date()):
+        return None
+    
+    flights = flight_read_model.query(departure, destination, day_start, day_start + timedelta(days=1), airline)
+    return [{
+        'flight_number': flight['flight_number'],
+        'airline_id': flight['airline_id'],
+        'airline_name': flight['airline_name'],
+        'departure_airport_code': flight['departure_airport_code'],
+        'arrival_airport_code': flight['arrival_airport_code'],
+        'scheduled_departure': flight['scheduled_departure'].isoformat() if flight['scheduled_departure'] else None,
+        'scheduled_arrival': flight['scheduled_arrival'].isoformat() if flight['scheduled_arrival'] else None,
+        'flight_status': flight['flight_status'],
+        'aircraft_type': flight['aircraft_type'],
+        'price': str(flight['price']) if flight['price'] else None
+    } for flight in flights]
+
+def query_flights_from_db(departure, destination, date=None, airline=None):
+    """
+    從資料庫查詢航班
+
+    參數:
+        departure: 出發機場代碼
+        destination: 目的地機場代碼
+        date: (可選) 日期 (YYYY-MM-DD)
+        airline: (可選) 航空公司ID
+
+    返回:
+        依起飛時間排序的航班列表
+    """
+    # 查詢條件依參數組合，不使用具名查詢
+    query = """
+        SELECT 
+            f.flight_number,
+            f.airline_id,
+            f.departure_airport_code,
+            f.arrival_airport_code,
+            f.scheduled_departure,
+            f.scheduled_arrival,
+            f.flight_status,
+            f.aircraft_type,
+            f.price,
+            a.airline_name_zh as airline_name
+        FROM Flights f
+        JOIN Airlines a ON f.airline_id = a.airline_id
+        WHERE f.departure_airport_code = ?
+        AND f.arrival_airport_code = ?
+    """
+    
+    params = [departure, destination]
+    
+    # 增加日期條件（如果提供）
+    if date:
+        query += " AND CONVERT(date, f.scheduled_departure) = ?"
+        params.append(date)
+    
+    # 增加航空公司條件（如果提供）
+    if airline:
+        query += " AND f.airline_id = ?"
+        params.append(airline)
+    
+    # 按照起飛時間排序
+    query += " ORDER BY f.scheduled_departure"
+    
+    print(f"執行航班查詢: {departure} -> {destination}" + (f", 日期: {date}" if date else "") + (f", 航空公司: {airline}" if airline else ""))
+    print(f"SQL查詢: {query}")
+    print(f"參數: {params}")
+    
+    with get_database().session(readonly=True) as session:
+        rows = session.cursor.execute(query, params).fetchall()
+    
+    flights = []
+    for row in rows:
+        # 將 datetime 轉為 ISO 格式字符串
+        try:
+            # 檢查是否為字符串，如果是則已經格式化過了
+            if isinstance(row.scheduled_departure, str):
+                scheduled_departure = row.scheduled_departure
+            else:
+                scheduled_departure = row.scheduled_departure.isoformat() if row.scheduled_departure else None
+            
+            if isinstance(row.scheduled_arrival, str):
+                scheduled_arrival = row.scheduled_arrival
+            else:
+                scheduled_arrival = row.scheduled_arrival.isoformat() if row.scheduled_arrival else None
+        except Exception as e:
+            print(f"日期格式轉換錯誤: {e}")
+            # 如果格式化失敗，使用原值
+            scheduled_departure = str(row.scheduled_departure) if row.scheduled_departure else None
+            scheduled_arrival = str(row.scheduled_arrival) if row.scheduled_arrival else None
+        
+        flights.append({
+            'flight_number': row.flight_number,
+            'airline_id': row.airline_id,
+            'airline_name': row.airline_name,
+            'departure_airport_code': row.departure_airport_code,
+            'arrival_airport_code': row.arrival_airport_code,
+            'scheduled_departure': scheduled_departure,
+            'scheduled_arrival': scheduled_arrival,
+            'flight_status': row.flight_status,
+            'aircraft_type': row.aircraft_type,
+            'price': str(row.price) if row.price else None
+        })
+    return flights
+
 @app.route('/api/flights', methods=['GET'])
 def get_flights():
     """獲取符合條件的航班"""
@@ -195,84 +330,23 @@ def get_flights():
     if not departure or not destination:
         return jsonify({"error": "需要提供出發機場和目的地機場"}), 400
     
+    # 熱門航線直接回傳預先產生的快照
+    if date and set(request.args) <= {'departure', 'destination', 'date'}:
+        snapshot = search_snapshot_store.get(('flights', departure, destination, date))
+        if snapshot is not None:
+            return snapshot_response(snapshot)
+    
+    # 指定日期在讀取模型範圍內時直接從記憶體回應，不查詢資料庫
+    flight_read_model.start()
+    if date:
+        flights = query_read_model(departure, destination, date, airline)
+        if flights is not None:
+            print(f"從讀取模型找到 {len(flights)} 個符合條件的航班")
+            return jsonify(flights)
+    
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                f.flight_number,
-                f.airline_id,
-                f.departure_airport_code,
-                f.arrival_airport_code,
-                f.scheduled_departure,
-                f.scheduled_arrival,
-                f.flight_status,
-                f.aircraft_type,
-                f.price,
-                a.airline_name_zh as airline_name
-            FROM Flights f
-            JOIN Airlines a ON f.airline_id = a.airline_id
-            WHERE f.departure_airport_code = ?
-            AND f.arrival_airport_code = ?
-        """
-        
-        params = [departure, destination]
-        
-        # 增加日期條件（如果提供）
-        if date:
-            query += " AND CONVERT(date, f.scheduled_departure) = ?"
-            params.append(date)
-        
-        # 增加航空公司條件（如果提供）
-        if airline:
-            query += " AND f.airline_id = ?"
-            params.append(airline)
-        
-        # 按照起飛時間排序
-        query += " ORDER BY f.scheduled_departure"
-        
-        print(f"執行航班查詢: {departure} -> {destination}" + (f", 日期: {date}" if date else "") + (f", 航空公司: {airline}" if airline else ""))
-        print(f"SQL查詢: {query}")
-        print(f"參數: {params}")
-        
-        cursor.execute(query, params)
-        
-        flights = []
-        for row in cursor.fetchall():
-            # 將 datetime 轉為 ISO 格式字符串
-            try:
-                # 檢查是否為字符串，如果是則已經格式化過了
-                if isinstance(row.scheduled_departure, str):
-                    scheduled_departure = row.scheduled_departure
-                else:
-                    scheduled_departure = row.scheduled_departure.isoformat() if row.scheduled_departure else None
-                
-                if isinstance(row.scheduled_arrival, str):
-                    scheduled_arrival = row.scheduled_arrival
-                else:
-                    scheduled_arrival = row.scheduled_arrival.isoformat() if row.scheduled_arrival else None
-            except Exception as e:
-                print(f"日期格式轉換錯誤: {e}")
-                # 如果格式化失敗，使用原值
-                scheduled_departure = str(row.scheduled_departure) if row.scheduled_departure else None
-                scheduled_arrival = str(row.scheduled_arrival) if row.scheduled_arrival else None
-            
-            flights.append({
-                'flight_number': row.flight_number,
-                'airline_id': row.airline_id,
-                'airline_name': row.airline_name,
-                'departure_airport_code': row.departure_airport_code,
-                'arrival_airport_code': row.arrival_airport_code,
-                'scheduled_departure': scheduled_departure,
-                'scheduled_arrival': scheduled_arrival,
-                'flight_status': row.flight_status,
-                'aircraft_type': row.aircraft_type,
-                'price': str(row.price) if row.price else None
-            })
-        
+        flights = query_flights_from_db(departure, destination, date, airline)
         print(f"找到 {len(flights)} 個符合條件的航班")
-        conn.close()
         return jsonify(flights)
     
     except Exception as e:
@@ -280,5 +354,99 @@ def get_flights():
         traceback.print_exc()
         return jsonify({"error": str(e), "error_details": traceback.format_exc()}), 500
 
+# 註冊航班控制器藍圖 (/api/airports/details、/api/flights/search 等)
+# 於上方路由之後註冊，與上方重複的路徑仍由上方處理
+app.register_blueprint(flight_blueprint, url_prefix='/api')
+
+# 熱門航線搜尋結果快照，匯入或即時更新寫入航班後由變更紀錄觸發重新產生
+search_snapshots = SnapshotMaterializer(
+    search_snapshot_store,
+    load_top_routes,
+    app.json.dumps,
+    days=SNAPSHOT_DAYS,
+    route_limit=SNAPSHOT_TOP_ROUTES,
+    interval=SNAPSHOT_REFRESH_SECONDS
+)
+search_snapshots.add_renderer('search', render_search_snapshot)
+search_snapshots.add_renderer('flights', lambda departure, destination, date: query_flights_from_db(departure, destination, date))
+cache_invalidator.subscribe(search_snapshots.notify)
+
+def start_snapshots():
+    """產生熱門航線快照並開始背景更新"""
+    if SNAPSHOT_TOP_ROUTES <= 0:
+        return None
+    cache_invalidator.start()
+    count = search_snapshots.materialize_all() if search_snapshots.last_full_run is None else 0
+    search_snapshots.start()
+    return count
+
+def warm_reference():
+    """載入參考資料"""
+    counts = warm_reference_data()
+    counts['domestic_airports'] = len(domestic_airports())
+    return counts
+
+def warm_read_model():
+    """開始刷新讀取模型並等待第一次載入完成"""
+    flight_read_model.start()
+    if not flight_read_model.wait_loaded(WARMUP_TIMEOUT):
+        raise TimeoutError(f"讀取模型在 {WARMUP_TIMEOUT} 秒內未完成載入")
+    return flight_read_model.get_stats()
+
+def warm_top_routes():
+    """預取今天與明天熱門航線的搜尋結果、航空公司與目的地"""
+    today = datetime.now().date()
+    routes = prefetch_top_routes([today, today + timedelta(days=1)], WARMUP_TOP_ROUTES)
+    for departure, destination in routes:
+        airlines_for_route(departure, destination)
+    for departure in {departure for departure, _ in routes}:
+        destinations_from(departure)
+    return [f"{departure}-{destination}" for departure, destination in routes]
+
+# 啟動預熱：由 start_background_services 在背景執行，完成前 /ready 返回503
+warmup = WarmUp()
+warmup.add_step('connections', lambda: get_database().warm())
+warmup.add_step('reference_data', warm_reference)
+warmup.add_step('read_model', warm_read_model)
+warmup.add_step('top_routes', warm_top_routes)
+warmup.add_step('snapshots', start_snapshots)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """就緒檢查，預熱完成前返回503"""
+    status = warmup.get_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_background_services():
+    """
+    啟動預熱與背景更新 (重複呼叫只執行一次)
+    匯入此模組 (測試、工具或 WSGI 主行程) 不會啟動；由開發伺服器啟動時或 worker 收到第一個請求時呼叫，
+    WSGI 伺服器也可在 worker 建立後 (如 gunicorn 的 post_fork) 直接呼叫以提早預熱
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    
+    if WARMUP_ENABLED:
+        warmup.start()
+    else:
+        warmup.skip()
+        if SNAPSHOT_TOP_ROUTES > 0:
+            cache_invalidator.start()
+            search_snapshots.start()
+
+@app.before_request
+def ensure_background_services():
+    if not _services_started:
+        start_background_services()
+
 if __name__ == '__main__':
+    # 除錯模式的重新載入器會先啟動只負責監看檔案的行程，只在實際處理請求的子行程中啟動
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(debug=True, port=5000)
\ No newline at end of file
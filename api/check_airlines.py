@@ -1,7 +1,15 @@
+import os
 import pyodbc
 import traceback
 import sys
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import connect, get_connection_string
+
 # 將輸出重定向到文件
 original_stdout = sys.stdout
 log_file = open('database_check.log', 'w', encoding='utf-8')
@@ -10,16 +18,8 @@ sys.stdout = log_file
 def get_db_connection():
     try:
         print("嘗試連接資料庫...")
-        conn_str = (
-            'DRIVER={SQL Server};'
-            'SERVER=LAPTOP-QJNCMBU4;'
-            'DATABASE=FlightBookingDB;'
-            'UID=sa;'
-            'PWD=Id1001624;'
-            'Trusted_Connection=yes;'
-        )
-        print(f"連接字串: {conn_str}")
-        conn = pyodbc.connect(conn_str)
+        print(f"連接字串: {get_connection_string()}")
+        conn = connect()
         print("資料庫連接成功！")
         return conn
     except Exception as e:
@@ -1,13 +1,27 @@
 """
 航班控制器 - 處理航班搜尋、機場和航空公司相關的API請求
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import os
 import json
 from pathlib import Path
 import datetime
-import pyodbc
 import logging
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+from api.database import (
+    AirlineRow, AirportRow, FlightChangeRow, FlightRow, FlightStatusRow, fetch_flight_changes, fetch_route_summaries,
+    get_database, get_replica, latest_flight_change_id, read_all, route_summary_signature
+)
+from api.database.replica import REPLICA_PATH, REPLICA_SYNC_SECONDS
+from api.services.airport_index import AirportIndex
+from api.services.cache import get_cache
+from api.services.cache_invalidation import CacheInvalidator
+from api.services.flight_status_cache import get_status_cache, make_status_entry, make_status_key
+from api.services.route_table import RouteTable
+from api.services.search_snapshots import SnapshotStore
+from api.services.status_events import StatusChangePoller, event_matches, get_event_hub
 
 # 設定日誌
 logging.basicConfig(
@@ -19,69 +33,177 @@ logger = logging.getLogger('flight_controller')
 # 創建藍圖
 flight_blueprint = Blueprint('flights', __name__)
 
-# 獲取資料庫連接字串
-def get_db_connection():
-    """獲取資料庫連接"""
-    try:
-        # 嘗試從環境變數獲取
-        connection_string = os.getenv('DB_CONNECTION_STRING')
-        
-        # 如果環境變數不存在，使用預設連接字串
-        if not connection_string:
-            connection_string = 'Driver={ODBC Driver 17 for SQL Server};Server=localhost;Database=FlightBookingDB;Trusted_Connection=yes;'
-            logger.warning("找不到環境變數DB_CONNECTION_STRING，使用預設連接字串")
-        
-        conn = pyodbc.connect(connection_string)
-        return conn
-    except Exception as e:
-        logger.error(f"資料庫連接失敗: {e}")
-        return None
+# 來回程搜尋時並行查詢去程與回程
+search_executor = ThreadPoolExecutor(max_workers=int(os.getenv('SEARCH_WORKERS', '8')), thread_name_prefix='flight-search')
+
+# 批次航班狀態查詢的最大航班數
+MAX_STATUS_KEYS = 200
+
+# 來回程組合的排序方式與預設回傳數量
+PAIR_SORT_OPTIONS = ('price', 'duration')
+DEFAULT_PAIR_LIMIT = 20
+
+# 航班搜尋結果與參考資料 (機場、航空公司) 的快取，多個 worker 時可設定 CACHE_BACKEND=redis 共用
+search_cache = get_cache('search', default_ttl=float(os.getenv('SEARCH_CACHE_TTL', '60')))
+reference_cache = get_cache('reference', default_ttl=float(os.getenv('REFERENCE_CACHE_TTL', '300')))
+# 航班變更紀錄的輪詢間隔(秒)，寫入的航線與日期在此時間內從快取中清除
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv('CACHE_INVALIDATION_POLL_SECONDS', '5'))
+# 航線表檢查 RouteSummary 是否變更的間隔(秒)
+ROUTE_TABLE_CHECK_SECONDS = float(os.getenv('ROUTE_TABLE_CHECK_SECONDS', '30'))
+
+# 航班狀態事件串流的心跳間隔與資料庫輪詢間隔(秒)
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+STATUS_POLL_SECONDS = float(os.getenv('STATUS_POLL_SECONDS', '5'))
+# 狀態變更輪詢器啟動時載入比對基準的範圍: 昨天起到未來幾天內起飛的航班
+STATUS_WATCH_DAYS = int(os.getenv('STATUS_WATCH_DAYS', '3'))
+
+# 備用機場城市資料 (資料庫無法使用時)
+FALLBACK_AIRPORT_DETAILS = [
+    {"code": "TPE", "name": "台灣桃園國際機場", "city_zh": "桃園", "country": "TW", "country_name": "台灣"},
+    {"code": "TSA", "name": "台北松山機場", "city_zh": "臺北", "country": "TW", "country_name": "台灣"},
+    {"code": "KHH", "name": "高雄國際機場", "city_zh": "高雄", "country": "TW", "country_name": "台灣"},
+    {"code": "RMQ", "name": "台中清泉崗機場", "city_zh": "台中", "country": "TW", "country_name": "台灣"},
+    {"code": "TTT", "name": "台東機場", "city_zh": "臺東", "country": "TW", "country_name": "台灣"},
+    {"code": "KYD", "name": "蘭嶼機場", "city_zh": "臺東", "country": "TW", "country_name": "台灣"},
+    {"code": "KNH", "name": "金門機場", "city_zh": "金門", "country": "TW", "country_name": "台灣"},
+    {"code": "MZG", "name": "澎湖馬公機場", "city_zh": "澎湖", "country": "TW", "country_name": "台灣"},
+    {"code": "HUN", "name": "花蓮機場", "city_zh": "花蓮", "country": "TW", "country_name": "台灣"},
+    {"code": "GNI", "name": "綠島機場", "city_zh": "臺東", "country": "TW", "country_name": "台灣"},
+    {"code": "MFK", "name": "北竿機場", "city_zh": "連江", "country": "TW", "country_name": "台灣"},
+    {"code": "LZN", "name": "南竿機場", "city_zh": "連江", "country": "TW", "country_name": "台灣"},
+    {"code": "TNN", "name": "台南機場", "city_zh": "台南", "country": "TW", "country_name": "台灣"},
+    {"code": "CMJ", "name": "七美機場", "city_zh": "澎湖", "country": "TW", "country_name": "台灣"},
+    {"code": "WOT", "name": "望安機場", "city_zh": "澎湖", "country": "TW", "country_name": "台灣"},
+    
+    {"code": "HND", "name": "東京羽田機場", "city_zh": "東京", "country": "JP", "country_name": "日本"},
+    {"code": "NRT", "name": "東京成田國際機場", "city_zh": "東京", "country": "JP", "country_name": "日本"},
+    {"code": "KIX", "name": "大阪關西國際機場", "city_zh": "大阪", "country": "JP", "country_name": "日本"},
+    {"code": "FUK", "name": "福岡機場", "city_zh": "福岡", "country": "JP", "country_name": "日本"},
+    {"code": "CTS", "name": "札幌新千歲機場", "city_zh": "札幌", "country": "JP", "country_name": "日本"},
+    {"code": "NGO", "name": "名古屋中部國際機場", "city_zh": "名古屋", "country": "JP", "country_name": "日本"},
+    {"code": "OKA", "name": "沖繩那霸機場", "city_zh": "沖繩", "country": "JP", "country_name": "日本"},
+    
+    {"code": "HKG", "name": "香港國際機場", "city_zh": "香港", "country": "HK", "country_name": "香港"},
+    {"code": "ICN", "name": "首爾仁川國際機場", "city_zh": "首爾", "country": "KR", "country_name": "韓國"},
+    {"code": "GMP", "name": "首爾金浦國際機場", "city_zh": "首爾", "country": "KR", "country_name": "韓國"},
+    {"code": "PVG", "name": "上海浦東國際機場", "city_zh": "上海", "country": "CN", "country_name": "中國大陸"},
+    {"code": "PEK", "name": "北京首都國際機場", "city_zh": "北京", "country": "CN", "country_name": "中國大陸"},
+    {"code": "SIN", "name": "新加坡樟宜機場", "city_zh": "新加坡", "country": "SG", "country_name": "新加坡"},
+    {"code": "BKK", "name": "曼谷素萬那普機場", "city_zh": "曼谷", "country": "TH", "country_name": "泰國"},
+    {"code": "MNL", "name": "馬尼拉尼諾伊阿基諾國際機場", "city_zh": "馬尼拉", "country": "PH", "country_name": "菲律賓"},
+    
+    {"code": "HIJ", "name": "廣島機場", "city_zh": "廣島", "country": "JP", "country_name": "日本"},
+    {"code": "SDJ", "name": "仙台機場", "city_zh": "仙台", "country": "JP", "country_name": "日本"},
+    {"code": "KIJ", "name": "新潟機場", "city_zh": "新潟", "country": "JP", "country_name": "日本"},
+    {"code": "ADL", "name": "阿德萊德機場", "city_zh": "阿德萊德", "country": "AU", "country_name": "澳洲"},
+    {"code": "ANC", "name": "安克拉治機場", "city_zh": "安克拉治", "country": "US", "country_name": "美國"}
+]
+
+# 備用航線資料 (航線表尚未載入，如資料庫無法使用時)
+FALLBACK_ROUTES = [
+    # 德安航空航線
+    {"departure": "TTT", "arrival": "GNI", "airline": "DA"},  # 台東 -> 綠島
+    {"departure": "GNI", "arrival": "TTT", "airline": "DA"},  # 綠島 -> 台東
+    {"departure": "TTT", "arrival": "KYD", "airline": "DA"},  # 台東 -> 蘭嶼
+    {"departure": "KYD", "arrival": "TTT", "airline": "DA"},  # 蘭嶼 -> 台東
+    {"departure": "KHH", "arrival": "CMJ", "airline": "DA"},  # 高雄 -> 七美
+    {"departure": "CMJ", "arrival": "KHH", "airline": "DA"},  # 七美 -> 高雄
+    {"departure": "KHH", "arrival": "WOT", "airline": "DA"},  # 高雄 -> 望安
+    {"departure": "WOT", "arrival": "KHH", "airline": "DA"},  # 望安 -> 高雄
+    {"departure": "MZG", "arrival": "CMJ", "airline": "DA"},  # 馬公 -> 七美
+    {"departure": "CMJ", "arrival": "MZG", "airline": "DA"},  # 七美 -> 馬公
+    
+    # 主要國際航線 (範例)
+    {"departure": "TPE", "arrival": "HKG"},  # 台北 -> 香港
+    {"departure": "HKG", "arrival": "TPE"},  # 香港 -> 台北
+    {"departure": "TPE", "arrival": "NRT"},  # 台北 -> 東京成田
+    {"departure": "NRT", "arrival": "TPE"},  # 東京成田 -> 台北
+    {"departure": "TPE", "arrival": "HND"},  # 台北 -> 東京羽田
+    {"departure": "HND", "arrival": "TPE"},  # 東京羽田 -> 台北
+    {"departure": "TPE", "arrival": "ICN"},  # 台北 -> 首爾仁川
+    {"departure": "ICN", "arrival": "TPE"},  # 首爾仁川 -> 台北
+    {"departure": "TPE", "arrival": "KIX"},  # 台北 -> 大阪關西
+    {"departure": "KIX", "arrival": "TPE"},  # 大阪關西 -> 台北
+    {"departure": "TPE", "arrival": "BKK"},  # 台北 -> 曼谷
+    {"departure": "BKK", "arrival": "TPE"},  # 曼谷 -> 台北
+    {"departure": "TPE", "arrival": "SIN"},  # 台北 -> 新加坡
+    {"departure": "SIN", "arrival": "TPE"},  # 新加坡 -> 台北
+    
+    # 台灣國內主要航線
+    {"departure": "TSA", "arrival": "KHH"},  # 台北松山 -> 高雄
+    {"departure": "KHH", "arrival": "TSA"},  # 高雄 -> 台北松山
+    {"departure": "TSA", "arrival": "MZG"},  # 台北松山 -> 澎湖
+    {"departure": "MZG", "arrival": "TSA"},  # 澎湖 -> 台北松山
+    {"departure": "TSA", "arrival": "KNH"},  # 台北松山 -> 金門
+    {"departure": "KNH", "arrival": "TSA"},  # 金門 -> 台北松山
+    {"departure": "TSA", "arrival": "TTT"},  # 台北松山 -> 台東
+    {"departure": "TTT", "arrival": "TSA"},  # 台東 -> 台北松山
+    {"departure": "TSA", "arrival": "HUN"},  # 台北松山 -> 花蓮
+    {"departure": "HUN", "arrival": "TSA"},  # 花蓮 -> 台北松山
+    {"departure": "TSA", "arrival": "RMQ"},  # 台北松山 -> 台中
+    {"departure": "RMQ", "arrival": "TSA"},  # 台中 -> 台北松山
+    {"departure": "KHH", "arrival": "HUN"},  # 高雄 -> 花蓮
+    {"departure": "HUN", "arrival": "KHH"},  # 花蓮 -> 高雄
+]
+
+# 國家名稱對應
+COUNTRY_NAMES = {
+    'TW': '台灣',
+    'JP': '日本',
+    'KR': '韓國',
+    'CN': '中國大陸',
+    'HK': '香港',
+    'SG': '新加坡',
+    'TH': '泰國',
+    'PH': '菲律賓',
+    'US': '美國',
+    'CA': '加拿大',
+    'AU': '澳洲',
+    'NZ': '紐西蘭',
+    'UK': '英國',
+    'FR': '法國',
+    'DE': '德國',
+    'IT': '義大利',
+    'ES': '西班牙'
+}
+
+def cached_reference(name, loader):
+    """
+    取得參考資料，快取未命中時呼叫 loader 載入
+
+    參數:
+        name: 快取鍵
+        loader: 載入函數
+
+    返回:
+        參考資料 (空結果不寫入快取)
+    """
+    cache_invalidator.start()
+    value = reference_cache.get(name)
+    if value is None:
+        value = loader()
+        if value:
+            reference_cache.set(name, value)
+    return value
+
+def airport_list():
+    """機場列表 (參考資料快取)"""
+    return cached_reference('airports.list', lambda: read_all('airports.list', row_type=AirportRow))
+
+def airline_list():
+    """航空公司列表 (參考資料快取)"""
+    return cached_reference('airlines.list', lambda: read_all('airlines.list', row_type=AirlineRow))
 
 # 機場列表端點
 @flight_blueprint.route('/airports', methods=['GET'])
 def get_airports():
     """獲取所有機場列表"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            # 如果無法連接到資料庫，使用備用資料
-            logger.warning("資料庫連接失敗，使用備用機場資料")
-            fallback_airports = [
-                {"code": "TPE", "name": "台灣桃園國際機場"},
-                {"code": "TSA", "name": "台北松山機場"},
-                {"code": "KHH", "name": "高雄國際機場"},
-                {"code": "RMQ", "name": "台中國際機場"},
-                {"code": "HND", "name": "東京羽田機場"},
-                {"code": "NRT", "name": "東京成田國際機場"},
-                {"code": "HKG", "name": "香港國際機場"},
-                {"code": "ICN", "name": "首爾仁川國際機場"},
-                {"code": "TTT", "name": "台東機場"},
-                {"code": "KYD", "name": "蘭嶼機場"},
-                {"code": "KNH", "name": "金門機場"},
-                {"code": "MZG", "name": "馬公機場"}
-            ]
-            return jsonify(fallback_airports)
-
         # 查詢資料庫中的機場資料
-        cursor = conn.cursor()
-        query = """
-        SELECT airport_id as code, airport_name_zh as name 
-        FROM Airports 
-        ORDER BY airport_name_zh
-        """
-        
-        cursor.execute(query)
+        rows = airport_list()
         
         # 將查詢結果轉換為字典列表
-        airports = []
-        for row in cursor.fetchall():
-            airports.append({
-                "code": row.code,
-                "name": row.name
-            })
-        
-        cursor.close()
-        conn.close()
+        airports = [{"code": row.code, "name": row.name} for row in rows]
         
         # 如果沒有找到任何資料，使用備用資料
         if not airports:
@@ -113,164 +235,99 @@ def get_airports():
         ]
         return jsonify(fallback_airports)
 
+def load_airport_details(use_cache=True):
+    """
+    從資料庫載入機場資料，包含城市與國家名稱
+    無法連接資料庫或沒有資料時回傳備用資料
+
+    參數:
+        use_cache: 是否使用參考資料快取；機場索引在資料版本變更時重建，需略過快取直接讀取，
+                   讀到的資料同時寫回快取
+    """
+    try:
+        # 查詢資料庫中的機場資料，包含城市名稱
+        if use_cache:
+            rows = cached_reference('airports.details', lambda: read_all('airports.details', row_type=AirportRow))
+        else:
+            rows = read_all('airports.details', row_type=AirportRow)
+            if rows:
+                reference_cache.set('airports.details', rows)
+    except Exception as e:
+        logger.error(f"獲取機場城市資料時出錯: {e}")
+        # 無法連接資料庫或發生錯誤時使用備用資料
+        return FALLBACK_AIRPORT_DETAILS
+    
+    # 將查詢結果轉換為字典列表
+    airports = []
+    for row in rows:
+        country_code = row.country if row.country else 'XX'
+        airports.append({
+            "code": row.code,
+            "name": row.name,
+            "city_zh": row.city_zh if row.city_zh else '未知城市',
+            "country": country_code,
+            "country_name": COUNTRY_NAMES.get(country_code, '未知國家')
+        })
+    
+    # 如果沒有找到任何資料，使用備用資料
+    if not airports:
+        logger.warning("資料庫中沒有找到機場城市資料，使用備用資料")
+        return FALLBACK_AIRPORT_DETAILS
+    
+    return airports
+
+def get_airports_signature():
+    """取得機場資料版本 (筆數與最後更新時間)，用於判斷索引是否需要重建"""
+    row = get_database().fetch_one('airports.signature')
+    return (row[0], row[1]) if row else None
+
+# 機場自動完成索引
+# 索引只在資料版本變更時重建，直接讀取資料庫，避免以快取中的舊資料重建後記下新版本
+airport_index = AirportIndex(lambda: load_airport_details(use_cache=False), get_airports_signature)
+
 # 機場詳細資料端點（包含城市資訊）
 @flight_blueprint.route('/airports/details', methods=['GET'])
 def get_airports_with_city():
     """獲取所有機場列表，包含城市資訊"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            # 如果無法連接到資料庫，使用備用資料
-            logger.warning("資料庫連接失敗，使用備用機場城市資料")
-            fallback_airports = [
-                {"code": "TPE", "name": "台灣桃園國際機場", "city_zh": "桃園", "country": "TW", "country_name": "台灣"},
-                {"code": "TSA", "name": "台北松山機場", "city_zh": "臺北", "country": "TW", "country_name": "台灣"},
-                {"code": "KHH", "name": "高雄國際機場", "city_zh": "高雄", "country": "TW", "country_name": "台灣"},
-                {"code": "RMQ", "name": "台中清泉崗機場", "city_zh": "台中", "country": "TW", "country_name": "台灣"},
-                {"code": "TTT", "name": "台東機場", "city_zh": "臺東", "country": "TW", "country_name": "台灣"},
-                {"code": "KYD", "name": "蘭嶼機場", "city_zh": "臺東", "country": "TW", "country_name": "台灣"},
-                {"code": "KNH", "name": "金門機場", "city_zh": "金門", "country": "TW", "country_name": "台灣"},
-                {"code": "MZG", "name": "澎湖馬公機場", "city_zh": "澎湖", "country": "TW", "country_name": "台灣"},
-                {"code": "HUN", "name": "花蓮機場", "city_zh": "花蓮", "country": "TW", "country_name": "台灣"},
-                {"code": "GNI", "name": "綠島機場", "city_zh": "臺東", "country": "TW", "country_name": "台灣"},
-                {"code": "MFK", "name": "北竿機場", "city_zh": "連江", "country": "TW", "country_name": "台灣"},
-                {"code": "LZN", "name": "南竿機場", "city_zh": "連江", "country": "TW", "country_name": "台灣"},
-                {"code": "TNN", "name": "台南機場", "city_zh": "台南", "country": "TW", "country_name": "台灣"},
-                {"code": "CMJ", "name": "七美機場", "city_zh": "澎湖", "country": "TW", "country_name": "台灣"},
-                {"code": "WOT", "name": "望安機場", "city_zh": "澎湖", "country": "TW", "country_name": "台灣"},
-                
-                {"code": "HND", "name": "東京羽田機場", "city_zh": "東京", "country": "JP", "country_name": "日本"},
-                {"code": "NRT", "name": "東京成田國際機場", "city_zh": "東京", "country": "JP", "country_name": "日本"},
-                {"code": "KIX", "name": "大阪關西國際機場", "city_zh": "大阪", "country": "JP", "country_name": "日本"},
-                {"code": "FUK", "name": "福岡機場", "city_zh": "福岡", "country": "JP", "country_name": "日本"},
-                {"code": "CTS", "name": "札幌新千歲機場", "city_zh": "札幌", "country": "JP", "country_name": "日本"},
-                {"code": "NGO", "name": "名古屋中部國際機場", "city_zh": "名古屋", "country": "JP", "country_name": "日本"},
-                {"code": "OKA", "name": "沖繩那霸機場", "city_zh": "沖繩", "country": "JP", "country_name": "日本"},
-                
-                {"code": "HKG", "name": "香港國際機場", "city_zh": "香港", "country": "HK", "country_name": "香港"},
-                {"code": "ICN", "name": "首爾仁川國際機場", "city_zh": "首爾", "country": "KR", "country_name": "韓國"},
-                {"code": "GMP", "name": "首爾金浦國際機場", "city_zh": "首爾", "country": "KR", "country_name": "韓國"},
-                {"code": "PVG", "name": "上海浦東國際機場", "city_zh": "上海", "country": "CN", "country_name": "中國大陸"},
-                {"code": "PEK", "name": "北京首都國際機場", "city_zh": "北京", "country": "CN", "country_name": "中國大陸"},
-                {"code": "SIN", "name": "新加坡樟宜機場", "city_zh": "新加坡", "country": "SG", "country_name": "新加坡"},
-                {"code": "BKK", "name": "曼谷素萬那普機場", "city_zh": "曼谷", "country": "TH", "country_name": "泰國"},
-                {"code": "MNL", "name": "馬尼拉尼諾伊阿基諾國際機場", "city_zh": "馬尼拉", "country": "PH", "country_name": "菲律賓"},
-                
-                {"code": "HIJ", "name": "廣島機場", "city_zh": "廣島", "country": "JP", "country_name": "日本"},
-                {"code": "SDJ", "name": "仙台機場", "city_zh": "仙台", "country": "JP", "country_name": "日本"},
-                {"code": "KIJ", "name": "新潟機場", "city_zh": "新潟", "country": "JP", "country_name": "日本"},
-                {"code": "ADL", "name": "阿德萊德機場", "city_zh": "阿德萊德", "country": "AU", "country_name": "澳洲"},
-                {"code": "ANC", "name": "安克拉治機場", "city_zh": "安克拉治", "country": "US", "country_name": "美國"}
-            ]
-            return jsonify(fallback_airports)
+    return jsonify(load_airport_details())
 
-        # 查詢資料庫中的機場資料，包含城市名稱
-        cursor = conn.cursor()
-        query = """
-        SELECT airport_id as code, airport_name_zh as name, city_zh, country
-        FROM Airports 
-        ORDER BY airport_name_zh
-        """
-        
-        cursor.execute(query)
-        
-        # 將查詢結果轉換為字典列表
-        airports = []
-        # 國家名稱對應
-        country_names = {
-            'TW': '台灣',
-            'JP': '日本',
-            'KR': '韓國',
-            'CN': '中國大陸',
-            'HK': '香港',
-            'SG': '新加坡',
-            'TH': '泰國',
-            'PH': '菲律賓',
-            'US': '美國',
-            'CA': '加拿大',
-            'AU': '澳洲',
-            'NZ': '紐西蘭',
-            'UK': '英國',
-            'FR': '法國',
-            'DE': '德國',
-            'IT': '義大利',
-            'ES': '西班牙'
-        }
-        
-        for row in cursor.fetchall():
-            country_code = row.country if row.country else 'XX'
-            airports.append({
-                "code": row.code,
-                "name": row.name,
-                "city_zh": row.city_zh if hasattr(row, 'city_zh') and row.city_zh else '未知城市',
-                "country": country_code,
-                "country_name": country_names.get(country_code, '未知國家')
-            })
-        
-        cursor.close()
-        conn.close()
-        
-        # 如果沒有找到任何資料，使用備用資料
-        if not airports:
-            logger.warning("資料庫中沒有找到機場城市資料，使用備用資料")
-            return jsonify(fallback_airports)
-        
-        return jsonify(airports)
-        
-    except Exception as e:
-        logger.error(f"獲取機場城市資料時出錯: {e}")
-        # 發生錯誤時使用備用資料
-        fallback_airports = [
-            {"code": "TPE", "name": "台灣桃園國際機場", "city_zh": "桃園", "country": "TW", "country_name": "台灣"},
-            {"code": "TSA", "name": "台北松山機場", "city_zh": "臺北", "country": "TW", "country_name": "台灣"},
-            {"code": "KHH", "name": "高雄國際機場", "city_zh": "高雄", "country": "TW", "country_name": "台灣"},
-            {"code": "RMQ", "name": "台中清泉崗機場", "city_zh": "台中", "country": "TW", "country_name": "台灣"},
-            {"code": "HIJ", "name": "廣島機場", "city_zh": "廣島", "country": "JP", "country_name": "日本"},
-            {"code": "SDJ", "name": "仙台機場", "city_zh": "仙台", "country": "JP", "country_name": "日本"},
-            {"code": "KIJ", "name": "新潟機場", "city_zh": "新潟", "country": "JP", "country_name": "日本"},
-            {"code": "ADL", "name": "阿德萊德機場", "city_zh": "阿德萊德", "country": "AU", "country_name": "澳洲"},
-            {"code": "ANC", "name": "安克拉治機場", "city_zh": "安克拉治", "country": "US", "country_name": "美國"}
-        ]
-        return jsonify(fallback_airports)
+# 機場自動完成端點
+@flight_blueprint.route('/airports/suggest', methods=['GET'])
+def suggest_airports():
+    """
+    機場自動完成建議
+    參數:
+    - q: 查詢字串 (機場代碼、機場名稱、城市或國家)
+    - limit: (可選) 最多回傳筆數，預設10，最多50
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            "status": "error",
+            "message": "缺少查詢字串",
+            "required": ["q"]
+        }), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "limit 必須是整數"
+        }), 400
+    
+    return jsonify(airport_index.suggest(query, limit=limit))
 
 # 航空公司列表端點
 @flight_blueprint.route('/airlines', methods=['GET'])
 def get_airlines():
     """獲取所有航空公司列表"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            # 如果無法連接到資料庫，使用備用資料
-            logger.warning("資料庫連接失敗，使用備用航空公司資料")
-            fallback_airlines = [
-                {"id": "CI", "name": "中華航空"},
-                {"id": "BR", "name": "長榮航空"},
-                {"id": "AE", "name": "華信航空"},
-                {"id": "B7", "name": "立榮航空"},
-                {"id": "DA", "name": "德安航空"}
-            ]
-            return jsonify(fallback_airlines)
-
         # 查詢資料庫中的航空公司資料
-        cursor = conn.cursor()
-        query = """
-        SELECT airline_id as id, airline_name_zh as name 
-        FROM Airlines 
-        ORDER BY airline_name_zh
-        """
-        
-        cursor.execute(query)
+        rows = airline_list()
         
         # 將查詢結果轉換為字典列表
-        airlines = []
-        for row in cursor.fetchall():
-            airlines.append({
-                "id": row.id,
-                "name": row.name
-            })
-        
-        cursor.close()
-        conn.close()
+        airlines = [{"id": row.id, "name": row.name} for row in rows]
         
         # 如果沒有找到任何資料，使用備用資料
         if not airlines:
@@ -297,22 +354,262 @@ def get_airlines():
         ]
         return jsonify(fallback_airlines)
 
+def resolve_location(location):
+    """
+    將搜尋參數解析為機場代碼列表
+    可以是機場代碼 (如 'TPE') 或城市名稱 (如 '東京'、'臺北')，無法解析時視為機場代碼
+    """
+    codes = airport_index.resolve_location(location)
+    return codes if codes else [location.strip().upper()]
+
+def fetch_flights(departure_codes, arrival_codes, date_str, airline=None):
+    """
+    以單一查詢取得多個出發/到達機場組合的航班 (不使用快取與模擬資料)
+
+    參數:
+        departure_codes: 出發機場代碼列表
+        arrival_codes: 到達機場代碼列表
+        date_str: 日期 (YYYY-MM-DD)
+        airline: (可選) 航空公司ID
+
+    返回:
+        依起飛時間排序的航班列表
+    """
+    # 城市搜尋時展開為 IN 條件，指定航空公司時加入航空公司條件
+    params = list(departure_codes) + list(arrival_codes) + [date_str]
+    query_name = 'flights.search'
+    if airline:
+        query_name = 'flights.search_by_airline'
+        params.append(airline)
+    
+    rows = read_all(
+        query_name,
+        params,
+        row_type=FlightRow,
+        departure_codes=len(departure_codes),
+        arrival_codes=len(arrival_codes)
+    )
+    
+    # 處理查詢結果
+    flights = []
+    for row in rows:
+        flights.append({
+            "flight_number": row.flight_number,
+            "scheduled_departure": row.scheduled_departure.isoformat() if row.scheduled_departure else None,
+            "scheduled_arrival": row.scheduled_arrival.isoformat() if row.scheduled_arrival else None,
+            "departure_airport_code": row.departure_airport_code,
+            "arrival_airport_code": row.arrival_airport_code,
+            "airline_id": row.airline_id,
+            "flight_status": row.flight_status,
+            "aircraft_type": row.aircraft_type,
+            "price": row.price,
+            "booking_link": row.booking_link or "#"
+        })
+    return flights
+
+def query_flights(departure_codes, arrival_codes, date_str, airline=None):
+    """
+    以單一查詢取得多個出發/到達機場組合的航班
+
+    參數:
+        departure_codes: 出發機場代碼列表
+        arrival_codes: 到達機場代碼列表
+        date_str: 日期 (YYYY-MM-DD)
+        airline: (可選) 航空公司ID
+
+    返回:
+        依起飛時間排序的航班列表，無法連接資料庫或沒有資料時使用模擬資料
+    """
+    # 快取的是查詢結果，呼叫端會為航班加上機場名稱，因此取出與寫入時都複製
+    # 鍵以日期開頭，航班變更時可依日期找出需要清除的搜尋結果
+    cache_invalidator.start()
+    cache_key = search_cache.make_key(date_str, departure_codes, arrival_codes, airline)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return [dict(flight) for flight in cached]
+    
+    try:
+        flights = fetch_flights(departure_codes, arrival_codes, date_str, airline)
+        
+        # 如果沒有查詢到航班，使用模擬資料 (不寫入快取)
+        if not flights:
+            logger.info(f"沒有找到從 {departure_codes} 到 {arrival_codes} 於 {date_str} 的航班，使用模擬資料")
+            return generate_mock_flights_for_airports(departure_codes, arrival_codes, date_str, airline)
+        
+        search_cache.set(cache_key, [dict(flight) for flight in flights])
+        return flights
+    
+    except Exception as e:
+        logger.error(f"查詢航班時出錯: {e}")
+        # 發生錯誤時使用模擬資料
+        return generate_mock_flights_for_airports(departure_codes, arrival_codes, date_str, airline)
+
+def invalidate_flight_caches(changes):
+    """
+    清除與變更航線相關的快取：包含該航線與日期的航班搜尋結果、依航線產生的參考資料，
+    以及變更日期的航班狀態 (狀態快取只以航班編號與日期為鍵)
+
+    參數:
+        changes: (出發機場, 到達機場, 日期) 集合
+    """
+    routes_by_date = {}
+    for departure, arrival, date_str in changes:
+        routes_by_date.setdefault(date_str, set()).add((departure, arrival))
+    
+    stale = []
+    for date_str, routes in routes_by_date.items():
+        for key in search_cache.keys(f"{date_str}:"):
+            parts = key.split(':')
+            departures, arrivals = set(parts[1].split(',')), set(parts[2].split(','))
+            if any(departure in departures and arrival in arrivals for departure, arrival in routes):
+                stale.append(key)
+    search_cache.delete_many(stale)
+    
+    get_status_cache().invalidate_dates(routes_by_date)
+    
+    routes = {(departure, arrival) for departure, arrival, _ in changes}
+    reference_cache.delete_many(
+        [f"airlines.for_route:{departure}-{arrival}" for departure, arrival in routes]
+        + [f"airports.destinations:{departure}" for departure in {departure for departure, _ in routes}]
+    )
+
+# 航班變更紀錄輪詢器，第一次查詢時才啟動；使用本地副本時，副本同步後再清除一次
+cache_invalidator = CacheInvalidator(
+    fetch_flight_changes,
+    latest_flight_change_id,
+    interval=CACHE_INVALIDATION_POLL_SECONDS,
+    replay_after=REPLICA_SYNC_SECONDS if REPLICA_PATH else 0.0
+)
+cache_invalidator.subscribe(invalidate_flight_caches)
+
+def warm_reference_data():
+    """
+    載入機場、航空公司參考資料與機場自動完成索引 (啟動預熱用)
+
+    返回:
+        {資料名稱: 筆數}
+    """
+    airport_index.refresh()
+    route_table.refresh()
+    return {
+        'airports': len(airport_list()),
+        'airlines': len(airline_list()),
+        'airport_index': len(airport_index.airports()),
+        'routes': len(route_table.routes())
+    }
+
+def load_top_routes(dates, limit):
+    """
+    取得指定日期內航班最多的航線
+
+    參數:
+        dates: 日期列表 (datetime.date)
+        limit: 最多取得的航線數量
+
+    返回:
+        航線列表 [(出發機場, 到達機場)]，依航班數由多到少排序
+    """
+    if not dates or limit <= 0:
+        return []
+    start = datetime.datetime.combine(min(dates), datetime.time.min)
+    end = datetime.datetime.combine(max(dates), datetime.time.min) + datetime.timedelta(days=1)
+    return [
+        (row[0], row[1])
+        for row in get_database().fetch_all('flights.top_routes', [limit, start, end])
+    ]
+
+def prefetch_top_routes(dates, limit):
+    """
+    將指定日期內航班最多的航線搜尋結果預先寫入快取 (啟動預熱用)
+
+    參數:
+        dates: 日期列表 (datetime.date)
+        limit: 最多預取的航線數量
+
+    返回:
+        預取的航線列表 [(出發機場, 到達機場)]
+    """
+    routes = load_top_routes(dates, limit)
+    for departure, arrival in routes:
+        for flight_date in dates:
+            query_flights([departure], [arrival], flight_date.strftime('%Y-%m-%d'))
+    return routes
+
+def tag_flight_airports(flights):
+    """為每個航班標註實際的出發/到達機場名稱與城市"""
+    airports = {airport['code']: airport for airport in airport_index.airports()}
+    for flight in flights:
+        for side in ('departure', 'arrival'):
+            airport = airports.get(flight.get(f"{side}_airport_code"), {})
+            flight[f"{side}_airport_name"] = airport.get('name')
+            flight[f"{side}_city"] = airport.get('city_zh')
+    return flights
+
+# 熱門航線的預先產生回應，由 app.py 的快照產生器填入
+search_snapshot_store = SnapshotStore()
+# 可使用快照的查詢參數 (指定航空公司、回程等其他參數時一律即時查詢)
+SNAPSHOT_SEARCH_ARGS = {'departure', 'arrival', 'date'}
+
+def snapshot_response(snapshot):
+    """以預先產生的快照回應，用戶端接受 gzip 時直接回傳壓縮後的內容"""
+    if 'gzip' in request.accept_encodings:
+        response = Response(snapshot.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f"{snapshot.etag}-gzip")
+    else:
+        response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+def render_search_snapshot(departure, arrival, date_str):
+    """
+    產生 /flights/search 單程搜尋的回應內容 (快照用)
+
+    返回:
+        回應物件，沒有航班時返回None (即時查詢會改用模擬資料，不產生快照)
+    """
+    departure_codes = resolve_location(departure)
+    arrival_codes = resolve_location(arrival)
+    flights = fetch_flights(departure_codes, arrival_codes, date_str)
+    if not flights:
+        return None
+    tag_flight_airports(flights)
+    return {
+        "status": "success",
+        "data": flights,
+        "count": len(flights),
+        "search_criteria": {
+            "departure": departure,
+            "arrival": arrival,
+            "date": date_str,
+            "airline": None,
+            "departure_airports": departure_codes,
+            "arrival_airports": arrival_codes
+        }
+    }
+
 # 航班搜尋端點
 @flight_blueprint.route('/flights/search', methods=['GET'])
 def search_flights():
     """
     搜尋航班
     參數:
-    - departure: 出發機場代碼
-    - arrival: 到達機場代碼
+    - departure: 出發機場代碼或城市名稱 (如 'TPE'、'臺北')
+    - arrival: 到達機場代碼或城市名稱 (如 'HND'、'東京')
     - date: 日期 (YYYY-MM-DD)
     - airline: (可選) 航空公司ID
+    - return_date: (可選) 回程日期 (YYYY-MM-DD)，提供時同時查詢去程與回程
+    - pair_by: (可選) 來回程組合排序方式 ('price' 或 'duration')，僅用於來回程搜尋
+    - pair_limit: (可選) 回傳的來回程組合數量，預設20
     """
     # 獲取查詢參數
     departure = request.args.get('departure')
     arrival = request.args.get('arrival')
     date_str = request.args.get('date')
     airline = request.args.get('airline')
+    return_date_str = request.args.get('return_date')
+    pair_by = request.args.get('pair_by')
     
     # 參數驗證
     if not departure or not arrival or not date_str:
@@ -331,145 +628,433 @@ def search_flights():
             "message": "日期格式錯誤，請使用YYYY-MM-DD格式"
         }), 400
     
-    # 嘗試從資料庫查詢航班資料
+    # 來回程參數驗證
+    if return_date_str:
+        try:
+            return_date = datetime.datetime.strptime(return_date_str, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({
+                "status": "error",
+                "message": "回程日期格式錯誤，請使用YYYY-MM-DD格式"
+            }), 400
+        
+        if return_date < search_date:
+            return jsonify({
+                "status": "error",
+                "message": "回程日期不可早於去程日期"
+            }), 400
+    
+    if pair_by and pair_by not in PAIR_SORT_OPTIONS:
+        return jsonify({
+            "status": "error",
+            "message": "pair_by 只能是 price 或 duration"
+        }), 400
+    
     try:
-        conn = get_db_connection()
-        if not conn:
-            # 如果無法連接到資料庫，使用模擬資料
-            logger.warning("資料庫連接失敗，使用模擬航班資料")
-            flights = generate_mock_flights(departure, arrival, date_str, airline)
-        else:
-            # 從資料庫查詢航班
-            cursor = conn.cursor()
-            
-            # 建立基本查詢
-            query = """
-            SELECT 
-                f.flight_number, 
-                f.scheduled_departure, 
-                f.scheduled_arrival, 
-                f.departure_airport_code, 
-                f.arrival_airport_code, 
-                f.airline_id, 
-                f.flight_status, 
-                f.aircraft_type, 
-                f.price, 
-                f.booking_link
-            FROM Flights f
-            WHERE 
-                f.departure_airport_code = ? 
-                AND f.arrival_airport_code = ? 
-                AND CONVERT(date, f.scheduled_departure) = ?
-            """
-            
-            params = [departure, arrival, search_date.strftime('%Y-%m-%d')]
-            
-            # 如果指定了航空公司，加入航空公司條件
-            if airline:
-                query += " AND f.airline_id = ?"
-                params.append(airline)
-            
-            cursor.execute(query, params)
-            
-            # 處理查詢結果
-            flights = []
-            for row in cursor.fetchall():
-                flights.append({
-                    "flight_number": row.flight_number,
-                    "scheduled_departure": row.scheduled_departure.isoformat() if row.scheduled_departure else None,
-                    "scheduled_arrival": row.scheduled_arrival.isoformat() if row.scheduled_arrival else None,
-                    "departure_airport_code": row.departure_airport_code,
-                    "arrival_airport_code": row.arrival_airport_code,
-                    "airline_id": row.airline_id,
-                    "flight_status": row.flight_status,
-                    "aircraft_type": row.aircraft_type,
-                    "price": row.price,
-                    "booking_link": row.booking_link or "#"
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            # 如果沒有查詢到航班，使用模擬資料
-            if not flights:
-                logger.info(f"沒有找到從 {departure} 到 {arrival} 於 {date_str} 的航班，使用模擬資料")
-                flights = generate_mock_flights(departure, arrival, date_str, airline)
+        pair_limit = min(max(int(request.args.get('pair_limit', DEFAULT_PAIR_LIMIT)), 1), 100)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "pair_limit 必須是整數"
+        }), 400
     
-    except Exception as e:
-        logger.error(f"查詢航班時出錯: {e}")
-        # 發生錯誤時使用模擬資料
-        flights = generate_mock_flights(departure, arrival, date_str, airline)
+    # 熱門航線的單程搜尋直接回傳預先產生的快照
+    if set(request.args) <= SNAPSHOT_SEARCH_ARGS:
+        snapshot = search_snapshot_store.get(('search', departure, arrival, date_str))
+        if snapshot is not None:
+            return snapshot_response(snapshot)
     
-    return jsonify({
+    # 城市搜尋展開為該城市的所有機場
+    departure_codes = resolve_location(departure)
+    arrival_codes = resolve_location(arrival)
+    
+    search_criteria = {
+        "departure": departure,
+        "arrival": arrival,
+        "date": date_str,
+        "airline": airline,
+        "departure_airports": departure_codes,
+        "arrival_airports": arrival_codes
+    }
+    
+    if not return_date_str:
+        flights = query_flights(departure_codes, arrival_codes, search_date.strftime('%Y-%m-%d'), airline)
+        tag_flight_airports(flights)
+        
+        return jsonify({
+            "status": "success",
+            "data": flights,
+            "count": len(flights),
+            "search_criteria": search_criteria
+        })
+    
+    # 來回程: 去程與回程並行查詢，總延遲約等於較慢的一程
+    outbound_future = search_executor.submit(
+        query_flights, departure_codes, arrival_codes, search_date.strftime('%Y-%m-%d'), airline
+    )
+    return_future = search_executor.submit(
+        query_flights, arrival_codes, departure_codes, return_date.strftime('%Y-%m-%d'), airline
+    )
+    flights = tag_flight_airports(outbound_future.result())
+    return_flights = tag_flight_airports(return_future.result())
+    
+    search_criteria["return_date"] = return_date_str
+    result = {
         "status": "success",
+        "trip_type": "round_trip",
         "data": flights,
         "count": len(flights),
-        "search_criteria": {
-            "departure": departure,
-            "arrival": arrival,
-            "date": date_str,
-            "airline": airline
+        "return_data": return_flights,
+        "return_count": len(return_flights),
+        "search_criteria": search_criteria
+    }
+    
+    if pair_by:
+        search_criteria["pair_by"] = pair_by
+        result["combinations"] = pair_round_trip_flights(flights, return_flights, pair_by, pair_limit)
+    
+    return jsonify(result)
+
+def _parse_flight_time(value):
+    """將航班時間 (ISO字串或datetime) 轉為datetime"""
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def pair_round_trip_flights(outbound_flights, return_flights, sort_by='price', limit=DEFAULT_PAIR_LIMIT):
+    """
+    組合去程與回程航班，只保留回程起飛晚於去程抵達的組合
+
+    參數:
+        outbound_flights: 去程航班列表
+        return_flights: 回程航班列表
+        sort_by: 排序方式 ('price' 總價格 或 'duration' 總飛行時間)
+        limit: 最多回傳的組合數量
+
+    返回:
+        排序後的組合列表，以 outbound_index/return_index 對應 data/return_data 中的航班
+    """
+    def leg_info(flight):
+        departure_time = _parse_flight_time(flight.get('scheduled_departure'))
+        arrival_time = _parse_flight_time(flight.get('scheduled_arrival'))
+        duration = None
+        if departure_time and arrival_time:
+            duration = int((arrival_time - departure_time).total_seconds() // 60)
+        price = float(flight['price']) if flight.get('price') not in (None, '') else None
+        return departure_time, arrival_time, duration, price
+    
+    outbound_info = [leg_info(flight) for flight in outbound_flights]
+    return_info = [leg_info(flight) for flight in return_flights]
+    
+    def candidates():
+        for i, (_, out_arrival, out_duration, out_price) in enumerate(outbound_info):
+            for j, (ret_departure, _, ret_duration, ret_price) in enumerate(return_info):
+                if out_arrival and ret_departure and ret_departure <= out_arrival:
+                    continue
+                total_price = out_price + ret_price if out_price is not None and ret_price is not None else None
+                total_duration = out_duration + ret_duration if out_duration is not None and ret_duration is not None else None
+                primary = total_price if sort_by == 'price' else total_duration
+                secondary = total_duration if sort_by == 'price' else total_price
+                # 缺少排序欄位的組合排在最後
+                key = (primary is None, primary or 0, secondary is None, secondary or 0, i, j)
+                yield key, i, j, total_price, total_duration
+    
+    # 只需要前幾名，避免對所有組合完整排序
+    best = heapq.nsmallest(limit, candidates(), key=lambda candidate: candidate[0])
+    
+    return [
+        {
+            "outbound_index": i,
+            "return_index": j,
+            "outbound_flight_number": outbound_flights[i].get('flight_number'),
+            "return_flight_number": return_flights[j].get('flight_number'),
+            "total_price": total_price,
+            "total_duration_minutes": total_duration
         }
+        for _, i, j, total_price, total_duration in best
+    ]
+
+def query_flight_statuses(keys):
+    """
+    以單一查詢取得多個航班的狀態
+
+    參數:
+        keys: 快取鍵列表 [(航班編號, 日期), ...]
+
+    返回:
+        狀態列表，資料庫中找不到的航班 found 為 False
+    """
+    # 以主鍵 (flight_number, scheduled_departure) 範圍查詢，避免對欄位套用函數導致無法使用索引
+    flight_numbers = sorted({flight_number for flight_number, _ in keys})
+    dates = sorted({date_str for _, date_str in keys})
+    start = datetime.datetime.strptime(dates[0], '%Y-%m-%d')
+    end = datetime.datetime.strptime(dates[-1], '%Y-%m-%d') + datetime.timedelta(days=1)
+    
+    rows = get_database().fetch_all(
+        'flights.statuses',
+        flight_numbers + [start, end],
+        row_type=FlightStatusRow,
+        flight_numbers=len(flight_numbers)
+    )
+    
+    wanted = set(keys)
+    statuses = {}
+    for row in rows:
+        key = make_status_key(row.flight_number, row.scheduled_departure)
+        # 同一天有多個同編號航班時取最早的一班
+        if key in wanted and key not in statuses:
+            statuses[key] = make_status_entry(
+                row.flight_number,
+                row.scheduled_departure,
+                flight_status=row.flight_status,
+                actual_departure=row.actual_departure,
+                actual_arrival=row.actual_arrival,
+                scheduled_departure=row.scheduled_departure
+            )
+    
+    # 找不到的航班也寫入快取，避免重複查詢
+    return [
+        statuses.get(key) or make_status_entry(key[0], key[1], found=False)
+        for key in keys
+    ]
+
+# 批次航班狀態端點
+@flight_blueprint.route('/flights/status', methods=['POST'])
+def get_flight_statuses():
+    """
+    批次查詢航班狀態
+    請求內容 (JSON):
+    - flights: 航班列表 [{"flight_number": "DA7510", "date": "YYYY-MM-DD"}, ...]
+    """
+    body = request.get_json(silent=True) or {}
+    items = body.get('flights')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            "status": "error",
+            "message": "缺少航班列表",
+            "required": ["flights"]
+        }), 400
+    
+    if len(items) > MAX_STATUS_KEYS:
+        return jsonify({
+            "status": "error",
+            "message": f"一次最多查詢 {MAX_STATUS_KEYS} 個航班"
+        }), 400
+    
+    # 驗證並建立快取鍵 (保留請求順序並去除重複)
+    keys = []
+    for item in items:
+        flight_number = item.get('flight_number') if isinstance(item, dict) else None
+        date_str = item.get('date') if isinstance(item, dict) else None
+        try:
+            datetime.datetime.strptime(date_str or '', '%Y-%m-%d')
+            valid = bool(flight_number)
+        except (TypeError, ValueError):
+            valid = False
+        
+        if not valid:
+            return jsonify({
+                "status": "error",
+                "message": "每個航班都需要 flight_number 與 YYYY-MM-DD 格式的 date",
+                "invalid": item
+            }), 400
+        key = make_status_key(flight_number, date_str)
+        if key not in keys:
+            keys.append(key)
+    
+    # 先從記憶體快取取得，只對未命中的航班查詢資料庫；其他行程寫入的變更由變更紀錄輪詢清除
+    cache_invalidator.start()
+    status_cache = get_status_cache()
+    statuses, missing = status_cache.get_many(keys)
+    
+    if missing:
+        try:
+            fetched = query_flight_statuses(missing)
+        except Exception as e:
+            logger.error(f"查詢航班狀態時出錯: {e}")
+            return jsonify({
+                "status": "error",
+                "message": f"查詢航班狀態時出錯: {str(e)}"
+            }), 500
+        
+        status_cache.put_many(fetched)
+        for entry in fetched:
+            statuses[make_status_key(entry['flight_number'], entry['date'])] = entry
+    
+    data = [statuses[key] for key in keys]
+    return jsonify({
+        "status": "success",
+        "data": data,
+        "count": len(data),
+        "cache_hits": len(keys) - len(missing)
     })
 
-# 航線資訊端點
-@flight_blueprint.route('/routes', methods=['GET'])
-def get_routes():
-    """獲取可用的直飛航線"""
+def _status_change_entries(rows):
+    """將 FlightChangeRow 轉為狀態列表，每筆附上出發/到達機場與 updated_at"""
+    entries = []
+    for row in rows:
+        entry = make_status_entry(
+            row.flight_number,
+            row.scheduled_departure,
+            flight_status=row.flight_status,
+            actual_departure=row.actual_departure,
+            actual_arrival=row.actual_arrival,
+            scheduled_departure=row.scheduled_departure
+        )
+        entry['departure_airport_code'] = row.departure_airport_code
+        entry['arrival_airport_code'] = row.arrival_airport_code
+        entry['updated_at'] = row.updated_at
+        entries.append(entry)
+    
+    return entries
+
+def fetch_status_changes(since):
+    """
+    取得 updated_at 不早於指定時間的航班狀態，供狀態變更輪詢器使用
+
+    參數:
+        since: 起始時間
+
+    返回:
+        狀態列表，每筆附上出發/到達機場與 updated_at
+    """
+    return _status_change_entries(
+        get_database().fetch_all('flights.status_changes', [since], row_type=FlightChangeRow)
+    )
+
+def fetch_status_baseline():
+    """
+    取得監看範圍內 (昨天起 STATUS_WATCH_DAYS 天內起飛) 所有航班目前的狀態，作為狀態變更輪詢器的比對基準
+
+    返回:
+        狀態列表，格式同 fetch_status_changes
+    """
+    start = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=1), datetime.time.min)
+    end = start + datetime.timedelta(days=STATUS_WATCH_DAYS + 1)
+    return _status_change_entries(
+        get_database().fetch_all('flights.status_baseline', [start, end], row_type=FlightChangeRow)
+    )
+
+# 狀態變更輪詢器，第一個訂閱者連線時才啟動
+status_poller = StatusChangePoller(
+    get_event_hub(), fetch_status_changes, interval=STATUS_POLL_SECONDS, fetch_baseline=fetch_status_baseline
+)
+
+def _parse_filter(value):
+    """將逗號分隔的參數轉為大寫集合"""
+    return {item.strip().upper() for item in (value or '').split(',') if item.strip()}
+
+def _format_sse(event):
+    """將事件轉為 SSE 格式"""
+    return f"id: {event['event_id']}\nevent: status\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+# 航班狀態事件串流端點
+@flight_blueprint.route('/flights/stream', methods=['GET'])
+def stream_flight_statuses():
+    """
+    以 Server-Sent Events 推送航班狀態變更 (延誤、取消、實際起降時間)
+    查詢參數 (皆為選填，未指定時推送全部變更):
+    - flights: 航班編號，以逗號分隔 (例如: DA7510,BR189)
+    - routes: 航線，以逗號分隔 (例如: TPE-NRT,TSA-HND)
+    - airports: 機場代碼，出發或到達皆符合 (例如: TPE,KHH)
+    - last_event_id: 從指定事件之後開始補收 (亦可使用 Last-Event-ID 標頭)
+    """
+    flights = _parse_filter(request.args.get('flights'))
+    airports = _parse_filter(request.args.get('airports'))
+    routes = set()
+    for route in _parse_filter(request.args.get('routes')):
+        departure, _, arrival = route.partition('-')
+        if not departure or not arrival:
+            return jsonify({
+                "status": "error",
+                "message": "航線格式應為 出發機場-到達機場，例如 TPE-NRT"
+            }), 400
+        routes.add((departure, arrival))
+    
+    hub = get_event_hub()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
     try:
-        # 提供直飛航線資訊
-        # 主要是德安航空的離島航線和主要的國際航線
-        available_routes = [
-            # 德安航空航線
-            {"departure": "TTT", "arrival": "GNI", "airline": "DA"},  # 台東 -> 綠島
-            {"departure": "GNI", "arrival": "TTT", "airline": "DA"},  # 綠島 -> 台東
-            {"departure": "TTT", "arrival": "KYD", "airline": "DA"},  # 台東 -> 蘭嶼
-            {"departure": "KYD", "arrival": "TTT", "airline": "DA"},  # 蘭嶼 -> 台東
-            {"departure": "KHH", "arrival": "CMJ", "airline": "DA"},  # 高雄 -> 七美
-            {"departure": "CMJ", "arrival": "KHH", "airline": "DA"},  # 七美 -> 高雄
-            {"departure": "KHH", "arrival": "WOT", "airline": "DA"},  # 高雄 -> 望安
-            {"departure": "WOT", "arrival": "KHH", "airline": "DA"},  # 望安 -> 高雄
-            {"departure": "MZG", "arrival": "CMJ", "airline": "DA"},  # 馬公 -> 七美
-            {"departure": "CMJ", "arrival": "MZG", "airline": "DA"},  # 七美 -> 馬公
-            
-            # 主要國際航線 (範例)
-            {"departure": "TPE", "arrival": "HKG"},  # 台北 -> 香港
-            {"departure": "HKG", "arrival": "TPE"},  # 香港 -> 台北
-            {"departure": "TPE", "arrival": "NRT"},  # 台北 -> 東京成田
-            {"departure": "NRT", "arrival": "TPE"},  # 東京成田 -> 台北
-            {"departure": "TPE", "arrival": "HND"},  # 台北 -> 東京羽田
-            {"departure": "HND", "arrival": "TPE"},  # 東京羽田 -> 台北
-            {"departure": "TPE", "arrival": "ICN"},  # 台北 -> 首爾仁川
-            {"departure": "ICN", "arrival": "TPE"},  # 首爾仁川 -> 台北
-            {"departure": "TPE", "arrival": "KIX"},  # 台北 -> 大阪關西
-            {"departure": "KIX", "arrival": "TPE"},  # 大阪關西 -> 台北
-            {"departure": "TPE", "arrival": "BKK"},  # 台北 -> 曼谷
-            {"departure": "BKK", "arrival": "TPE"},  # 曼谷 -> 台北
-            {"departure": "TPE", "arrival": "SIN"},  # 台北 -> 新加坡
-            {"departure": "SIN", "arrival": "TPE"},  # 新加坡 -> 台北
-            
-            # 台灣國內主要航線
-            {"departure": "TSA", "arrival": "KHH"},  # 台北松山 -> 高雄
-            {"departure": "KHH", "arrival": "TSA"},  # 高雄 -> 台北松山
-            {"departure": "TSA", "arrival": "MZG"},  # 台北松山 -> 澎湖
-            {"departure": "MZG", "arrival": "TSA"},  # 澎湖 -> 台北松山
-            {"departure": "TSA", "arrival": "KNH"},  # 台北松山 -> 金門
-            {"departure": "KNH", "arrival": "TSA"},  # 金門 -> 台北松山
-            {"departure": "TSA", "arrival": "TTT"},  # 台北松山 -> 台東
-            {"departure": "TTT", "arrival": "TSA"},  # 台東 -> 台北松山
-            {"departure": "TSA", "arrival": "HUN"},  # 台北松山 -> 花蓮
-            {"departure": "HUN", "arrival": "TSA"},  # 花蓮 -> 台北松山
-            {"departure": "TSA", "arrival": "RMQ"},  # 台北松山 -> 台中
-            {"departure": "RMQ", "arrival": "TSA"},  # 台中 -> 台北松山
-            {"departure": "KHH", "arrival": "HUN"},  # 高雄 -> 花蓮
-            {"departure": "HUN", "arrival": "KHH"},  # 花蓮 -> 高雄
-        ]
+        cursor = int(last_event_id) if last_event_id else None
+    except ValueError:
+        cursor = None
+    
+    status_poller.start()
+    
+    def generate():
+        position = cursor
+        yield f"retry: {int(SSE_HEARTBEAT_SECONDS * 1000)}\n\n"
         
-        return jsonify(available_routes)
+        # 重新連線時補送遺漏的事件；事件已不在緩衝區時通知用戶端重新取得完整狀態
+        if position is None:
+            position = hub.last_event_id
+        else:
+            events, complete = hub.events_after(position)
+            if not complete:
+                yield f"event: reset\ndata: {json.dumps({'last_event_id': hub.last_event_id})}\n\n"
+                position = min(position, hub.last_event_id)
+            for event in events:
+                position = event['event_id']
+                if event_matches(event, flights, routes, airports):
+                    yield _format_sse(event)
         
+        while True:
+            events = hub.wait_for_events(position, SSE_HEARTBEAT_SECONDS)
+            if not events:
+                # 心跳註解讓代理伺服器保持連線，也讓伺服器察覺用戶端已斷線
+                yield ": heartbeat\n\n"
+                continue
+            
+            for event in events:
+                position = event['event_id']
+                if event_matches(event, flights, routes, airports):
+                    yield _format_sse(event)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# 本地副本狀態端點
+@flight_blueprint.route('/replica/status', methods=['GET'])
+def get_replica_status():
+    """獲取本地唯讀副本的同步狀態與落後時間"""
+    replica = get_replica()
+    if replica is None:
+        return jsonify({"status": "success", "data": {"enabled": False}})
+    
+    try:
+        data = replica.get_status()
+        data["enabled"] = True
+        return jsonify({"status": "success", "data": data})
     except Exception as e:
-        logger.error(f"獲取航線資料時出錯: {e}")
-        return jsonify({"status": "error", "message": f"獲取航線資料時出錯: {str(e)}"}), 500
+        logger.error(f"獲取本地副本狀態時出錯: {e}")
+        return jsonify({"status": "error", "message": f"獲取本地副本狀態時出錯: {str(e)}"}), 500
+
+# 航線表，依 RouteSummary 的版本判斷是否重新載入
+route_table = RouteTable(fetch_route_summaries, route_summary_signature, check_interval=ROUTE_TABLE_CHECK_SECONDS)
+
+# 航線資訊端點
+@flight_blueprint.route('/routes', methods=['GET'])
+def get_routes():
+    """
+    獲取目前有航班的直飛航線 (航空公司、下一班起飛時間與未來一週班次)
+    回應帶有 ETag，內容未變更時返回 304；航線表由背景執行緒載入與更新，請求不等待資料庫
+    """
+    route_table.refresh_in_background()
+    snapshot = route_table.snapshot()
+    if snapshot is None:
+        # 航線表尚未載入 (背景載入中或資料庫無法使用) 時回傳備用航線
+        return jsonify(FALLBACK_ROUTES)
+    
+    body, etag = snapshot
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 # 以下保留原始的模擬數據產生函數作為備用
 def generate_mock_flights(departure, arrival, date_str, airline=None):
@@ -542,6 +1127,16 @@ def generate_mock_flights(departure, arrival, date_str, airline=None):
     
     return flights
 
+def generate_mock_flights_for_airports(departure_codes, arrival_codes, date_str, airline=None):
+    """為每個出發/到達機場組合生成模擬航班，並依起飛時間排序"""
+    flights = []
+    for departure in departure_codes:
+        for arrival in arrival_codes:
+            if departure != arrival:
+                flights.extend(generate_mock_flights(departure, arrival, date_str, airline))
+    flights.sort(key=lambda flight: flight['scheduled_departure'])
+    return flights
+
 def get_random_aircraft_type(airline_code):
     """根據航空公司獲取隨機機型"""
     import random
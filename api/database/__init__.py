@@ -0,0 +1,37 @@
+"""
+資料存取包
+集中管理資料庫連接、具名查詢、型別對應與批次寫入，所有存取資料庫的模組共用
+"""
+
+from api.database.instrumentation import (
+    QueryStats, assert_max_queries, normalize_sql, param_shape, start_tracking, stop_tracking, track_queries
+)
+from api.database.connection import (
+    ConnectionPool, connect, get_connection_string, get_pool, get_read_connection_string, get_read_pool,
+    is_transient_error, with_retries
+)
+from api.database.queries import QUERIES, get_query
+from api.database.rows import (
+    AirlineRow, AirportRow, FlightChangeRow, FlightRow, FlightStatusRow, flight_insert_params, map_rows
+)
+from api.database.db import Database, Session, get_database
+from api.database.replica import LocalReplica, get_replica, read_all
+from api.database.archive import archive_cutoff, archive_flights, flights_table
+from api.database.route_summary import fetch_route_summaries, refresh_route_summaries, route_summary_signature
+from api.database.changes import (
+    fetch_flight_changes, flight_change_key, latest_flight_change_id, purge_flight_changes, record_flight_changes
+)
+
+__all__ = [
+    'QueryStats', 'assert_max_queries', 'normalize_sql', 'param_shape', 'start_tracking', 'stop_tracking', 'track_queries',
+    'ConnectionPool', 'connect', 'get_connection_string', 'get_pool', 'get_read_connection_string', 'get_read_pool',
+    'is_transient_error', 'with_retries',
+    'QUERIES', 'get_query',
+    'AirlineRow', 'AirportRow', 'FlightChangeRow', 'FlightRow', 'FlightStatusRow', 'flight_insert_params', 'map_rows',
+    'Database', 'Session', 'get_database',
+    'LocalReplica', 'get_replica', 'read_all',
+    'archive_cutoff', 'archive_flights', 'flights_table',
+    'fetch_flight_changes', 'flight_change_key', 'latest_flight_change_id', 'purge_flight_changes',
+    'record_flight_changes',
+    'fetch_route_summaries', 'refresh_route_summaries', 'route_summary_signature'
+]
@@ -0,0 +1,111 @@
+"""
+歷史航班封存
+將起飛時間早於保留天數的航班從 Flights 移到 FlightsArchive，讓匯入、即時更新與搜尋只需掃描近期資料；
+需要歷史資料的查詢透過 flights_table() 取得合併兩者的 FlightsHistory 檢視
+"""
+import datetime
+import logging
+import os
+from typing import Optional
+
+from api.database.db import Database, get_database
+from api.database.instrumentation import track_queries
+
+logger = logging.getLogger('database.archive')
+
+# Flights 保留的天數，起飛時間早於此天數的航班會被封存
+ARCHIVE_AFTER_DAYS = int(os.getenv('FLIGHTS_ARCHIVE_AFTER_DAYS', '30'))
+# 每批移動的資料列數，每批各自提交以縮短鎖定時間
+ARCHIVE_BATCH_SIZE = int(os.getenv('FLIGHTS_ARCHIVE_BATCH_SIZE', '5000'))
+
+# 合併 Flights 與封存表的檢視名稱
+HISTORY_VIEW = 'FlightsHistory'
+
+# 檢視建立後不會再移除，確認存在後不必重複查詢
+_history_view_exists = False
+
+
+def archive_cutoff(after_days: int = ARCHIVE_AFTER_DAYS, today: Optional[datetime.date] = None) -> datetime.datetime:
+    """
+    取得封存的起飛時間上限
+
+    參數:
+        after_days: Flights 保留的天數
+        today: 基準日期，預設為今天
+
+    返回:
+        起飛時間早於此時間的航班應被封存
+    """
+    today = today or datetime.date.today()
+    return datetime.datetime.combine(today - datetime.timedelta(days=after_days), datetime.time.min)
+
+
+def needs_history(start_date: Optional[datetime.date], after_days: int = ARCHIVE_AFTER_DAYS) -> bool:
+    """
+    判斷日期範圍是否可能包含已封存的航班
+
+    參數:
+        start_date: 查詢開始日期，None 表示不限
+
+    返回:
+        是否需要合併封存表
+    """
+    return start_date is None or start_date < archive_cutoff(after_days).date()
+
+
+def flights_table(start_date: Optional[datetime.date] = None, database: Optional[Database] = None) -> str:
+    """
+    取得查詢指定日期範圍時應使用的資料表
+
+    參數:
+        start_date: 查詢開始日期，None 表示不限
+        database: 資料存取入口，不提供時使用共用實例
+
+    返回:
+        'Flights' 或合併封存表的 'FlightsHistory'
+    """
+    global _history_view_exists
+    if not needs_history(start_date):
+        return 'Flights'
+    if not _history_view_exists:
+        # 尚未執行過封存時沒有檢視，也沒有需要合併的資料
+        _history_view_exists = bool((database or get_database()).fetch_value('archive.view_exists'))
+    return HISTORY_VIEW if _history_view_exists else 'Flights'
+
+
+@track_queries('archive_flights')
+def archive_flights(
+    after_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    database: Optional[Database] = None
+) -> int:
+    """
+    將起飛時間早於保留天數的航班移到封存表 (第一次執行時建立封存表與檢視)；
+    仍被機票、價格紀錄參照的航班會保留在 Flights
+
+    參數:
+        after_days: Flights 保留的天數
+        batch_size: 每批移動的資料列數
+        database: 資料存取入口，不提供時使用共用實例
+
+    返回:
+        封存的航班數量
+    """
+    database = database or get_database()
+    cutoff = archive_cutoff(after_days)
+
+    with database.session() as session:
+        session.execute('archive.create_table')
+    with database.session() as session:
+        session.execute('archive.create_view')
+
+    total = 0
+    while True:
+        moved = database.execute('archive.move_batch', [batch_size, cutoff])
+        total += moved
+        if moved < batch_size:
+            break
+        logger.info(f"已封存 {total} 筆航班...")
+
+    logger.info(f"封存完成: {total} 筆起飛時間早於 {cutoff:%Y-%m-%d} 的航班已移至 FlightsArchive")
+    return total
@@ -0,0 +1,84 @@
+"""
+航班變更紀錄
+寫入 Flights 的程式在同一交易中記錄受影響的 (出發機場, 到達機場, 日期)，
+API worker 輪詢 FlightChangeLog 後只清除這些航線與日期的快取
+"""
+import datetime
+import logging
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+from api.database.db import Database, Session, get_database
+from api.database.route_summary import refresh_route_summaries
+
+logger = logging.getLogger('database.changes')
+
+# (出發機場, 到達機場, 日期 YYYY-MM-DD)
+ChangeKey = Tuple[str, str, str]
+
+
+def flight_change_key(departure_airport_code: str, arrival_airport_code: str, departure: Any) -> ChangeKey:
+    """
+    建立變更鍵
+
+    參數:
+        departure_airport_code: 出發機場代碼
+        arrival_airport_code: 到達機場代碼
+        departure: 起飛時間或日期 (datetime、date 或以日期開頭的字串)
+
+    返回:
+        (出發機場, 到達機場, 日期 YYYY-MM-DD)
+    """
+    if isinstance(departure, (datetime.date, datetime.datetime)):
+        departure = departure.strftime('%Y-%m-%d')
+    return (str(departure_airport_code).upper(), str(arrival_airport_code).upper(), str(departure)[:10])
+
+
+def record_flight_changes(session: Session, keys: Iterable[ChangeKey]) -> int:
+    """
+    在目前交易中記錄受影響的航線與日期並更新這些航線的摘要，與航班寫入一起提交
+
+    參數:
+        session: 寫入航班的工作階段
+        keys: flight_change_key 建立的變更鍵
+
+    返回:
+        記錄的變更數量
+    """
+    rows = sorted(set(keys))
+    if not rows:
+        return 0
+    # 資料表不存在時建立；與寫入同一交易，交易回滾時不會留下只建立一半的狀態
+    session.execute('flight_changes.create_table')
+    count = session.execute_many('flight_changes.insert', rows)
+    refresh_route_summaries(session, {(departure, arrival) for departure, arrival, _ in rows})
+    return count
+
+
+def fetch_flight_changes(after_id: int, database: Optional[Database] = None) -> List[Tuple[int, Set[ChangeKey]]]:
+    """
+    取得指定編號之後的變更
+
+    參數:
+        after_id: 已處理的最後一個變更編號
+        database: 資料存取入口，不提供時使用共用實例
+
+    返回:
+        [(變更編號, 變更鍵)]，依編號排序
+    """
+    rows = (database or get_database()).fetch_all('flight_changes.since', [after_id])
+    return [(row[0], flight_change_key(row[1], row[2], row[3])) for row in rows]
+
+
+def latest_flight_change_id(database: Optional[Database] = None) -> int:
+    """取得目前最新的變更編號，沒有變更時返回0"""
+    return int((database or get_database()).fetch_value('flight_changes.latest_id') or 0)
+
+
+def purge_flight_changes(older_than: datetime.timedelta = datetime.timedelta(days=1), database: Optional[Database] = None) -> int:
+    """
+    刪除過舊的變更紀錄
+
+    返回:
+        刪除的紀錄數量
+    """
+    return max((database or get_database()).execute('flight_changes.purge', [datetime.datetime.now() - older_than]), 0)
@@ -0,0 +1,284 @@
+"""
+資料庫連接管理
+集中管理連接字串、連接逾時、暫時性錯誤重試與連接池，
+所有存取資料庫的模組都應透過這裡取得連接
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+import pyodbc
+from dotenv import load_dotenv
+
+from api.database.instrumentation import record_connection
+
+logger = logging.getLogger('database')
+
+# 載入專案根目錄的環境變數
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+load_dotenv(os.path.join(project_root, '.env'))
+
+# 未設定 DB_CONNECTION_STRING 時使用的預設連接字串
+DEFAULT_CONNECTION_STRING = 'Driver={ODBC Driver 17 for SQL Server};Server=localhost;Database=FlightBookingDB;Trusted_Connection=yes;'
+
+# 連接逾時與查詢逾時(秒)，查詢逾時為0表示不限制
+CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '30'))
+QUERY_TIMEOUT = int(os.getenv('DB_QUERY_TIMEOUT', '30'))
+
+# 暫時性錯誤的重試次數與初始等待時間(秒)
+MAX_RETRIES = int(os.getenv('DB_MAX_RETRIES', '3'))
+RETRY_BACKOFF = float(os.getenv('DB_RETRY_BACKOFF', '0.5'))
+
+# 連接池大小，以及閒置超過多久(秒)的連接在取用前需先檢查是否仍可使用
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))
+
+# 寫入後同一執行緒的讀取改走主資料庫的秒數 (讀取副本可能尚未同步剛寫入的資料)
+READ_PIN_SECONDS = float(os.getenv('DB_READ_PIN_SECONDS', '5'))
+
+# 可重試的 SQLSTATE: 連線中斷、伺服器暫時拒絕連線、逾時、死結
+# 無法建立連線 (08001) 不重試，資料庫停機時呼叫端可立即改用備用資料
+TRANSIENT_SQLSTATES = {'08S01', '08004', 'HYT00', 'HYT01', '40001'}
+
+
+def get_connection_string() -> str:
+    """取得資料庫連接字串，優先使用環境變數 DB_CONNECTION_STRING"""
+    connection_string = os.getenv('DB_CONNECTION_STRING')
+    if not connection_string:
+        logger.warning("找不到環境變數DB_CONNECTION_STRING，使用預設連接字串")
+        connection_string = DEFAULT_CONNECTION_STRING
+    return connection_string
+
+
+def get_read_connection_string() -> Optional[str]:
+    """取得唯讀副本的連接字串 (環境變數 DB_READ_CONNECTION_STRING)，未設定時返回None"""
+    return os.getenv('DB_READ_CONNECTION_STRING') or None
+
+
+def is_transient_error(error: Exception) -> bool:
+    """判斷資料庫錯誤是否為可重試的暫時性錯誤"""
+    if not isinstance(error, pyodbc.Error) or not error.args:
+        return False
+    return str(error.args[0]) in TRANSIENT_SQLSTATES
+
+
+def with_retries(operation: Callable[[], Any], retries: int = MAX_RETRIES) -> Any:
+    """
+    執行資料庫操作，遇到暫時性錯誤時以指數退避重試
+
+    參數:
+        operation: 要執行的操作
+        retries: 最多重試次數
+
+    返回:
+        操作的返回值
+    """
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except pyodbc.Error as e:
+            if attempt >= retries or not is_transient_error(e):
+                raise
+            delay = RETRY_BACKOFF * (2 ** attempt)
+            attempt += 1
+            logger.warning(f"資料庫暫時性錯誤，{delay:.1f} 秒後重試 ({attempt}/{retries}): {e}")
+            time.sleep(delay)
+
+
+def connect(connection_string: Optional[str] = None, autocommit: bool = False) -> pyodbc.Connection:
+    """
+    建立新的資料庫連接 (遇到暫時性錯誤會重試)
+
+    參數:
+        connection_string: 連接字串，不提供時使用 get_connection_string()
+        autocommit: 是否自動提交
+
+    返回:
+        pyodbc 連接
+    """
+    connection_string = connection_string or get_connection_string()
+
+    def open_connection():
+        conn = pyodbc.connect(connection_string, timeout=CONNECT_TIMEOUT, autocommit=autocommit)
+        conn.timeout = QUERY_TIMEOUT
+        return conn
+
+    conn = with_retries(open_connection)
+    record_connection()
+    return conn
+
+
+class PooledConnection:
+    """
+    連接池中的連接
+    介面與 pyodbc 連接相同，close() 時將連接歸還連接池而非真正關閉
+    """
+
+    def __init__(self, pool: 'ConnectionPool', conn: pyodbc.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name: str) -> Any:
+        if self._conn is None:
+            raise pyodbc.ProgrammingError('連接已歸還連接池')
+        return getattr(self._conn, name)
+
+    def close(self) -> None:
+        """歸還連接，未提交的交易會先回滾"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+
+
+class ConnectionPool:
+    """
+    簡單的執行緒安全連接池
+    重複使用已建立的連接，省去每次請求建立連線與登入的時間
+    """
+
+    def __init__(self, size: int = POOL_SIZE, connection_string: Optional[str] = None):
+        """
+        初始化連接池
+
+        參數:
+            size: 最多保留的閒置連接數
+            connection_string: 連接字串，不提供時使用 get_connection_string()
+        """
+        self.size = size
+        self.connection_string = connection_string
+        # (連接, 歸還時間)，後進先出讓常用的連接保持活躍
+        self._idle: 'queue.LifoQueue[Tuple[pyodbc.Connection, float]]' = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def acquire(self) -> PooledConnection:
+        """
+        取得連接，沒有閒置連接時建立新連接
+
+        返回:
+            連接池連接，使用完畢後呼叫 close() 歸還
+        """
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - released_at < POOL_PING_AFTER or self._is_alive(conn):
+                record_connection()
+                return PooledConnection(self, conn)
+            self._discard(conn)
+
+        conn = connect(self.connection_string)
+        with self._lock:
+            self.created += 1
+        return PooledConnection(self, conn)
+
+    def warm(self, count: Optional[int] = None) -> int:
+        """
+        預先建立連接並放入連接池，讓第一批請求不必等待連線與登入
+
+        參數:
+            count: 要準備的閒置連接數，不提供時填滿連接池
+
+        返回:
+            目前的閒置連接數
+        """
+        count = self.size if count is None else min(count, self.size)
+        acquired = []
+        try:
+            while len(acquired) < count - self._idle.qsize():
+                acquired.append(self.acquire())
+        finally:
+            for conn in acquired:
+                conn.close()
+        return self._idle.qsize()
+
+    def release(self, conn: pyodbc.Connection) -> None:
+        """歸還連接，連接池已滿或連接已失效時直接關閉"""
+        try:
+            conn.rollback()
+            self._idle.put_nowait((conn, time.monotonic()))
+        except (pyodbc.Error, queue.Full):
+            self._discard(conn)
+
+    def close_all(self) -> None:
+        """關閉所有閒置連接"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait()[0])
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _is_alive(conn: pyodbc.Connection) -> bool:
+        """檢查閒置連接是否仍可使用"""
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _discard(conn: pyodbc.Connection) -> None:
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+
+# 單例實現
+_pool_instance: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    獲取連接池的單例實例
+
+    返回:
+        連接池實例
+    """
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = ConnectionPool()
+    return _pool_instance
+
+
+_read_pool_instance: Optional[ConnectionPool] = None
+
+
+def get_read_pool() -> ConnectionPool:
+    """
+    獲取唯讀副本連接池的單例實例，未設定 DB_READ_CONNECTION_STRING 時與主資料庫共用連接池
+
+    返回:
+        連接池實例
+    """
+    global _read_pool_instance
+    read_connection_string = get_read_connection_string()
+    if read_connection_string is None:
+        return get_pool()
+    if _read_pool_instance is None:
+        with _pool_lock:
+            if _read_pool_instance is None:
+                _read_pool_instance = ConnectionPool(connection_string=read_connection_string)
+    return _read_pool_instance
@@ -0,0 +1,291 @@
+"""
+資料存取介面
+以具名查詢執行讀寫，統一處理連接池、游標重複使用、型別對應、批次寫入與暫時性錯誤重試
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Type
+
+from api.database.connection import READ_PIN_SECONDS, ConnectionPool, get_pool, get_read_pool, with_retries
+from api.database.instrumentation import InstrumentedCursor
+from api.database.queries import get_query
+from api.database.rows import map_rows
+
+logger = logging.getLogger('database')
+
+# 批次寫入時每次送出的資料列數
+BATCH_SIZE = 1000
+
+
+class Session:
+    """
+    單一連接上的資料庫工作階段
+    整個工作階段共用同一個游標，連續執行相同語句時 pyodbc 會重複使用已準備好的語句；
+    游標會記錄每個語句的執行時間 (見 api.database.instrumentation)
+    """
+
+    def __init__(self, conn: Any):
+        """
+        初始化工作階段
+
+        參數:
+            conn: 資料庫連接
+        """
+        self.conn = conn
+        self.cursor = InstrumentedCursor(conn.cursor())
+
+    def execute(self, name: str, params: Sequence[Any] = (), **in_lists: int) -> Any:
+        """
+        執行具名查詢
+
+        參數:
+            name: 查詢名稱
+            params: 查詢參數
+            in_lists: IN 條件的參數數量
+
+        返回:
+            游標
+        """
+        return self.cursor.execute(get_query(name, **in_lists), params)
+
+    def fetch_all(self, name: str, params: Sequence[Any] = (), row_type: Optional[Type] = None, **in_lists: int) -> List[Any]:
+        """
+        執行查詢並取得所有結果
+
+        參數:
+            name: 查詢名稱
+            params: 查詢參數
+            row_type: 結果型別 (具名元組或 dict)，不提供時返回 pyodbc 資料列
+            in_lists: IN 條件的參數數量
+
+        返回:
+            結果列表
+        """
+        self.execute(name, params, **in_lists)
+        rows = self.cursor.fetchall()
+        if row_type is None:
+            return rows
+        return map_rows(self.cursor.description, rows, row_type)
+
+    def fetch_one(self, name: str, params: Sequence[Any] = (), row_type: Optional[Type] = None, **in_lists: int) -> Any:
+        """執行查詢並取得第一筆結果，沒有結果時返回None"""
+        self.execute(name, params, **in_lists)
+        row = self.cursor.fetchone()
+        if row is None or row_type is None:
+            return row
+        return map_rows(self.cursor.description, [row], row_type)[0]
+
+    def fetch_value(self, name: str, params: Sequence[Any] = (), **in_lists: int) -> Any:
+        """執行查詢並取得第一筆結果的第一個欄位"""
+        self.execute(name, params, **in_lists)
+        return self.cursor.fetchval()
+
+    def execute_many(self, name: str, rows: Sequence[Sequence[Any]], batch_size: int = BATCH_SIZE) -> int:
+        """
+        以 fast_executemany 批次執行寫入語句，參數以陣列一次送出，不必每筆往返資料庫
+
+        參數:
+            name: 查詢名稱
+            rows: 參數列表
+            batch_size: 每批資料列數
+
+        返回:
+            送出的資料列數
+        """
+        if not rows:
+            return 0
+
+        sql = get_query(name)
+        self.cursor.fast_executemany = True
+        try:
+            for start in range(0, len(rows), batch_size):
+                self.cursor.executemany(sql, rows[start:start + batch_size])
+        finally:
+            self.cursor.fast_executemany = False
+        return len(rows)
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        self.conn.rollback()
+
+    def close(self) -> None:
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+
+
+class Database:
+    """
+    資料存取入口
+    單次讀寫方法各自取得連接並在完成後歸還；需要在同一交易中執行多個語句時使用 session()
+    讀取走唯讀副本、寫入走主資料庫；同一執行緒寫入後的短時間內讀取也走主資料庫，確保讀得到自己剛寫入的資料
+    """
+
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        read_pool: Optional[ConnectionPool] = None,
+        pin_seconds: float = READ_PIN_SECONDS
+    ):
+        """
+        初始化資料存取入口
+
+        參數:
+            pool: 主資料庫連接池，不提供時使用共用連接池
+            read_pool: 唯讀副本連接池，不提供時使用共用的副本連接池 (指定 pool 時與 pool 相同)
+            pin_seconds: 寫入後讀取改走主資料庫的秒數
+        """
+        self.pool = pool or get_pool()
+        self.read_pool = read_pool or (self.pool if pool else get_read_pool())
+        self.pin_seconds = pin_seconds
+        self._local = threading.local()
+        self.replica_fallbacks = 0
+
+    def is_pinned(self) -> bool:
+        """目前執行緒是否在寫入後的主資料庫讀取期間"""
+        last_write = getattr(self._local, 'last_write', None)
+        return last_write is not None and time.monotonic() - last_write < self.pin_seconds
+
+    @contextmanager
+    def session(self, readonly: bool = False) -> Iterator[Session]:
+        """
+        取得工作階段，正常結束時提交，發生例外時回滾
+
+        參數:
+            readonly: 是否只讀取，只讀取時使用唯讀副本 (寫入後的短時間內仍使用主資料庫)
+
+        返回:
+            工作階段
+        """
+        pool = self.read_pool if readonly and not self.is_pinned() else self.pool
+        with self._session(pool) as session:
+            yield session
+        if not readonly:
+            self._local.last_write = time.monotonic()
+
+    @contextmanager
+    def _session(self, pool: ConnectionPool) -> Iterator[Session]:
+        conn = pool.acquire()
+        session = Session(conn)
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            try:
+                session.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            session.close()
+            conn.close()
+
+    def _run(self, operation, readonly: bool = False) -> Any:
+        """在新的工作階段中執行操作，暫時性錯誤時整個操作重試"""
+        def attempt():
+            with self.session(readonly) as session:
+                return operation(session)
+
+        if not readonly or self.read_pool is self.pool:
+            return with_retries(attempt)
+        try:
+            return with_retries(attempt)
+        except Exception as e:
+            # 唯讀副本無法使用時改由主資料庫讀取
+            self.replica_fallbacks += 1
+            logger.warning(f"唯讀副本查詢失敗，改由主資料庫讀取: {e}")
+
+            def attempt_primary():
+                with self._session(self.pool) as session:
+                    return operation(session)
+            return with_retries(attempt_primary)
+
+    def fetch_all(self, name: str, params: Sequence[Any] = (), row_type: Optional[Type] = None, **in_lists: int) -> List[Any]:
+        """執行查詢並取得所有結果，參數同 Session.fetch_all"""
+        return self._run(lambda session: session.fetch_all(name, params, row_type, **in_lists), readonly=True)
+
+    def fetch_one(self, name: str, params: Sequence[Any] = (), row_type: Optional[Type] = None, **in_lists: int) -> Any:
+        """執行查詢並取得第一筆結果"""
+        return self._run(lambda session: session.fetch_one(name, params, row_type, **in_lists), readonly=True)
+
+    def fetch_value(self, name: str, params: Sequence[Any] = (), **in_lists: int) -> Any:
+        """執行查詢並取得單一值"""
+        return self._run(lambda session: session.fetch_value(name, params, **in_lists), readonly=True)
+
+    def execute(self, name: str, params: Sequence[Any] = (), **in_lists: int) -> int:
+        """
+        執行寫入語句並提交
+
+        返回:
+            影響的資料列數
+        """
+        return self._run(lambda session: session.execute(name, params, **in_lists).rowcount)
+
+    def execute_many(self, name: str, rows: Sequence[Sequence[Any]], batch_size: int = BATCH_SIZE) -> int:
+        """
+        批次執行寫入語句並提交 (同一交易)
+
+        返回:
+            送出的資料列數
+        """
+        return self._run(lambda session: session.execute_many(name, rows, batch_size))
+
+    def warm(self, count: Optional[int] = None) -> Dict[str, int]:
+        """
+        預先建立主資料庫與唯讀副本的連接
+
+        參數:
+            count: 每個連接池要準備的閒置連接數，不提供時填滿連接池
+
+        返回:
+            各連接池的閒置連接數
+        """
+        idle = {'primary': with_retries(lambda: self.pool.warm(count))}
+        if self.read_pool is not self.pool:
+            idle['replica'] = with_retries(lambda: self.read_pool.warm(count))
+        return idle
+
+    def transaction(self, operation: Callable[[Session], Any]) -> Any:
+        """
+        在同一交易中執行多個寫入語句並提交，暫時性錯誤時整個操作重試
+
+        參數:
+            operation: 接收工作階段的函數
+
+        返回:
+            operation 的返回值
+        """
+        return self._run(operation)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得連接池統計資訊"""
+        stats = {
+            'pool_size': self.pool.size,
+            'connections_created': self.pool.created
+        }
+        if self.read_pool is not self.pool:
+            stats['read_connections_created'] = self.read_pool.created
+            stats['replica_fallbacks'] = self.replica_fallbacks
+        return stats
+
+
+# 單例實現
+_database_instance = None
+
+
+def get_database() -> Database:
+    """
+    獲取資料存取入口的單例實例
+
+    返回:
+        資料存取入口實例
+    """
+    global _database_instance
+    if _database_instance is None:
+        _database_instance = Database()
+    return _database_instance
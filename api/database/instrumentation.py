@@ -0,0 +1,230 @@
+"""
+查詢統計
+記錄每個語句的執行時間，超過門檻時寫入慢查詢日誌 (正規化的 SQL 與參數型別)，
+並依請求或工作統計查詢與連接次數，用於找出逐筆查詢 (N+1) 的程式碼
+"""
+import contextvars
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('database.queries')
+slow_query_logger = logging.getLogger('database.slow_query')
+
+# 慢查詢門檻(秒)
+SLOW_QUERY_SECONDS = float(os.getenv('DB_SLOW_QUERY_SECONDS', '0.5'))
+# 工作結束時列出執行次數最多的語句數
+SUMMARY_TOP_STATEMENTS = 3
+
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    正規化 SQL: 合併空白、將字面值換成 ?、將 IN 條件的多個參數合併為 ?...
+
+    參數:
+        sql: SQL 語句
+
+    返回:
+        正規化後的 SQL，相同結構的語句會得到相同結果
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('?...', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def param_shape(params: Any, many: bool = False) -> str:
+    """
+    取得參數的型別描述 (不含參數值)
+
+    參數:
+        params: 查詢參數
+        many: 是否為批次執行的參數列表
+
+    返回:
+        例如 '(str, datetime, int)' 或 '1000 x (str, datetime)'
+    """
+    if many:
+        rows = list(params) if params is not None else []
+        return f"{len(rows)} x {param_shape(rows[0]) if rows else '()'}"
+    if params is None:
+        return '()'
+    if not isinstance(params, (list, tuple)):
+        params = (params,)
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+class QueryStats:
+    """單一請求或工作的查詢統計"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+        self.connections = 0
+        self.total_seconds = 0.0
+        self.slow_queries = 0
+        # 正規化 SQL -> [執行次數, 總時間]
+        self.statements: Dict[str, List[float]] = {}
+        self.started_at = time.perf_counter()
+
+    def record_query(self, sql: str, elapsed: float, slow: bool) -> None:
+        self.queries += 1
+        self.total_seconds += elapsed
+        if slow:
+            self.slow_queries += 1
+        entry = self.statements.setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def top_statements(self, count: int = SUMMARY_TOP_STATEMENTS) -> List[Tuple[str, int, float]]:
+        """執行次數最多的語句 [(正規化 SQL, 次數, 總時間)]"""
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][0], reverse=True)
+        return [(sql, int(calls), seconds) for sql, (calls, seconds) in ranked[:count]]
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started_at
+        return (
+            f"{self.name}: {self.queries} 次查詢, {self.connections} 次取得連接, "
+            f"資料庫 {self.total_seconds * 1000:.0f} ms / 總計 {elapsed * 1000:.0f} ms"
+            + (f", {self.slow_queries} 次慢查詢" if self.slow_queries else '')
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'queries': self.queries,
+            'connections': self.connections,
+            'db_ms': round(self.total_seconds * 1000, 1),
+            'slow_queries': self.slow_queries
+        }
+
+
+# 目前執行中的統計 (可巢狀，例如工作中的單一步驟)
+_active_stats: contextvars.ContextVar[Tuple[QueryStats, ...]] = contextvars.ContextVar('active_query_stats', default=())
+
+
+def record_query(sql: str, params: Any, elapsed: float, many: bool = False) -> None:
+    """
+    記錄一次語句執行，超過慢查詢門檻時寫入日誌
+
+    參數:
+        sql: SQL 語句
+        params: 查詢參數
+        elapsed: 執行時間(秒)
+        many: 是否為批次執行
+    """
+    normalized = normalize_sql(sql)
+    slow = elapsed >= SLOW_QUERY_SECONDS
+    if slow:
+        slow_query_logger.warning(f"慢查詢 {elapsed * 1000:.0f} ms: {normalized} 參數: {param_shape(params, many)}")
+    for stats in _active_stats.get():
+        stats.record_query(normalized, elapsed, slow)
+
+
+def record_connection() -> None:
+    """記錄一次取得連接 (新建或自連接池取出)"""
+    for stats in _active_stats.get():
+        stats.connections += 1
+
+
+def start_tracking(name: str) -> Tuple[QueryStats, contextvars.Token]:
+    """
+    開始統計查詢，需以 stop_tracking() 結束；一般情況使用 track_queries()
+
+    返回:
+        (統計物件, 用於結束統計的 token)
+    """
+    stats = QueryStats(name)
+    token = _active_stats.set(_active_stats.get() + (stats,))
+    return stats, token
+
+
+def stop_tracking(token: contextvars.Token) -> None:
+    _active_stats.reset(token)
+
+
+@contextmanager
+def track_queries(name: str, log: bool = True) -> Iterator[QueryStats]:
+    """
+    統計區塊內的查詢與連接次數
+
+    參數:
+        name: 請求或工作名稱
+        log: 結束時是否寫入摘要日誌
+
+    返回:
+        統計物件
+    """
+    stats, token = start_tracking(name)
+    try:
+        yield stats
+    finally:
+        stop_tracking(token)
+        if log:
+            logger.info(stats.summary())
+            for sql, calls, seconds in stats.top_statements():
+                if calls > 1:
+                    logger.info(f"  {calls} 次 / {seconds * 1000:.0f} ms: {sql}")
+
+
+@contextmanager
+def assert_max_queries(limit: int, connections: Optional[int] = None) -> Iterator[QueryStats]:
+    """
+    測試輔助: 區塊內的查詢次數超過上限時拋出 AssertionError
+
+    參數:
+        limit: 查詢次數上限
+        connections: (可選) 取得連接次數上限
+
+    返回:
+        統計物件
+    """
+    with track_queries('assert_max_queries', log=False) as stats:
+        yield stats
+    if stats.queries > limit:
+        statements = '\n'.join(f"  {calls} x {sql}" for sql, calls, _ in stats.top_statements())
+        raise AssertionError(f"預期最多 {limit} 次查詢，實際執行 {stats.queries} 次:\n{statements}")
+    if connections is not None and stats.connections > connections:
+        raise AssertionError(f"預期最多取得 {connections} 次連接，實際 {stats.connections} 次")
+
+
+class InstrumentedCursor:
+    """
+    記錄執行時間的游標
+    其餘屬性 (fetchall、fast_executemany 等) 皆轉交原始游標
+    """
+
+    def __init__(self, cursor: Any):
+        object.__setattr__(self, '_cursor', cursor)
+
+    def execute(self, sql: str, *params: Any) -> 'InstrumentedCursor':
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        finally:
+            record_query(sql, params[0] if len(params) == 1 else params, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql: str, seq_of_params: Sequence[Sequence[Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        finally:
+            record_query(sql, seq_of_params, time.perf_counter() - started, many=True)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._cursor, name, value)
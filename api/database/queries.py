@@ -0,0 +1,526 @@
+"""
+具名參數化查詢
+所有模組共用的 SQL 集中在這裡，相同的語句文字讓 pyodbc 與 SQL Server 能重複使用已編譯的執行計畫；
+需要展開 IN 條件的查詢以 {名稱} 標示，呼叫 get_query 時傳入參數數量
+"""
+from typing import Dict
+
+QUERIES: Dict[str, str] = {
+    # 機場
+    'airports.list': """
+        SELECT airport_id AS code, airport_name_zh AS name
+        FROM Airports
+        ORDER BY airport_name_zh
+    """,
+    'airports.details': """
+        SELECT airport_id AS code, airport_name_zh AS name, city_zh, country
+        FROM Airports
+        ORDER BY airport_name_zh
+    """,
+    'airports.signature': """
+        SELECT COUNT(*), MAX(updated_at) FROM Airports
+    """,
+    'airports.domestic': """
+        SELECT airport_id AS code, airport_name_zh AS name, city_zh AS city
+        FROM Airports
+        WHERE airport_id IN ('TPE', 'TSA', 'KHH', 'RMQ', 'TNN', 'TTT', 'HUN')
+    """,
+    'airports.destinations': """
+        SELECT DISTINCT f.arrival_airport_code AS code, a.airport_name_zh AS name, a.city_zh AS city
+        FROM Flights f
+        JOIN Airports a ON f.arrival_airport_code = a.airport_id
+        WHERE f.departure_airport_code = ?
+    """,
+    'airports.ids': """
+        SELECT airport_id FROM Airports
+    """,
+    'airports.columns': """
+        SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Airports'
+    """,
+
+    # 航空公司
+    'airlines.list': """
+        SELECT airline_id AS id, airline_name_zh AS name
+        FROM Airlines
+        ORDER BY airline_name_zh
+    """,
+    'airlines.for_route': """
+        SELECT DISTINCT al.airline_id AS id, al.airline_name_zh AS name
+        FROM Flights f
+        JOIN Airlines al ON f.airline_id = al.airline_id
+        WHERE f.departure_airport_code = ? AND f.arrival_airport_code = ?
+    """,
+    'airlines.get': """
+        SELECT airline_id FROM Airlines WHERE airline_id = ?
+    """,
+    'airlines.insert': """
+        INSERT INTO Airlines (airline_id, airline_name_en, airline_name_zh, created_at, updated_at)
+        VALUES (?, ?, ?, GETDATE(), GETDATE())
+    """,
+
+    # 航班查詢
+    'flights.search': """
+        SELECT
+            f.flight_number,
+            f.scheduled_departure,
+            f.scheduled_arrival,
+            f.departure_airport_code,
+            f.arrival_airport_code,
+            f.airline_id,
+            f.flight_status,
+            f.aircraft_type,
+            f.price,
+            f.booking_link
+        FROM Flights f
+        WHERE
+            f.departure_airport_code IN ({departure_codes})
+            AND f.arrival_airport_code IN ({arrival_codes})
+            AND CONVERT(date, f.scheduled_departure) = ?
+        ORDER BY f.scheduled_departure
+    """,
+    'flights.search_by_airline': """
+        SELECT
+            f.flight_number,
+            f.scheduled_departure,
+            f.scheduled_arrival,
+            f.departure_airport_code,
+            f.arrival_airport_code,
+            f.airline_id,
+            f.flight_status,
+            f.aircraft_type,
+            f.price,
+            f.booking_link
+        FROM Flights f
+        WHERE
+            f.departure_airport_code IN ({departure_codes})
+            AND f.arrival_airport_code IN ({arrival_codes})
+            AND CONVERT(date, f.scheduled_departure) = ?
+            AND f.airline_id = ?
+        ORDER BY f.scheduled_departure
+    """,
+    # 以主鍵 (flight_number, scheduled_departure) 範圍查詢，避免對欄位套用函數導致無法使用索引
+    'flights.statuses': """
+        SELECT flight_number, scheduled_departure, flight_status, actual_departure, actual_arrival
+        FROM Flights
+        WHERE flight_number IN ({flight_numbers})
+        AND scheduled_departure >= ? AND scheduled_departure < ?
+        ORDER BY flight_number, scheduled_departure
+    """,
+    'flights.status_changes': """
+        SELECT flight_number, scheduled_departure, departure_airport_code, arrival_airport_code,
+               flight_status, actual_departure, actual_arrival, updated_at
+        FROM Flights
+        WHERE updated_at >= ?
+        ORDER BY updated_at
+    """,
+    # 狀態變更輪詢器的比對基準: 參數為起飛時間範圍 (開始, 結束)
+    'flights.status_baseline': """
+        SELECT flight_number, scheduled_departure, departure_airport_code, arrival_airport_code,
+               flight_status, actual_departure, actual_arrival, updated_at
+        FROM Flights
+        WHERE scheduled_departure >= ? AND scheduled_departure < ?
+    """,
+    'flights.airline_schedule': """
+        SELECT flight_number, airline_id, departure_airport_code, arrival_airport_code,
+               scheduled_departure, scheduled_arrival, flight_status
+        FROM Flights
+        WHERE airline_id = ?
+        AND CONVERT(date, scheduled_departure) BETWEEN ? AND ?
+    """,
+    'flights.existing_keys': """
+        SELECT flight_number, scheduled_departure
+        FROM Flights
+        WHERE flight_number IN ({flight_numbers})
+        AND scheduled_departure >= ? AND scheduled_departure < ?
+    """,
+    'flights.exists_on_date': """
+        SELECT COUNT(*) FROM Flights
+        WHERE flight_number = ? AND departure_airport_code = ?
+        AND arrival_airport_code = ? AND CAST(scheduled_departure AS DATE) = CAST(? AS DATE)
+    """,
+    # 查詢規劃：起飛時間範圍內已有資料的航空公司與航線組合
+    'flights.coverage': """
+        SELECT DISTINCT airline_id, departure_airport_code, arrival_airport_code
+        FROM Flights
+        WHERE scheduled_departure >= ? AND scheduled_departure < ?
+    """,
+
+    # 航班寫入
+    'flights.insert': """
+        INSERT INTO Flights (
+            flight_number, scheduled_departure, airline_id, departure_airport_code,
+            arrival_airport_code, scheduled_arrival, flight_status, aircraft_type,
+            price, booking_link, scrape_date, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
+    """,
+    # 與 flights.insert 相同的參數，同一天已有相同航班與航線時略過，適合批次寫入
+    'flights.insert_if_missing': """
+        INSERT INTO Flights (
+            flight_number, scheduled_departure, airline_id, departure_airport_code,
+            arrival_airport_code, scheduled_arrival, flight_status, aircraft_type,
+            price, booking_link, scrape_date, created_at, updated_at
+        )
+        SELECT v.flight_number, v.scheduled_departure, v.airline_id, v.departure_airport_code,
+               v.arrival_airport_code, v.scheduled_arrival, v.flight_status, v.aircraft_type,
+               v.price, v.booking_link, v.scrape_date, GETDATE(), GETDATE()
+        FROM (VALUES (?, CAST(? AS DATETIME2), ?, ?, ?, CAST(? AS DATETIME2), ?, ?, CAST(? AS DECIMAL(10, 2)), ?, CAST(? AS DATETIME2))) AS v (
+            flight_number, scheduled_departure, airline_id, departure_airport_code,
+            arrival_airport_code, scheduled_arrival, flight_status, aircraft_type,
+            price, booking_link, scrape_date
+        )
+        WHERE NOT EXISTS (
+            SELECT 1 FROM Flights f
+            WHERE f.flight_number = v.flight_number
+            AND f.departure_airport_code = v.departure_airport_code
+            AND f.arrival_airport_code = v.arrival_airport_code
+            AND CAST(f.scheduled_departure AS DATE) = CAST(v.scheduled_departure AS DATE)
+        )
+    """,
+    'flights.insert_schedule': """
+        INSERT INTO Flights (
+            flight_number, scheduled_departure, airline_id,
+            departure_airport_code, arrival_airport_code, scheduled_arrival,
+            flight_status, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
+    """,
+    'flights.update_schedule': """
+        UPDATE Flights SET
+            airline_id = ?,
+            departure_airport_code = ?,
+            arrival_airport_code = ?,
+            scheduled_arrival = ?,
+            updated_at = GETDATE()
+        WHERE flight_number = ? AND scheduled_departure = ?
+    """,
+    # OUTPUT 取回實際更新的航班與更新前的狀態
+    'flights.update_realtime_status': """
+        UPDATE Flights
+        SET flight_status = ?,
+            actual_departure = ?,
+            actual_arrival = ?,
+            updated_at = ?
+        OUTPUT inserted.flight_number, inserted.scheduled_departure,
+               inserted.departure_airport_code, inserted.arrival_airport_code
+        WHERE flight_number = ?
+        AND airline_id = ?
+        AND CONVERT(date, scheduled_departure) = CONVERT(date, GETDATE())
+    """,
+
+    # 歷史航班封存 (封存表與 Flights 欄位相同，另加 archived_at)
+    'archive.create_table': """
+        IF OBJECT_ID('FlightsArchive', 'U') IS NULL
+        BEGIN
+            SELECT TOP 0
+                flight_number, scheduled_departure, airline_id, departure_airport_code,
+                arrival_airport_code, scheduled_arrival, actual_departure, actual_arrival,
+                flight_status, aircraft_type, price, booking_link, scrape_date,
+                created_at, updated_at, CAST(NULL AS datetime2) AS archived_at
+            INTO FlightsArchive
+            FROM Flights;
+            CREATE CLUSTERED INDEX IX_FlightsArchive_departure ON FlightsArchive (scheduled_departure, flight_number);
+        END
+    """,
+    # 歷史查詢使用的檢視，合併 Flights 與封存表
+    'archive.create_view': """
+        IF OBJECT_ID('FlightsHistory', 'V') IS NULL
+            EXEC('CREATE VIEW FlightsHistory AS
+                SELECT flight_number, scheduled_departure, airline_id, departure_airport_code,
+                       arrival_airport_code, scheduled_arrival, actual_departure, actual_arrival,
+                       flight_status, aircraft_type, price, booking_link, scrape_date, created_at, updated_at
+                FROM Flights
+                UNION ALL
+                SELECT flight_number, scheduled_departure, airline_id, departure_airport_code,
+                       arrival_airport_code, scheduled_arrival, actual_departure, actual_arrival,
+                       flight_status, aircraft_type, price, booking_link, scrape_date, created_at, updated_at
+                FROM FlightsArchive')
+    """,
+    'archive.view_exists': """
+        SELECT CASE WHEN OBJECT_ID('FlightsHistory', 'V') IS NULL THEN 0 ELSE 1 END
+    """,
+    # 參數: 批次筆數, 封存起飛時間上限；刪除與寫入封存表在同一語句中完成。
+    # 不論狀態 (多數航班只有匯入時的 on_time/delayed，不會再更新)；Tickets 與 Price_History 以外鍵參照 Flights
+    # 且沒有串聯刪除，仍被參照的航班保留在 Flights，避免整批因外鍵衝突 (錯誤547) 失敗
+    'archive.move_batch': """
+        DELETE TOP (?) FROM Flights
+        OUTPUT
+            deleted.flight_number, deleted.scheduled_departure, deleted.airline_id, deleted.departure_airport_code,
+            deleted.arrival_airport_code, deleted.scheduled_arrival, deleted.actual_departure, deleted.actual_arrival,
+            deleted.flight_status, deleted.aircraft_type, deleted.price, deleted.booking_link, deleted.scrape_date,
+            deleted.created_at, deleted.updated_at, GETDATE()
+        INTO FlightsArchive (
+            flight_number, scheduled_departure, airline_id, departure_airport_code,
+            arrival_airport_code, scheduled_arrival, actual_departure, actual_arrival,
+            flight_status, aircraft_type, price, booking_link, scrape_date,
+            created_at, updated_at, archived_at
+        )
+        WHERE scheduled_departure < ?
+        AND NOT EXISTS (
+            SELECT 1 FROM Tickets t
+            WHERE t.flight_number = Flights.flight_number AND t.scheduled_departure = Flights.scheduled_departure
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM Price_History p
+            WHERE p.flight_number = Flights.flight_number AND p.scheduled_departure = Flights.scheduled_departure
+        )
+    """,
+
+    # 航班變更紀錄，寫入航班時記錄受影響的 (航線, 日期)，API 據此清除快取
+    'flight_changes.create_table': """
+        IF OBJECT_ID('FlightChangeLog', 'U') IS NULL
+            CREATE TABLE FlightChangeLog (
+                change_id bigint IDENTITY(1, 1) PRIMARY KEY,
+                departure_airport_code varchar(10) NOT NULL,
+                arrival_airport_code varchar(10) NOT NULL,
+                flight_date date NOT NULL,
+                created_at datetime2 NOT NULL DEFAULT SYSDATETIME()
+            )
+    """,
+    'flight_changes.insert': """
+        INSERT INTO FlightChangeLog (departure_airport_code, arrival_airport_code, flight_date)
+        VALUES (?, ?, ?)
+    """,
+    # 尚未有寫入者建立資料表時返回空結果
+    'flight_changes.since': """
+        IF OBJECT_ID('FlightChangeLog', 'U') IS NOT NULL
+            SELECT change_id, departure_airport_code, arrival_airport_code, flight_date
+            FROM FlightChangeLog
+            WHERE change_id > ?
+            ORDER BY change_id
+        ELSE
+            SELECT CAST(NULL AS bigint) AS change_id, CAST(NULL AS varchar(10)) AS departure_airport_code,
+                   CAST(NULL AS varchar(10)) AS arrival_airport_code, CAST(NULL AS date) AS flight_date
+            WHERE 1 = 0
+    """,
+    'flight_changes.latest_id': """
+        IF OBJECT_ID('FlightChangeLog', 'U') IS NOT NULL
+            SELECT ISNULL(MAX(change_id), 0) FROM FlightChangeLog
+        ELSE
+            SELECT CAST(0 AS bigint)
+    """,
+    'flight_changes.purge': """
+        IF OBJECT_ID('FlightChangeLog', 'U') IS NOT NULL
+            DELETE FROM FlightChangeLog WHERE created_at < ?
+    """,
+
+    # 航線摘要，寫入航班時依受影響的航線增量更新，/routes 由此提供而不需掃描 Flights
+    # 資料表不存在時建立並由 Flights 完整計算一次 (參數: 一週後, 現在)
+    'route_summary.create_table': """
+        IF OBJECT_ID('RouteSummary', 'U') IS NULL
+        BEGIN
+            CREATE TABLE RouteSummary (
+                departure_airport_code varchar(10) NOT NULL,
+                arrival_airport_code varchar(10) NOT NULL,
+                airline_ids varchar(200) NOT NULL,
+                next_departure datetime2 NOT NULL,
+                weekly_flights int NOT NULL,
+                updated_at datetime2 NOT NULL DEFAULT SYSDATETIME(),
+                PRIMARY KEY (departure_airport_code, arrival_airport_code)
+            );
+            INSERT INTO RouteSummary (departure_airport_code, arrival_airport_code, airline_ids, next_departure, weekly_flights)
+            SELECT departure_airport_code, arrival_airport_code,
+                   STRING_AGG(airline_id, ',') WITHIN GROUP (ORDER BY airline_id),
+                   MIN(next_departure), SUM(weekly_flights)
+            FROM (
+                SELECT departure_airport_code, arrival_airport_code, airline_id,
+                       MIN(scheduled_departure) AS next_departure,
+                       SUM(CASE WHEN scheduled_departure < ? THEN 1 ELSE 0 END) AS weekly_flights
+                FROM Flights
+                WHERE scheduled_departure >= ?
+                GROUP BY departure_airport_code, arrival_airport_code, airline_id
+            ) AS airlines
+            GROUP BY departure_airport_code, arrival_airport_code;
+        END
+    """,
+    # 重新計算單一航線，已沒有未來航班的航線會被刪除
+    # (參數: 出發機場, 到達機場, 一週後, 出發機場, 到達機場, 現在)
+    'route_summary.refresh_route': """
+        MERGE RouteSummary AS target
+        USING (
+            SELECT route.departure_airport_code, route.arrival_airport_code,
+                   STRING_AGG(airlines.airline_id, ',') WITHIN GROUP (ORDER BY airlines.airline_id) AS airline_ids,
+                   MIN(airlines.next_departure) AS next_departure,
+                   ISNULL(SUM(airlines.weekly_flights), 0) AS weekly_flights
+            FROM (
+                SELECT CAST(? AS varchar(10)) AS departure_airport_code, CAST(? AS varchar(10)) AS arrival_airport_code
+            ) AS route
+            LEFT JOIN (
+                SELECT airline_id,
+                       MIN(scheduled_departure) AS next_departure,
+                       SUM(CASE WHEN scheduled_departure < ? THEN 1 ELSE 0 END) AS weekly_flights
+                FROM Flights
+                WHERE departure_airport_code = ? AND arrival_airport_code = ? AND scheduled_departure >= ?
+                GROUP BY airline_id
+            ) AS airlines ON 1 = 1
+            GROUP BY route.departure_airport_code, route.arrival_airport_code
+        ) AS source
+        ON target.departure_airport_code = source.departure_airport_code
+            AND target.arrival_airport_code = source.arrival_airport_code
+        WHEN MATCHED AND source.next_departure IS NULL THEN
+            DELETE
+        WHEN MATCHED THEN
+            UPDATE SET airline_ids = source.airline_ids, next_departure = source.next_departure,
+                       weekly_flights = source.weekly_flights, updated_at = SYSDATETIME()
+        WHEN NOT MATCHED AND source.next_departure IS NOT NULL THEN
+            INSERT (departure_airport_code, arrival_airport_code, airline_ids, next_departure, weekly_flights)
+            VALUES (source.departure_airport_code, source.arrival_airport_code, source.airline_ids,
+                    source.next_departure, source.weekly_flights);
+    """,
+    # 下一班已起飛的航線，隨下一次寫入一併重新計算
+    'route_summary.expired': """
+        SELECT departure_airport_code, arrival_airport_code
+        FROM RouteSummary
+        WHERE next_departure < ?
+    """,
+    'route_summary.list': """
+        IF OBJECT_ID('RouteSummary', 'U') IS NOT NULL
+            SELECT departure_airport_code, arrival_airport_code, airline_ids, next_departure, weekly_flights
+            FROM RouteSummary
+            ORDER BY departure_airport_code, arrival_airport_code
+        ELSE
+            SELECT CAST(NULL AS varchar(10)) AS departure_airport_code, CAST(NULL AS varchar(10)) AS arrival_airport_code,
+                   CAST(NULL AS varchar(200)) AS airline_ids, CAST(NULL AS datetime2) AS next_departure,
+                   CAST(NULL AS int) AS weekly_flights
+            WHERE 1 = 0
+    """,
+    'route_summary.signature': """
+        IF OBJECT_ID('RouteSummary', 'U') IS NOT NULL
+            SELECT COUNT(*), MAX(updated_at) FROM RouteSummary
+        ELSE
+            SELECT 0, CAST(NULL AS datetime2)
+    """,
+
+    # 啟動預熱：起飛時間範圍內航班最多的航線
+    'flights.top_routes': """
+        SELECT TOP (?) departure_airport_code, arrival_airport_code, COUNT(*) AS flight_count
+        FROM Flights
+        WHERE scheduled_departure >= ? AND scheduled_departure < ?
+        GROUP BY departure_airport_code, arrival_airport_code
+        ORDER BY COUNT(*) DESC
+    """,
+
+    # 記憶體航班讀取模型 (指定起飛時間範圍內依 updated_at 增量取得)
+    'flights.read_model': """
+        SELECT f.flight_number, f.airline_id, a.airline_name_zh AS airline_name,
+               f.departure_airport_code, f.arrival_airport_code,
+               f.scheduled_departure, f.scheduled_arrival, f.flight_status,
+               f.aircraft_type, f.price, f.updated_at
+        FROM Flights f
+        JOIN Airlines a ON f.airline_id = a.airline_id
+        WHERE f.scheduled_departure >= ? AND f.scheduled_departure < ?
+        AND f.updated_at >= ?
+        ORDER BY f.updated_at
+    """,
+
+    # 本地唯讀副本同步 (依 updated_at 增量取得)
+    'replica.flights_since': """
+        SELECT flight_number, scheduled_departure, airline_id, departure_airport_code,
+               arrival_airport_code, scheduled_arrival, flight_status, aircraft_type,
+               price, booking_link, actual_departure, actual_arrival, updated_at
+        FROM Flights
+        WHERE updated_at >= ?
+        ORDER BY updated_at
+    """,
+    'replica.airports_since': """
+        SELECT airport_id, airport_name_zh, city_zh, country, updated_at
+        FROM Airports
+        WHERE updated_at >= ?
+        ORDER BY updated_at
+    """,
+    'replica.airlines_since': """
+        SELECT airline_id, airline_name_zh, updated_at
+        FROM Airlines
+        WHERE updated_at >= ?
+        ORDER BY updated_at
+    """,
+
+    # 德安航空暫存表
+    'temp_flights.existing_keys': """
+        SELECT flight_number, scheduled_departure
+        FROM TempFlights
+        WHERE flight_number IN ({flight_numbers})
+    """,
+    'temp_flights.insert': """
+        INSERT INTO TempFlights (
+            flight_number, airline_id, departure_airport_code,
+            arrival_airport_code, scheduled_departure, scheduled_arrival,
+            aircraft_type, scrape_date
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'temp_flights.update_schedule': """
+        UPDATE TempFlights SET
+            scheduled_arrival = ?,
+            scrape_date = ?
+        WHERE flight_number = ? AND scheduled_departure = ?
+    """,
+    'temp_flights.merge_into_flights': """
+        MERGE INTO Flights AS target
+        USING (
+            SELECT
+                flight_number,
+                airline_id,
+                departure_airport_code,
+                arrival_airport_code,
+                scheduled_departure,
+                scheduled_arrival,
+                aircraft_type,
+                scrape_date
+            FROM TempFlights
+            WHERE airline_id = ?
+        ) AS source
+        ON (
+            target.flight_number = source.flight_number AND
+            target.scheduled_departure = source.scheduled_departure
+        )
+        WHEN MATCHED THEN
+            UPDATE SET
+                target.scheduled_arrival = source.scheduled_arrival,
+                target.updated_at = ?
+        WHEN NOT MATCHED THEN
+            INSERT (
+                flight_number,
+                airline_id,
+                departure_airport_code,
+                arrival_airport_code,
+                scheduled_departure,
+                scheduled_arrival,
+                aircraft_type,
+                flight_status,
+                created_at,
+                updated_at,
+                scrape_date
+            )
+            VALUES (
+                source.flight_number,
+                source.airline_id,
+                source.departure_airport_code,
+                source.arrival_airport_code,
+                source.scheduled_departure,
+                source.scheduled_arrival,
+                source.aircraft_type,
+                'Scheduled',
+                ?,
+                ?,
+                source.scrape_date
+            );
+    """,
+}
+
+
+def get_query(name: str, **in_lists: int) -> str:
+    """
+    取得具名查詢
+
+    參數:
+        name: 查詢名稱
+        in_lists: IN 條件的參數數量，例如 get_query('flights.statuses', flight_numbers=3)
+
+    返回:
+        SQL 語句
+    """
+    if name not in QUERIES:
+        raise KeyError(f"未定義的查詢: {name}")
+
+    sql = QUERIES[name]
+    if in_lists:
+        sql = sql.format(**{key: ', '.join(['?'] * count) for key, count in in_lists.items()})
+    return sql
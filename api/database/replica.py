@@ -0,0 +1,404 @@
+"""
+本地唯讀副本
+將主資料庫的 Flights、Airports、Airlines 依 updated_at 增量同步到每個 API 節點上的 SQLite 檔案，
+搜尋類查詢直接讀取本地副本，省去每次請求到遠端 MSSQL 的往返；
+副本落後超過門檻時自動改回主資料庫查詢
+"""
+import datetime
+import decimal
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from api.database.db import Database, get_database
+from api.database.rows import map_rows
+
+logger = logging.getLogger('database.replica')
+
+# 本地副本檔案路徑，未設定時不啟用
+REPLICA_PATH = os.getenv('LOCAL_REPLICA_PATH', '')
+# 同步間隔與可接受的最大落後時間(秒)
+REPLICA_SYNC_SECONDS = float(os.getenv('LOCAL_REPLICA_SYNC_SECONDS', '30'))
+REPLICA_MAX_LAG = float(os.getenv('LOCAL_REPLICA_MAX_LAG', '120'))
+# 每次從主資料庫取回的資料列數
+SYNC_BATCH_SIZE = 5000
+
+# 第一次同步的起始時間 (取得全部資料)
+INITIAL_WATERMARK = datetime.datetime(1900, 1, 1)
+
+# 時間以 'YYYY-MM-DD HH:MM:SS' 文字儲存，讀取時轉回 datetime；價格以文字儲存避免浮點誤差
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_adapter(decimal.Decimal, str)
+sqlite3.register_converter('DATETIME', lambda value: datetime.datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DECIMAL', lambda value: decimal.Decimal(value.decode()))
+
+REPLICA_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS Flights (
+        flight_number TEXT NOT NULL,
+        scheduled_departure DATETIME NOT NULL,
+        scheduled_date TEXT NOT NULL,
+        airline_id TEXT,
+        departure_airport_code TEXT,
+        arrival_airport_code TEXT,
+        scheduled_arrival DATETIME,
+        flight_status TEXT,
+        aircraft_type TEXT,
+        price DECIMAL,
+        booking_link TEXT,
+        actual_departure DATETIME,
+        actual_arrival DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (flight_number, scheduled_departure)
+    )
+    """,
+    # 搜尋依航線與日期篩選並依起飛時間排序，索引涵蓋整個條件
+    """
+    CREATE INDEX IF NOT EXISTS ix_flights_route_date
+    ON Flights (departure_airport_code, arrival_airport_code, scheduled_date, scheduled_departure)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Airports (
+        airport_id TEXT PRIMARY KEY,
+        airport_name_zh TEXT,
+        city_zh TEXT,
+        country TEXT,
+        updated_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Airlines (
+        airline_id TEXT PRIMARY KEY,
+        airline_name_zh TEXT,
+        updated_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS replica_state (
+        table_name TEXT PRIMARY KEY,
+        watermark DATETIME NOT NULL,
+        synced_at REAL NOT NULL
+    )
+    """
+]
+
+# 副本上的查詢，名稱與參數順序和 api.database.queries 中的同名查詢相同
+REPLICA_QUERIES: Dict[str, str] = {
+    'airports.list': """
+        SELECT airport_id AS code, airport_name_zh AS name
+        FROM Airports
+        ORDER BY airport_name_zh
+    """,
+    'airports.details': """
+        SELECT airport_id AS code, airport_name_zh AS name, city_zh, country
+        FROM Airports
+        ORDER BY airport_name_zh
+    """,
+    'airports.domestic': """
+        SELECT airport_id AS code, airport_name_zh AS name, city_zh AS city
+        FROM Airports
+        WHERE airport_id IN ('TPE', 'TSA', 'KHH', 'RMQ', 'TNN', 'TTT', 'HUN')
+    """,
+    'airports.destinations': """
+        SELECT DISTINCT f.arrival_airport_code AS code, a.airport_name_zh AS name, a.city_zh AS city
+        FROM Flights f
+        JOIN Airports a ON f.arrival_airport_code = a.airport_id
+        WHERE f.departure_airport_code = ?
+    """,
+    'airlines.list': """
+        SELECT airline_id AS id, airline_name_zh AS name
+        FROM Airlines
+        ORDER BY airline_name_zh
+    """,
+    'airlines.for_route': """
+        SELECT DISTINCT al.airline_id AS id, al.airline_name_zh AS name
+        FROM Flights f
+        JOIN Airlines al ON f.airline_id = al.airline_id
+        WHERE f.departure_airport_code = ? AND f.arrival_airport_code = ?
+    """,
+    'flights.search': """
+        SELECT
+            f.flight_number, f.scheduled_departure, f.scheduled_arrival,
+            f.departure_airport_code, f.arrival_airport_code, f.airline_id,
+            f.flight_status, f.aircraft_type, f.price, f.booking_link
+        FROM Flights f
+        WHERE
+            f.departure_airport_code IN ({departure_codes})
+            AND f.arrival_airport_code IN ({arrival_codes})
+            AND f.scheduled_date = ?
+        ORDER BY f.scheduled_departure
+    """,
+    'flights.search_by_airline': """
+        SELECT
+            f.flight_number, f.scheduled_departure, f.scheduled_arrival,
+            f.departure_airport_code, f.arrival_airport_code, f.airline_id,
+            f.flight_status, f.aircraft_type, f.price, f.booking_link
+        FROM Flights f
+        WHERE
+            f.departure_airport_code IN ({departure_codes})
+            AND f.arrival_airport_code IN ({arrival_codes})
+            AND f.scheduled_date = ?
+            AND f.airline_id = ?
+        ORDER BY f.scheduled_departure
+    """,
+}
+
+
+def _flight_values(row: Sequence[Any]) -> Tuple:
+    """將 replica.flights_since 的資料列轉為副本欄位 (加入 scheduled_date)"""
+    scheduled_departure = row[1]
+    return (row[0], scheduled_departure, scheduled_departure.strftime('%Y-%m-%d')) + tuple(row[2:])
+
+
+# (資料表, 主資料庫同步查詢, 副本寫入語句, 資料列轉換)
+SYNC_TABLES: List[Tuple[str, str, str, Callable[[Sequence[Any]], Tuple]]] = [
+    (
+        'Airports',
+        'replica.airports_since',
+        'INSERT OR REPLACE INTO Airports (airport_id, airport_name_zh, city_zh, country, updated_at) VALUES (?, ?, ?, ?, ?)',
+        tuple
+    ),
+    (
+        'Airlines',
+        'replica.airlines_since',
+        'INSERT OR REPLACE INTO Airlines (airline_id, airline_name_zh, updated_at) VALUES (?, ?, ?)',
+        tuple
+    ),
+    (
+        'Flights',
+        'replica.flights_since',
+        """INSERT OR REPLACE INTO Flights (
+            flight_number, scheduled_departure, scheduled_date, airline_id, departure_airport_code,
+            arrival_airport_code, scheduled_arrival, flight_status, aircraft_type,
+            price, booking_link, actual_departure, actual_arrival, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        _flight_values
+    ),
+]
+
+
+class LocalReplica:
+    """
+    SQLite 本地唯讀副本
+    單一背景執行緒負責同步寫入，查詢執行緒各自使用自己的 SQLite 連接 (WAL 模式下讀寫互不阻塞)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        database: Optional[Database] = None,
+        interval: float = REPLICA_SYNC_SECONDS,
+        max_lag: float = REPLICA_MAX_LAG
+    ):
+        """
+        初始化本地副本
+
+        參數:
+            path: SQLite 檔案路徑
+            database: 主資料庫存取入口，不提供時使用共用實例
+            interval: 同步間隔(秒)
+            max_lag: 可接受的最大落後時間(秒)，超過時查詢改回主資料庫
+        """
+        self.path = path
+        self.database = database or get_database()
+        self.interval = interval
+        self.max_lag = max_lag
+
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.last_error: Optional[str] = None
+        self.fallbacks = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in REPLICA_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """取得目前執行緒的 SQLite 連接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _state(self) -> Dict[str, Tuple[datetime.datetime, float]]:
+        """取得各資料表的同步水位與最後同步時間"""
+        rows = self._connection().execute('SELECT table_name, watermark, synced_at FROM replica_state').fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def sync_once(self) -> Dict[str, int]:
+        """
+        從主資料庫增量同步一次
+
+        返回:
+            各資料表同步的資料列數
+        """
+        conn = self._connection()
+        state = self._state()
+        counts = {}
+
+        for table, query_name, upsert_sql, transform in SYNC_TABLES:
+            # 以同步開始的時間作為資料新鮮度，之後才提交的變更留待下一次同步
+            started_at = time.time()
+            watermark = state.get(table, (INITIAL_WATERMARK, 0.0))[0]
+            newest = watermark
+            count = 0
+
+            # 水位以 >= 比較，相同時間戳記的資料重複寫入不影響結果
+            with self.database.session(readonly=True) as session:
+                cursor = session.execute(query_name, (watermark,))
+                while True:
+                    rows = cursor.fetchmany(SYNC_BATCH_SIZE)
+                    if not rows:
+                        break
+                    conn.executemany(upsert_sql, [transform(row) for row in rows])
+                    # 查詢依 updated_at 排序，最後一列即為本批最新的時間
+                    if rows[-1][-1] is not None:
+                        newest = max(newest, rows[-1][-1])
+                    count += len(rows)
+
+            conn.execute(
+                'INSERT OR REPLACE INTO replica_state (table_name, watermark, synced_at) VALUES (?, ?, ?)',
+                (table, newest, started_at)
+            )
+            conn.commit()
+            counts[table] = count
+
+        self.last_error = None
+        if any(counts.values()):
+            logger.info(f"本地副本同步完成: {counts}")
+        return counts
+
+    def lag(self) -> Optional[float]:
+        """
+        副本落後時間(秒)，以最久未同步的資料表計算
+
+        返回:
+            落後秒數，尚未完成同步時返回None
+        """
+        state = self._state()
+        if len(state) < len(SYNC_TABLES):
+            return None
+        return max(0.0, time.time() - min(synced_at for _, synced_at in state.values()))
+
+    def is_fresh(self) -> bool:
+        """副本是否在可接受的落後時間內"""
+        lag = self.lag()
+        return lag is not None and lag <= self.max_lag
+
+    def fetch_all(self, name: str, params: Sequence[Any] = (), row_type: Optional[Type] = None, **in_lists: int) -> List[Any]:
+        """
+        在副本上執行具名查詢
+
+        參數:
+            name: 查詢名稱 (REPLICA_QUERIES 中的名稱)
+            params: 查詢參數
+            row_type: 結果型別 (具名元組或 dict)
+            in_lists: IN 條件的參數數量
+
+        返回:
+            結果列表
+        """
+        sql = REPLICA_QUERIES[name]
+        if in_lists:
+            sql = sql.format(**{key: ', '.join(['?'] * count) for key, count in in_lists.items()})
+        cursor = self._connection().execute(sql, list(params))
+        rows = cursor.fetchall()
+        if row_type is None:
+            return rows
+        return map_rows(cursor.description, rows, row_type)
+
+    def get_status(self) -> Dict[str, Any]:
+        """取得副本狀態 (落後時間、各資料表水位與筆數)"""
+        conn = self._connection()
+        lag = self.lag()
+        tables = {}
+        for table, (watermark, synced_at) in self._state().items():
+            tables[table] = {
+                'rows': conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0],
+                'watermark': watermark.isoformat() if isinstance(watermark, datetime.datetime) else watermark,
+                'synced_at': datetime.datetime.fromtimestamp(synced_at).isoformat()
+            }
+        return {
+            'path': self.path,
+            'lag_seconds': round(lag, 1) if lag is not None else None,
+            'max_lag_seconds': self.max_lag,
+            'serving_reads': lag is not None and lag <= self.max_lag,
+            'primary_fallbacks': self.fallbacks,
+            'last_error': self.last_error,
+            'tables': tables
+        }
+
+    def start(self) -> None:
+        """在背景執行緒中開始定期同步 (重複呼叫不會建立多個執行緒)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='local-replica-sync', daemon=True)
+            self._thread.start()
+            logger.info(f"本地副本同步已啟動: {self.path}，間隔 {self.interval} 秒")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"同步本地副本時出錯: {e}")
+            time.sleep(self.interval)
+
+
+# 單例實現
+_replica_instance: Optional[LocalReplica] = None
+_replica_lock = threading.Lock()
+
+
+def get_replica() -> Optional[LocalReplica]:
+    """
+    獲取本地副本的單例實例，第一次呼叫時開始背景同步
+
+    返回:
+        本地副本實例，未設定 LOCAL_REPLICA_PATH 時返回None
+    """
+    global _replica_instance
+    if not REPLICA_PATH:
+        return None
+    if _replica_instance is None:
+        with _replica_lock:
+            if _replica_instance is None:
+                replica = LocalReplica(REPLICA_PATH)
+                replica.start()
+                _replica_instance = replica
+    return _replica_instance
+
+
+def read_all(name: str, params: Sequence[Any] = (), row_type: Optional[Type] = None, **in_lists: int) -> List[Any]:
+    """
+    執行唯讀查詢，本地副本可用且未落後過多時從副本讀取，否則查詢主資料庫
+
+    參數:
+        name: 查詢名稱
+        params: 查詢參數
+        row_type: 結果型別 (具名元組或 dict)
+        in_lists: IN 條件的參數數量
+
+    返回:
+        結果列表
+    """
+    replica = get_replica()
+    if replica is not None and name in REPLICA_QUERIES:
+        if replica.is_fresh():
+            try:
+                return replica.fetch_all(name, params, row_type, **in_lists)
+            except sqlite3.Error as e:
+                logger.warning(f"讀取本地副本失敗，改查主資料庫: {e}")
+        replica.fallbacks += 1
+    return get_database().fetch_all(name, params, row_type, **in_lists)
@@ -0,0 +1,65 @@
+"""
+航線摘要
+RouteSummary 保存每條航線的航空公司、下一班起飛時間與未來一週班次，
+寫入航班時只重新計算受影響的航線，/routes 不需掃描 Flights
+"""
+import datetime
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from api.database.db import Database, Session, get_database
+
+logger = logging.getLogger('database.route_summary')
+
+# 班次統計的天數
+FREQUENCY_DAYS = 7
+
+
+def refresh_route_summaries(session: Session, routes: Iterable[Tuple[str, str]], now: Optional[datetime.datetime] = None) -> int:
+    """
+    在目前交易中重新計算航線摘要，下一班已起飛的航線也一併重新計算
+
+    參數:
+        session: 寫入航班的工作階段
+        routes: 受影響的 (出發機場, 到達機場)
+        now: 計算基準時間，預設為現在
+
+    返回:
+        重新計算的航線數量
+    """
+    now = now or datetime.datetime.now()
+    week_end = now + datetime.timedelta(days=FREQUENCY_DAYS)
+    # 資料表不存在時建立並完整計算一次
+    session.execute('route_summary.create_table', (week_end, now))
+
+    routes = set(routes)
+    routes.update((row[0], row[1]) for row in session.fetch_all('route_summary.expired', (now,)))
+    if not routes:
+        return 0
+    return session.execute_many(
+        'route_summary.refresh_route',
+        [(departure, arrival, week_end, departure, arrival, now) for departure, arrival in sorted(routes)]
+    )
+
+
+def fetch_route_summaries(database: Optional[Database] = None) -> List[Dict[str, Any]]:
+    """
+    取得所有航線摘要
+
+    返回:
+        依出發與到達機場排序的航線列表
+    """
+    rows = (database or get_database()).fetch_all('route_summary.list')
+    return [{
+        'departure': row[0],
+        'arrival': row[1],
+        'airlines': row[2].split(',') if row[2] else [],
+        'next_departure': row[3].isoformat() if row[3] else None,
+        'weekly_flights': row[4]
+    } for row in rows]
+
+
+def route_summary_signature(database: Optional[Database] = None) -> Tuple[int, Any]:
+    """取得航線摘要版本 (筆數與最後更新時間)，用於判斷是否需要重新載入"""
+    row = (database or get_database()).fetch_one('route_summary.signature')
+    return (row[0], row[1]) if row else (0, None)
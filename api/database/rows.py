@@ -0,0 +1,115 @@
+"""
+資料列型別對應
+將查詢結果依欄位名稱對應為具名元組，以及將航班字典轉為寫入語句的參數
+"""
+import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Type, TypeVar
+
+RowType = TypeVar('RowType')
+
+
+class AirportRow(NamedTuple):
+    """機場 (airports.list、airports.details)"""
+    code: str
+    name: str
+    city_zh: Optional[str] = None
+    country: Optional[str] = None
+
+
+class AirlineRow(NamedTuple):
+    """航空公司 (airlines.list、airlines.for_route)"""
+    id: str
+    name: str
+
+
+class FlightRow(NamedTuple):
+    """航班搜尋結果 (flights.search、flights.search_by_airline)"""
+    flight_number: str
+    scheduled_departure: datetime.datetime
+    scheduled_arrival: Optional[datetime.datetime]
+    departure_airport_code: str
+    arrival_airport_code: str
+    airline_id: str
+    flight_status: Optional[str]
+    aircraft_type: Optional[str]
+    price: Any
+    booking_link: Optional[str]
+
+
+class FlightStatusRow(NamedTuple):
+    """航班狀態 (flights.statuses)"""
+    flight_number: str
+    scheduled_departure: datetime.datetime
+    flight_status: Optional[str]
+    actual_departure: Optional[datetime.datetime]
+    actual_arrival: Optional[datetime.datetime]
+
+
+class FlightChangeRow(NamedTuple):
+    """最近更新的航班 (flights.status_changes)"""
+    flight_number: str
+    scheduled_departure: datetime.datetime
+    departure_airport_code: str
+    arrival_airport_code: str
+    flight_status: Optional[str]
+    actual_departure: Optional[datetime.datetime]
+    actual_arrival: Optional[datetime.datetime]
+    updated_at: datetime.datetime
+
+
+def map_rows(description: Sequence[Tuple], rows: Iterable[Sequence[Any]], row_type: Type[RowType]) -> List[RowType]:
+    """
+    依欄位名稱將查詢結果對應為指定型別
+
+    參數:
+        description: cursor.description
+        rows: 查詢結果
+        row_type: 具名元組型別或 dict；查詢沒有的欄位使用型別的預設值
+
+    返回:
+        對應後的資料列表
+    """
+    columns = [column[0] for column in description]
+
+    if row_type is dict:
+        return [dict(zip(columns, row)) for row in rows]
+
+    # 欄位位置只計算一次，每列只需依索引取值
+    positions = {name: index for index, name in enumerate(columns)}
+    defaults = getattr(row_type, '_field_defaults', {})
+    missing = [field for field in row_type._fields if field not in positions and field not in defaults]
+    if missing:
+        raise KeyError(f"查詢結果缺少 {row_type.__name__} 欄位: {', '.join(missing)}")
+
+    indexes = [positions.get(field) for field in row_type._fields]
+    fill = [defaults.get(field) for field in row_type._fields]
+    return [
+        row_type._make(row[index] if index is not None else fill[i] for i, index in enumerate(indexes))
+        for row in rows
+    ]
+
+
+def flight_insert_params(flight_data: Dict[str, Any], scrape_date: Optional[datetime.datetime] = None) -> Tuple:
+    """
+    將航班字典轉為 flights.insert / flights.insert_if_missing 的參數
+
+    參數:
+        flight_data: 航班資料字典
+        scrape_date: 抓取時間，不提供時使用目前時間
+
+    返回:
+        參數元組
+    """
+    return (
+        flight_data.get('flight_number'),
+        flight_data.get('scheduled_departure'),
+        flight_data.get('airline_id'),
+        flight_data.get('departure_airport_code'),
+        flight_data.get('arrival_airport_code'),
+        flight_data.get('scheduled_arrival'),
+        flight_data.get('flight_status'),
+        flight_data.get('aircraft_type'),
+        flight_data.get('price'),
+        flight_data.get('booking_link'),
+        scrape_date or datetime.datetime.now()
+    )
@@ -0,0 +1,247 @@
+"""
+機場自動完成索引
+在記憶體中為機場代碼、中文名稱、城市與國家名稱建立前綴索引，
+讓機場選擇器不必下載完整機場列表即可取得排序後的建議結果
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('airport_index')
+
+# 欄位排序權重 (數字越小排名越前)
+FIELD_RANKS = {
+    'code': 0,
+    'city_zh': 1,
+    'name': 2,
+    'country_name': 3,
+    'country': 4
+}
+FIELD_NAMES = {rank: field for field, rank in FIELD_RANKS.items()}
+
+# 比對類型: 完全相符 > 前綴相符 > 名稱中段相符
+MATCH_EXACT = 0
+MATCH_PREFIX = 1
+MATCH_INFIX = 2
+
+# 單一索引鍵的最大長度，超過的查詢字串會截斷後再過濾
+MAX_KEY_LENGTH = 12
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """標準化查詢字串: 去除空白、轉大寫並統一「臺」「台」寫法"""
+    if not text:
+        return ''
+    return ''.join(str(text).split()).upper().replace('臺', '台')
+
+
+class AirportIndex:
+    """
+    機場前綴索引
+    建立時預先展開所有前綴並排序，查詢只需一次字典查找與切片
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[Dict[str, Any]]],
+        signature: Optional[Callable[[], Any]] = None,
+        check_interval: float = 60.0
+    ):
+        """
+        初始化索引
+
+        參數:
+            loader: 載入機場資料的函數，回傳與 /airports/details 相同格式的字典列表
+            signature: 取得機場資料版本的函數 (如筆數與最後更新時間)，用於判斷是否需要重建
+            check_interval: 檢查資料是否變更的最短間隔(秒)
+        """
+        self.loader = loader
+        self.signature = signature
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        # (機場列表, {前綴: [(機場索引, 比對欄位權重), ...]}, {機場代碼或城市: [機場代碼, ...]})
+        self._state: Tuple[List[Dict[str, Any]], Dict[str, List[Tuple[int, int]]], Dict[str, List[str]]] = ([], {}, {})
+        self._signature: Any = None
+        self._built = False
+        self._last_check = 0.0
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def build(self, airports: List[Dict[str, Any]]) -> None:
+        """
+        依機場資料重建索引
+
+        參數:
+            airports: 機場資料列表
+        """
+        # 每個前綴對應的最佳分數 {prefix: {airport_idx: score}}
+        best_scores: Dict[str, Dict[int, Tuple]] = {}
+
+        for idx, airport in enumerate(airports):
+            for field, field_rank in FIELD_RANKS.items():
+                term = normalize_text(airport.get(field))
+                if not term:
+                    continue
+
+                # 名稱允許從中段開始比對，例如「羽田」可找到「東京羽田機場」
+                starts = range(len(term)) if field == 'name' else [0]
+                for start in starts:
+                    for end in range(start + 1, min(len(term), start + MAX_KEY_LENGTH) + 1):
+                        key = term[start:end]
+                        if start > 0:
+                            match_type = MATCH_INFIX
+                        elif end == len(term):
+                            match_type = MATCH_EXACT
+                        else:
+                            match_type = MATCH_PREFIX
+                        score = (match_type, field_rank, len(term), airport.get('code') or '')
+
+                        scores = best_scores.setdefault(key, {})
+                        if idx not in scores or score < scores[idx]:
+                            scores[idx] = score
+
+        # 預先排序，只保留機場索引與比對欄位，減少查詢時的工作量
+        prefixes = {}
+        for key, scores in best_scores.items():
+            ranked = sorted((score, idx) for idx, score in scores.items())
+            prefixes[key] = [(idx, score[1]) for score, idx in ranked]
+
+        # 城市對應機場代碼，例如「東京」對應 HND 與 NRT；機場代碼優先於同名城市
+        locations: Dict[str, List[str]] = {}
+        for airport in airports:
+            city = normalize_text(airport.get('city_zh'))
+            code = normalize_text(airport.get('code'))
+            if city and code and code not in locations.get(city, []):
+                locations.setdefault(city, []).append(code)
+        for airport in airports:
+            code = normalize_text(airport.get('code'))
+            if code:
+                locations[code] = [code]
+
+        # 以整體替換的方式更新，查詢中的執行緒不會看到半成品
+        self._state = (list(airports), prefixes, locations)
+        self._built = True
+        logger.info(f"機場索引已重建: {len(airports)} 個機場, {len(prefixes)} 個索引鍵")
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        若機場資料已變更則重建索引
+
+        參數:
+            force: 是否忽略檢查間隔強制重新載入
+
+        返回:
+            是否重建了索引
+        """
+        now = time.monotonic()
+        if not force and self._built and now - self._last_check < self.check_interval:
+            return False
+
+        # 同一時間只允許一個執行緒重建，其他執行緒繼續使用舊索引
+        if not self._lock.acquire(blocking=not self._built):
+            return False
+
+        try:
+            if not force and self._built and now - self._last_check < self.check_interval:
+                return False
+            self._last_check = now
+
+            current_signature = None
+            if self.signature:
+                try:
+                    current_signature = self.signature()
+                except Exception as e:
+                    logger.error(f"取得機場資料版本時出錯: {e}")
+
+            if self._built and not force and current_signature is not None \
+                    and current_signature == self._signature:
+                return False
+
+            airports = self.loader()
+            self.build(airports)
+            self._signature = current_signature
+            return True
+        except Exception as e:
+            logger.error(f"重建機場索引時出錯: {e}")
+            return False
+        finally:
+            self._lock.release()
+
+    def _ensure_current(self) -> None:
+        """
+        索引尚未建立時同步建立；之後超過檢查間隔時交給背景執行緒檢查與重建，
+        查詢不等待資料庫，繼續使用目前的索引
+        """
+        if not self._built:
+            self.refresh()
+            return
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._thread_lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name='airport-index-refresh', daemon=True)
+            self._refresh_thread.start()
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        取得符合查詢字串的機場建議
+
+        參數:
+            query: 使用者輸入 (機場代碼、機場名稱、城市或國家)
+            limit: 最多回傳的筆數
+
+        返回:
+            依相關度排序的機場列表，每筆附上 matched_field
+        """
+        self._ensure_current()
+
+        key = normalize_text(query)
+        if not key:
+            return []
+
+        airports, prefixes, _ = self._state
+        entries = prefixes.get(key[:MAX_KEY_LENGTH], [])
+
+        results = []
+        for idx, field_rank in entries:
+            airport = airports[idx]
+            # 超過索引鍵長度的查詢需再確認完整字串
+            if len(key) > MAX_KEY_LENGTH and not any(
+                key in normalize_text(airport.get(field)) for field in FIELD_RANKS
+            ):
+                continue
+
+            result = dict(airport)
+            result['matched_field'] = FIELD_NAMES[field_rank]
+            results.append(result)
+            if len(results) >= limit:
+                break
+
+        return results
+
+    def resolve_location(self, location: str) -> Optional[List[str]]:
+        """
+        將機場代碼或城市名稱解析為機場代碼列表
+
+        參數:
+            location: 機場代碼 (如 'TPE') 或城市名稱 (如 '東京'、'臺北')
+
+        返回:
+            機場代碼列表，無法解析時返回None
+        """
+        self._ensure_current()
+
+        key = normalize_text(location)
+        if not key:
+            return None
+
+        codes = self._state[2].get(key)
+        return list(codes) if codes else None
+
+    def airports(self) -> List[Dict[str, Any]]:
+        """取得目前索引中的機場資料"""
+        self._ensure_current()
+        return list(self._state[0])
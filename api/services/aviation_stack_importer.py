@@ -8,10 +8,14 @@ import logging
 import time
 import random
 from typing import Dict, List, Optional, Tuple, Any
-import pyodbc
 from dotenv import load_dotenv
 
-from api.services.external_apis import get_flights_for_configured_airlines_airports
+from api.database import (
+    fetch_route_summaries, flight_change_key, flight_insert_params, flights_table, get_database,
+    record_flight_changes, track_queries
+)
+from api.services.coverage_planner import QueryPlan
+from api.services.external_apis import get_flights_for_configured_airlines_airports, plan_flight_queries
 
 # 設置日誌
 logging.basicConfig(
@@ -29,17 +33,13 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 env_path = os.path.join(project_root, '.env')
 load_dotenv(env_path)
 
-# 資料庫連接
-DB_CONNECTION_STRING = os.getenv('DB_CONNECTION_STRING')
-
-def get_db_connection():
-    """獲取資料庫連接"""
-    try:
-        conn = pyodbc.connect(DB_CONNECTION_STRING)
-        return conn
-    except Exception as e:
-        logger.error(f"資料庫連接失敗: {e}")
-        return None
+def _change_key(flight_data: Dict) -> Tuple[str, str, str]:
+    """航班資料對應的變更鍵 (航線與起飛日期)"""
+    return flight_change_key(
+        flight_data.get('departure_airport_code'),
+        flight_data.get('arrival_airport_code'),
+        flight_data.get('scheduled_departure')
+    )
 
 def import_flight(flight_data: Dict) -> bool:
     """
@@ -51,90 +51,108 @@ def import_flight(flight_data: Dict) -> bool:
     返回:
         是否成功導入
     """
-    conn = get_db_connection()
-    if not conn:
-        return False
+    # 準備查詢參數
+    departure_date = flight_data.get('scheduled_departure')
+    if isinstance(departure_date, datetime.datetime):
+        departure_date_str = departure_date.strftime('%Y-%m-%d')
+    else:
+        departure_date_str = str(departure_date)
     
     try:
-        cursor = conn.cursor()
-        
-        # 檢查資料是否已存在
-        check_sql = """
-        SELECT COUNT(*) FROM Flights 
-        WHERE flight_number = ? AND departure_airport_code = ? 
-        AND arrival_airport_code = ? AND CAST(scheduled_departure AS DATE) = CAST(? AS DATE)
-        """
-        
-        # 準備查詢參數
-        departure_date = flight_data.get('scheduled_departure')
-        if isinstance(departure_date, datetime.datetime):
-            departure_date_str = departure_date.strftime('%Y-%m-%d')
-        else:
-            departure_date_str = str(departure_date)
-        
-        cursor.execute(
-            check_sql, 
-            (
-                flight_data.get('flight_number'), 
-                flight_data.get('departure_airport_code'), 
-                flight_data.get('arrival_airport_code'),
-                departure_date_str
+        with get_database().session() as session:
+            # 檢查資料是否已存在
+            exists = session.fetch_value(
+                'flights.exists_on_date',
+                (
+                    flight_data.get('flight_number'),
+                    flight_data.get('departure_airport_code'),
+                    flight_data.get('arrival_airport_code'),
+                    departure_date_str
+                )
             )
-        )
-        
-        if cursor.fetchval() > 0:
-            logger.debug(f"航班已存在: {flight_data.get('flight_number')} ({departure_date_str})")
-            conn.close()
-            return True
-        
-        # 插入新記錄 - 移除actual_departure, actual_arrival, data_source欄位
-        insert_sql = """
-        INSERT INTO Flights (
-            flight_number, scheduled_departure, airline_id, departure_airport_code, 
-            arrival_airport_code, scheduled_arrival, flight_status, aircraft_type, 
-            price, booking_link, scrape_date, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
-        """
-        
-        # 處理可能的空值
-        scheduled_departure = flight_data.get('scheduled_departure')
-        scheduled_arrival = flight_data.get('scheduled_arrival')
-        
-        cursor.execute(
-            insert_sql, 
-            (
-                flight_data.get('flight_number'), 
-                scheduled_departure,
-                flight_data.get('airline_id'), 
-                flight_data.get('departure_airport_code'), 
-                flight_data.get('arrival_airport_code'), 
-                scheduled_arrival, 
-                flight_data.get('flight_status'), 
-                flight_data.get('aircraft_type'), 
-                flight_data.get('price'), 
-                flight_data.get('booking_link'),
-                datetime.datetime.now()
-            )
-        )
+            
+            if exists > 0:
+                logger.debug(f"航班已存在: {flight_data.get('flight_number')} ({departure_date_str})")
+                return True
+            
+            # 插入新記錄 - 不包含actual_departure, actual_arrival, data_source欄位
+            session.execute('flights.insert', flight_insert_params(flight_data))
+            record_flight_changes(session, [_change_key(flight_data)])
         
-        conn.commit()
         logger.debug(f"成功導入航班: {flight_data.get('flight_number')} ({departure_date_str})")
-        conn.close()
         return True
         
     except Exception as e:
         logger.error(f"導入航班失敗: {e}")
-        if conn:
-            conn.close()
         return False
 
+def import_flights_batch(flights: List[Dict]) -> int:
+    """
+    以單一交易批次導入航班資料，同一天已存在的航班會略過
+    批次寫入失敗時改為逐筆導入，找出有問題的航班
+
+    參數:
+        flights: 航班資料列表
+
+    返回:
+        成功導入 (或已存在) 的航班數量
+    """
+    if not flights:
+        return 0
+    
+    scrape_date = datetime.datetime.now()
+    rows = [flight_insert_params(flight, scrape_date) for flight in flights]
+
+    def insert(session) -> None:
+        session.execute_many('flights.insert_if_missing', rows)
+        record_flight_changes(session, [_change_key(flight) for flight in flights])
+
+    try:
+        get_database().transaction(insert)
+        return len(flights)
+    except Exception as e:
+        logger.warning(f"批次導入失敗，改為逐筆導入: {e}")
+        return sum(1 for flight in flights if import_flight(flight))
+
+def plan_import(
+    flight_date: Optional[str] = None,
+    max_api_calls: int = 20,
+    use_cache: bool = True,
+    priority_routes: Optional[List[Tuple[str, str]]] = None
+) -> QueryPlan:
+    """
+    依航線摘要與資料庫中當天已有的航班規劃查詢，避免重複取得已導入的航空公司與航線
+
+    參數:
+        flight_date: 航班日期 (YYYY-MM-DD)，預設為今天
+        max_api_calls: 最大API調用次數
+        use_cache: 是否將已有緩存的查詢視為不消耗配額
+        priority_routes: 優先航線列表
+
+    返回:
+        QueryPlan
+    """
+    flight_date = flight_date or datetime.datetime.now().strftime('%Y-%m-%d')
+    day = datetime.datetime.strptime(flight_date, '%Y-%m-%d')
+    covered = get_database().fetch_all('flights.coverage', (day, day + datetime.timedelta(days=1)))
+    return plan_flight_queries(
+        flight_date,
+        fetch_route_summaries(),
+        [tuple(row) for row in covered],
+        max_api_calls=max_api_calls,
+        priority_routes=priority_routes,
+        use_cache=use_cache
+    )
+
+@track_queries('bulk_import_flights')
 def bulk_import_flights(
     flight_date: Optional[str] = None,
     limit: int = 100,
     max_api_calls: int = 20,
     use_cache: bool = True,
     use_mock_data: bool = False,
-    priority_routes: Optional[List[Tuple[str, str]]] = None
+    priority_routes: Optional[List[Tuple[str, str]]] = None,
+    use_planner: bool = True
 ) -> Tuple[int, int]:
     """
     批量導入航班資料
@@ -146,25 +164,26 @@ def bulk_import_flights(
         use_cache: 是否使用緩存
         use_mock_data: 是否在API不可用時使用模擬數據
         priority_routes: 優先航線列表
+        use_planner: 是否依資料庫與緩存中已涵蓋的航線規劃查詢 (否則依固定順序查詢優先航線與航空公司)
 
     返回:
         (成功導入數量, 總嘗試數量)
     """
     try:
+        plan = plan_import(flight_date, max_api_calls, use_cache, priority_routes) if use_planner else None
+        
         # 獲取航班數據
         flights = get_flights_for_configured_airlines_airports(
             flight_date=flight_date,
             max_api_calls=max_api_calls,
             use_cache=use_cache,
             use_mock_data=use_mock_data,
-            priority_routes=priority_routes
+            priority_routes=priority_routes,
+            job='bulk_import',
+            plan=plan,
+            limit=limit if limit > 0 else None
         )
         
-        # 限制數量
-        if limit > 0 and len(flights) > limit:
-            flights = flights[:limit]
-        
-        successful = 0
         total = len(flights)
         
         logger.info(f"開始批量導入 {total} 個航班...")
@@ -172,16 +191,7 @@ def bulk_import_flights(
         # 按優先級排序航班，將真實API數據優先導入
         flights.sort(key=lambda x: 0 if x.get('data_source', '') == 'api' else 1)
         
-        for i, flight in enumerate(flights):
-            if import_flight(flight):
-                successful += 1
-            
-            # 每導入10個航班顯示進度
-            if (i + 1) % 10 == 0 or i == total - 1:
-                logger.info(f"進度: {i+1}/{total} ({successful} 成功)")
-            
-            # 隨機延遲，避免過快寫入
-            time.sleep(random.uniform(0.1, 0.3))
+        successful = import_flights_batch(flights)
         
         success_rate = (successful / total * 100) if total > 0 else 0
         logger.info(f"導入完成: {successful}/{total} 成功率: {success_rate:.2f}%")
@@ -198,7 +208,8 @@ def import_multiple_days(
     flights_per_day: int = 50,
     max_api_calls_per_day: int = 10,
     use_cache: bool = True,
-    use_mock_data: bool = True
+    use_mock_data: bool = True,
+    use_planner: bool = True
 ) -> Dict[str, Tuple[int, int]]:
     """
     導入多天的航班資料
@@ -210,6 +221,7 @@ def import_multiple_days(
         max_api_calls_per_day: 每天最大API調用次數
         use_cache: 是否使用緩存
         use_mock_data: 是否使用模擬數據
+        use_planner: 是否規劃查詢以涵蓋最多尚未導入的航線
 
     返回:
         包含每天導入結果的字典 {日期: (成功數, 總數)}
@@ -240,7 +252,8 @@ def import_multiple_days(
                 max_api_calls=max_api_calls_per_day,
                 use_cache=use_cache,
                 use_mock_data=use_mock_data,
-                priority_routes=priority_routes
+                priority_routes=priority_routes,
+                use_planner=use_planner
             )
             
             results[date_str] = (successful, total)
@@ -257,6 +270,7 @@ def import_multiple_days(
         return results
 
 # 獲取已導入的航班統計
+@track_queries('get_import_statistics')
 def get_import_statistics(start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> Dict[str, Any]:
     """
     獲取已導入航班的統計資訊
@@ -268,13 +282,7 @@ def get_import_statistics(start_date: Optional[datetime.date] = None, end_date:
     返回:
         包含統計資料的字典
     """
-    conn = get_db_connection()
-    if not conn:
-        return {}
-    
     try:
-        cursor = conn.cursor()
-        
         # 構建日期過濾條件
         date_filter = ""
         params = []
@@ -291,54 +299,59 @@ def get_import_statistics(start_date: Optional[datetime.date] = None, end_date:
                 date_filter = "WHERE CAST(scheduled_departure AS DATE) <= ?"
                 params = [end_date.strftime('%Y-%m-%d')]
         
-        # 總航班數
-        total_flights_sql = f"SELECT COUNT(*) FROM Flights {date_filter}"
-        cursor.execute(total_flights_sql, params)
-        total_flights = cursor.fetchval()
+        # 日期範圍早於封存天數時合併封存表查詢
+        table = flights_table(start_date)
         
-        # 按日期統計
-        dates_sql = f"""
-            SELECT CAST(scheduled_departure AS DATE) as flight_date, COUNT(*) as count 
-            FROM Flights 
-            {date_filter}
-            GROUP BY CAST(scheduled_departure AS DATE)
-            ORDER BY flight_date DESC
-        """
-        cursor.execute(dates_sql, params)
-        dates = {}
-        for row in cursor.fetchall():
-            # 確保日期是字符串而不是日期對象
-            date_str = row[0].strftime('%Y-%m-%d') if hasattr(row[0], 'strftime') else str(row[0])
-            dates[date_str] = row[1]
+        # 統計查詢依日期條件組合，在同一個唯讀工作階段中執行
+        with get_database().session(readonly=True) as session:
+            cursor = session.cursor
+            
+            # 總航班數
+            total_flights_sql = f"SELECT COUNT(*) FROM {table} {date_filter}"
+            cursor.execute(total_flights_sql, params)
+            total_flights = cursor.fetchval()
         
-        # 按航空公司統計
-        airlines_sql = f"""
-            SELECT airline_id, COUNT(*) as count 
-            FROM Flights 
-            {date_filter}
-            GROUP BY airline_id
-            ORDER BY count DESC
-        """
-        cursor.execute(airlines_sql, params)
-        airlines = {}
-        for row in cursor.fetchall():
-            airlines[row[0] or 'Unknown'] = row[1]
+            # 按日期統計
+            dates_sql = f"""
+                SELECT CAST(scheduled_departure AS DATE) as flight_date, COUNT(*) as count 
+                FROM {table} 
+                {date_filter}
+                GROUP BY CAST(scheduled_departure AS DATE)
+                ORDER BY flight_date DESC
+            """
+            cursor.execute(dates_sql, params)
+            dates = {}
+            for row in cursor.fetchall():
+                # 確保日期是字符串而不是日期對象
+                date_str = row[0].strftime('%Y-%m-%d') if hasattr(row[0], 'strftime') else str(row[0])
+                dates[date_str] = row[1]
         
-        # 按航線統計
-        routes_sql = f"""
-            SELECT departure_airport_code, arrival_airport_code, COUNT(*) as count 
-            FROM Flights 
-            {date_filter}
-            GROUP BY departure_airport_code, arrival_airport_code
-            ORDER BY count DESC
-        """
-        cursor.execute(routes_sql, params)
-        routes = {}
-        for row in cursor.fetchall():
-            route = f"{row[0]}-{row[1]}"
-            routes[route] = row[2]
+            # 按航空公司統計
+            airlines_sql = f"""
+                SELECT airline_id, COUNT(*) as count 
+                FROM {table} 
+                {date_filter}
+                GROUP BY airline_id
+                ORDER BY count DESC
+            """
+            cursor.execute(airlines_sql, params)
+            airlines = {}
+            for row in cursor.fetchall():
+                airlines[row[0] or 'Unknown'] = row[1]
         
-        conn.close()
+            # 按航線統計
+            routes_sql = f"""
+                SELECT departure_airport_code, arrival_airport_code, COUNT(*) as count 
+                FROM {table} 
+                {date_filter}
+                GROUP BY departure_airport_code, arrival_airport_code
+                ORDER BY count DESC
+            """
+            cursor.execute(routes_sql, params)
+            routes = {}
+            for row in cursor.fetchall():
+                route = f"{row[0]}-{row[1]}"
+                routes[route] = row[2]
         
         result = {
             'total_flights': total_flights,
@@ -360,8 +373,6 @@ def get_import_statistics(start_date: Optional[datetime.date] = None, end_date:
         
     except Exception as e:
         logger.error(f"獲取統計資訊失敗: {e}")
-        if conn:
-            conn.close()
         return {}
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+"""
+快取包
+提供可替換的快取後端，航班搜尋、參考資料與 AviationStack 回應快取共用同一個介面：
+- memory: 行程內快取 (預設)
+- redis: 多個 worker 共用的 Redis 快取 (CACHE_BACKEND=redis，位址由 CACHE_REDIS_URL 設定)
+- sqlite: 命令列工具使用的單一檔案快取，行程結束後仍保留 (容量上限由 CACHE_SQLITE_MAX_MB 設定)
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+from api.services.cache.base import CacheBackend, NamespacedCache
+from api.services.cache.memory import MemoryCache
+from api.services.cache.redis_cache import RedisCache
+from api.services.cache.sqlite_cache import SQLiteCache
+
+__all__ = [
+    'CacheBackend', 'NamespacedCache', 'MemoryCache', 'RedisCache', 'SQLiteCache',
+    'get_cache_backend', 'get_cache'
+]
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+# 單例實現
+_backend_instance: Optional[CacheBackend] = None
+_sqlite_backends: Dict[str, SQLiteCache] = {}
+_backend_lock = threading.Lock()
+
+
+def _use_redis() -> bool:
+    return os.getenv('CACHE_BACKEND', 'memory').lower() == 'redis'
+
+
+def get_cache_backend() -> CacheBackend:
+    """
+    獲取共用快取後端的單例實例 (依環境變數 CACHE_BACKEND 選擇)
+
+    返回:
+        快取後端實例
+    """
+    global _backend_instance
+    if _backend_instance is None:
+        with _backend_lock:
+            if _backend_instance is None:
+                if _use_redis():
+                    _backend_instance = RedisCache(os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+                else:
+                    _backend_instance = MemoryCache(int(os.getenv('CACHE_MAX_ENTRIES', '10000')))
+    return _backend_instance
+
+
+def get_cache(namespace: str, default_ttl: Optional[float] = None, persistent: bool = False) -> NamespacedCache:
+    """
+    取得特定用途的快取
+
+    參數:
+        namespace: 命名空間 (如 'search'、'reference')
+        default_ttl: 預設有效時間(秒)
+        persistent: 是否需要在行程結束後保留；未使用 Redis 時改用 cache/<namespace>.sqlite 檔案快取
+
+    返回:
+        命名空間快取
+    """
+    if persistent and not _use_redis():
+        with _backend_lock:
+            backend = _sqlite_backends.get(namespace)
+            if backend is None:
+                backend = _sqlite_backends[namespace] = SQLiteCache(
+                    os.path.join(project_root, 'cache', f"{namespace}.sqlite"),
+                    int(float(os.getenv('CACHE_SQLITE_MAX_MB', '256')) * 1024 * 1024)
+                )
+        return NamespacedCache(backend, namespace, default_ttl)
+    return NamespacedCache(get_cache_backend(), namespace, default_ttl)
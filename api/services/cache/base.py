@@ -0,0 +1,178 @@
+"""
+快取後端的基礎類別
+所有快取後端都應該繼承並實現這個基類；呼叫端透過 NamespacedCache 使用，不直接操作完整鍵
+"""
+import logging
+import pickle
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger('cache')
+
+# 所有鍵的共同前綴，多個應用共用同一個 Redis 時避免衝突
+KEY_PREFIX = 'aerotwinex'
+
+
+def serialize(value: Any) -> bytes:
+    """序列化快取值 (跨行程共用的後端使用)"""
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize(data: bytes) -> Any:
+    """還原快取值"""
+    return pickle.loads(data)
+
+
+class CacheBackend(ABC):
+    """
+    快取後端抽象基類
+    以批次操作為主，單筆操作由批次操作實現；後端無法使用時應視為未命中，不拋出例外
+    """
+
+    def __init__(self, name: str):
+        """
+        初始化快取後端
+
+        參數:
+            name: 後端名稱
+        """
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        批次取得快取值
+
+        參數:
+            keys: 完整鍵列表
+
+        返回:
+            命中的 {鍵: 值}，未命中或已過期的鍵不包含在內
+        """
+        pass
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        批次寫入快取值
+
+        參數:
+            items: {完整鍵: 值}
+            ttl: 有效時間(秒)，None 表示不過期
+        """
+        pass
+
+    @abstractmethod
+    def delete_many(self, keys: Iterable[str]) -> None:
+        """批次刪除快取值"""
+        pass
+
+    @abstractmethod
+    def keys(self, prefix: str) -> List[str]:
+        """
+        列出指定前綴的鍵 (用於依條件清除部分快取)
+
+        返回:
+            未過期的完整鍵列表
+        """
+        pass
+
+    @abstractmethod
+    def clear(self, prefix: str) -> int:
+        """
+        刪除指定前綴的所有鍵
+
+        返回:
+            刪除的鍵數量
+        """
+        pass
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def delete(self, key: str) -> None:
+        self.delete_many([key])
+
+    def _count(self, requested: int, found: int) -> None:
+        self.hits += found
+        self.misses += requested - found
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取統計資訊"""
+        total = self.hits + self.misses
+        return {
+            'backend': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class NamespacedCache:
+    """
+    特定用途的快取 (如航班搜尋、參考資料)
+    鍵自動加上命名空間前綴，並使用該用途的預設有效時間
+    """
+
+    def __init__(self, backend: CacheBackend, namespace: str, default_ttl: Optional[float] = None):
+        """
+        初始化命名空間快取
+
+        參數:
+            backend: 快取後端
+            namespace: 命名空間
+            default_ttl: 預設有效時間(秒)
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.prefix = f"{KEY_PREFIX}:{namespace}:"
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.backend.get(self._key(key), default)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.backend.set(self._key(key), value, self.default_ttl if ttl is None else ttl)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(self._key(key))
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """批次取得，返回以原始鍵 (不含前綴) 為鍵的字典"""
+        keys = list(keys)
+        found = self.backend.get_many([self._key(key) for key in keys])
+        return {key: found[self._key(key)] for key in keys if self._key(key) in found}
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self.backend.set_many(
+            {self._key(key): value for key, value in items.items()},
+            self.default_ttl if ttl is None else ttl
+        )
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        self.backend.delete_many([self._key(key) for key in keys])
+
+    def keys(self, prefix: str = '') -> List[str]:
+        """列出此命名空間中以指定前綴開頭的鍵 (不含命名空間前綴)"""
+        return [key[len(self.prefix):] for key in self.backend.keys(self._key(prefix))]
+
+    def clear(self) -> int:
+        """清除此命名空間的所有鍵"""
+        return self.backend.clear(self.prefix)
+
+    def make_key(self, *parts: Any) -> str:
+        """以多個部分組成鍵 (列表會排序後以逗號連接)"""
+        normalized: List[str] = []
+        for part in parts:
+            if isinstance(part, (list, tuple, set)):
+                part = ','.join(sorted(str(item) for item in part))
+            normalized.append('' if part is None else str(part))
+        return ':'.join(normalized)
@@ -0,0 +1,80 @@
+"""
+行程內快取後端
+以 LRU 字典保存，只在同一個行程內共用；快取值直接保存物件參照，呼叫端不應修改取得的值
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from api.services.cache.base import CacheBackend
+
+
+class MemoryCache(CacheBackend):
+    """行程內 LRU 快取，超過容量時淘汰最久未使用的項目"""
+
+    def __init__(self, max_entries: int = 10000):
+        """
+        初始化行程內快取
+
+        參數:
+            max_entries: 最大快取筆數
+        """
+        super().__init__('memory')
+        self.max_entries = max_entries
+        # 鍵 -> (過期時間, 值)，過期時間為 None 表示不過期
+        self._entries: 'OrderedDict[str, Tuple[Optional[float], Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                cached = self._entries.get(key)
+                if cached is None:
+                    continue
+                if cached[0] is not None and cached[0] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = cached[1]
+            self._count(len(keys), len(found))
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def keys(self, prefix: str) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                key for key, (expires_at, _) in self._entries.items()
+                if key.startswith(prefix) and (expires_at is None or expires_at > now)
+            ]
+
+    def clear(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        with self._lock:
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        return stats
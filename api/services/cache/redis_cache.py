@@ -0,0 +1,210 @@
+"""
+Redis 快取後端
+多個 API worker 共用同一份快取；直接以 RESP 協定與 Redis (或相容的服務) 溝通，不需額外套件。
+Redis 無法連線時視為未命中並在一段時間後重試，不影響 API 回應
+"""
+import logging
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from api.services.cache.base import CacheBackend, deserialize, serialize
+
+logger = logging.getLogger('cache.redis')
+
+# 連線失敗後暫停使用 Redis 的秒數
+RETRY_AFTER_SECONDS = 5.0
+# 列出或清除前綴時每次 SCAN 取得的鍵數
+SCAN_COUNT = 500
+
+
+class RedisError(Exception):
+    """Redis 回傳的錯誤"""
+    pass
+
+
+class RedisConnection:
+    """單一 Redis 連線，以 RESP 協定送出命令並解析回應"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None, timeout: float = 1.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def _encode(args: Iterable[Any]) -> bytes:
+        parts = []
+        args = list(args)
+        parts.append(b'*%d\r\n' % len(args))
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Redis 連線已關閉')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise RedisError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(body)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"無法解析的 Redis 回應: {line!r}")
+
+    def execute(self, *args: Any) -> Any:
+        self.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def pipeline(self, commands: List[List[Any]]) -> List[Any]:
+        """一次送出多個命令再依序讀取回應，只需一次網路往返"""
+        if not commands:
+            return []
+        self.sock.sendall(b''.join(self._encode(command) for command in commands))
+        replies = []
+        error = None
+        for _ in commands:
+            try:
+                replies.append(self._read_reply())
+            except RedisError as e:
+                error = error or e
+                replies.append(None)
+        if error:
+            raise error
+        return replies
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisCache(CacheBackend):
+    """
+    Redis 快取
+    每個執行緒使用自己的連線，快取值以 pickle 序列化，有效時間交由 Redis 處理
+    """
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', timeout: float = 1.0):
+        """
+        初始化 Redis 快取
+
+        參數:
+            url: Redis 位址 (redis://[:password@]host:port/db)
+            timeout: 連線與讀寫逾時(秒)
+        """
+        super().__init__('redis')
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self.errors = 0
+        self._local = threading.local()
+        self._unavailable_until = 0.0
+
+    def _connection(self) -> Optional[RedisConnection]:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        if time.monotonic() < self._unavailable_until:
+            return None
+        conn = RedisConnection(self.host, self.port, self.db, self.password, self.timeout)
+        self._local.conn = conn
+        return conn
+
+    def _run(self, operation, default: Any) -> Any:
+        """執行 Redis 操作，連線錯誤時關閉連線、暫停使用並返回預設值"""
+        try:
+            conn = self._connection()
+            if conn is None:
+                return default
+            return operation(conn)
+        except (OSError, ConnectionError, RedisError) as e:
+            self.errors += 1
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn.close()
+                self._local.conn = None
+            if not isinstance(e, RedisError):
+                self._unavailable_until = time.monotonic() + RETRY_AFTER_SECONDS
+            logger.warning(f"Redis 快取操作失敗: {e}")
+            return default
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._run(lambda conn: conn.execute('MGET', *keys), [None] * len(keys))
+        found = {}
+        for key, data in zip(keys, values):
+            if data is None:
+                continue
+            try:
+                found[key] = deserialize(data)
+            except Exception as e:
+                logger.error(f"無法還原快取值 {key}: {e}")
+        self._count(len(keys), len(found))
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        commands = []
+        for key, value in items.items():
+            command = ['SET', key, serialize(value)]
+            if ttl is not None:
+                command += ['PX', max(int(ttl * 1000), 1)]
+            commands.append(command)
+        self._run(lambda conn: conn.pipeline(commands), None)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            self._run(lambda conn: conn.execute('DEL', *keys), 0)
+
+    @staticmethod
+    def _scan(conn: RedisConnection, prefix: str):
+        cursor = b'0'
+        while True:
+            cursor, keys = conn.execute('SCAN', cursor, 'MATCH', f"{prefix}*", 'COUNT', SCAN_COUNT)
+            if keys:
+                yield keys
+            if cursor in (b'0', '0'):
+                return
+
+    def keys(self, prefix: str) -> List[str]:
+        def list_prefix(conn: RedisConnection) -> List[str]:
+            return [key.decode() for batch in self._scan(conn, prefix) for key in batch]
+        return self._run(list_prefix, [])
+
+    def clear(self, prefix: str) -> int:
+        def clear_prefix(conn: RedisConnection) -> int:
+            return sum(conn.execute('DEL', *batch) for batch in self._scan(conn, prefix))
+        return self._run(clear_prefix, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats['server'] = f"{self.host}:{self.port}/{self.db}"
+        stats['errors'] = self.errors
+        return stats
@@ -0,0 +1,273 @@
+"""
+SQLite 快取後端
+所有鍵保存在同一個 SQLite 檔案中，以主鍵查詢、依最後讀取時間索引；
+行程重新啟動後仍可使用，多個行程同時讀寫時由 SQLite 的交易與檔案鎖保證不會讀到寫到一半的資料。
+超過容量上限時淘汰最久未讀取的項目，用於命令列匯入工具的 AviationStack 回應快取。
+讀取只執行 SELECT，最後讀取時間先記在記憶體中，於下次寫入的交易中一併更新；
+總大小與筆數由觸發器維護在 cache_stats 表中，寫入時不必掃描整個資料表
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+from api.services.cache.base import CacheBackend, deserialize, serialize
+
+logger = logging.getLogger('cache.sqlite')
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL,
+        accessed_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries (accessed_at)",
+    "CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    # 既有的快取檔案第一次建立統計時由資料表計算
+    """
+    INSERT OR IGNORE INTO cache_stats (name, value)
+    SELECT 'bytes', COALESCE(SUM(size), 0) FROM cache_entries
+    UNION ALL
+    SELECT 'entries', COUNT(*) FROM cache_entries
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value + new.size WHERE name = 'bytes';
+        UPDATE cache_stats SET value = value + 1 WHERE name = 'entries';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value - old.size WHERE name = 'bytes';
+        UPDATE cache_stats SET value = value - 1 WHERE name = 'entries';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_cache_entries_resize AFTER UPDATE OF size ON cache_entries BEGIN
+        UPDATE cache_stats SET value = value + new.size - old.size WHERE name = 'bytes';
+    END
+    """
+]
+
+# 記憶體中暫存的最後讀取時間超過此秒數未寫回時，讀取後嘗試寫回 (資料庫忙碌時略過)
+ACCESS_FLUSH_SECONDS = 60.0
+# 暫存的最後讀取時間筆數上限
+MAX_PENDING_ACCESS = 10000
+
+
+def _prefix_end(prefix: str) -> str:
+    """以前綴查詢的上界，讓前綴查詢可以使用主鍵索引"""
+    return prefix + '\uffff'
+
+
+class SQLiteCache(CacheBackend):
+    """
+    單一檔案的 SQLite 快取
+    每個執行緒使用自己的連線，寫入使用 WAL 模式與 BEGIN IMMEDIATE；讀取不取得寫入鎖，不會被寫入阻擋
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        初始化 SQLite 快取
+
+        參數:
+            path: 快取檔案路徑
+            max_bytes: 快取值的總大小上限，超過時淘汰最久未讀取的項目
+        """
+        super().__init__('sqlite')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # {鍵: 最後讀取時間}，尚未寫回資料庫
+        self._pending_access: Dict[str, float] = {}
+        self._access_flushed = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        """取得目前執行緒的 SQLite 連接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None 由程式自行控制交易範圍
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        # 立即取得寫入鎖，避免兩個行程都先讀後寫時互相等待
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _flush_access(self, conn: sqlite3.Connection) -> None:
+        """在寫入交易中寫回暫存的最後讀取時間"""
+        with self._stats_lock:
+            pending, self._pending_access = self._pending_access, {}
+            self._access_flushed = time.monotonic()
+        if pending:
+            conn.executemany(
+                'UPDATE cache_entries SET accessed_at = ? WHERE key = ?',
+                [(accessed_at, key) for key, accessed_at in pending.items()]
+            )
+
+    def _try_flush_access(self) -> None:
+        """不等待寫入鎖，資料庫忙碌時保留暫存的讀取時間到下次寫入"""
+        conn = self._connection()
+        conn.execute('PRAGMA busy_timeout = 0')
+        try:
+            with self._transaction() as conn:
+                self._flush_access(conn)
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.execute('PRAGMA busy_timeout = 30000')
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        try:
+            # 過期的項目留給寫入時的 _evict 刪除
+            rows = self._connection().execute(
+                f"SELECT key, value FROM cache_entries WHERE key IN ({','.join('?' * len(keys))})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                keys + [now]
+            ).fetchall()
+            size = 0
+            for key, value in rows:
+                try:
+                    found[key] = deserialize(value)
+                    size += len(value)
+                except Exception as e:
+                    logger.error(f"無法還原快取值 {key}: {e}")
+            with self._stats_lock:
+                self.bytes_read += size
+                if len(self._pending_access) < MAX_PENDING_ACCESS:
+                    self._pending_access.update((key, now) for key in found)
+                flush = self._pending_access and time.monotonic() - self._access_flushed >= ACCESS_FLUSH_SECONDS
+            if flush:
+                self._try_flush_access()
+        except sqlite3.Error as e:
+            logger.error(f"讀取 SQLite 快取出錯: {e}")
+        with self._stats_lock:
+            self._count(len(keys), len(found))
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        if not items:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = []
+        for key, value in items.items():
+            data = serialize(value)
+            rows.append((key, data, len(data), expires_at, now))
+        try:
+            with self._transaction() as conn:
+                self._flush_access(conn)
+                # 使用 UPSERT 而非 INSERT OR REPLACE，讓維護總大小的觸發器在取代時也會執行
+                conn.executemany(
+                    'INSERT INTO cache_entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                    'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at',
+                    rows
+                )
+                evicted = self._evict(conn, now)
+            with self._stats_lock:
+                self.bytes_written += sum(row[2] for row in rows)
+                self.evictions += evicted
+        except sqlite3.Error as e:
+            logger.error(f"寫入 SQLite 快取出錯: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """刪除已過期的項目，仍超過容量時依最後讀取時間淘汰，返回刪除的數量 (含過期項目)"""
+        expired = conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,)).rowcount
+        total = conn.execute("SELECT value FROM cache_stats WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return expired
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY accessed_at'):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM cache_entries WHERE key = ?', victims)
+        if victims:
+            logger.info(f"SQLite 快取超過 {self.max_bytes} 位元組，淘汰 {len(victims)} 個最久未讀取的項目")
+        return expired + len(victims)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = [(key,) for key in keys]
+        if not keys:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.executemany('DELETE FROM cache_entries WHERE key = ?', keys)
+        except sqlite3.Error as e:
+            logger.error(f"刪除 SQLite 快取出錯: {e}")
+
+    def keys(self, prefix: str) -> List[str]:
+        try:
+            rows = self._connection().execute(
+                'SELECT key FROM cache_entries WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)',
+                (prefix, _prefix_end(prefix), time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"讀取 SQLite 快取出錯: {e}")
+            return []
+        return [row[0] for row in rows]
+
+    def clear(self, prefix: str) -> int:
+        try:
+            with self._transaction() as conn:
+                return conn.execute(
+                    'DELETE FROM cache_entries WHERE key >= ? AND key < ?',
+                    (prefix, _prefix_end(prefix))
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"清除 SQLite 快取出錯: {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        try:
+            totals = dict(self._connection().execute('SELECT name, value FROM cache_stats').fetchall())
+            entries, size = totals.get('entries'), totals.get('bytes')
+        except sqlite3.Error:
+            entries, size = None, None
+        stats.update({
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'evictions': self.evictions
+        })
+        return stats
@@ -0,0 +1,112 @@
+"""
+跨 worker 的快取失效
+匯入程式與即時更新器在寫入航班的同一交易中記錄受影響的 (出發機場, 到達機場, 日期)，
+每個 API worker 輪詢變更紀錄，只清除這些航線與日期相關的快取，不需等待快取過期
+"""
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger('cache_invalidation')
+
+# (出發機場, 到達機場, 日期 YYYY-MM-DD)
+ChangeKey = Tuple[str, str, str]
+
+
+class CacheInvalidator:
+    """
+    定期輪詢航班變更紀錄並呼叫已註冊的失效處理函數
+    """
+
+    def __init__(
+        self,
+        fetch_changes: Callable[[int], List[Tuple[int, ChangeKey]]],
+        latest_change_id: Callable[[], int],
+        interval: float = 5.0,
+        replay_after: float = 0.0
+    ):
+        """
+        初始化快取失效輪詢器
+
+        參數:
+            fetch_changes: 取得指定編號之後的變更的函數，返回依編號排序的 [(變更編號, 變更鍵)]
+            latest_change_id: 取得目前最新變更編號的函數，啟動時從此處開始
+            interval: 輪詢間隔(秒)
+            replay_after: 大於0時，變更會在此秒數後再處理一次；
+                          讀取來源 (如本地副本) 落後於主資料庫時，避免失效後又快取到舊資料
+        """
+        self.fetch_changes = fetch_changes
+        self.latest_change_id = latest_change_id
+        self.interval = interval
+        self.replay_after = replay_after
+        self.handlers: List[Callable[[Set[ChangeKey]], None]] = []
+        self.position: Optional[int] = None
+        self.invalidated = 0
+        # (到期時間, 變更鍵)
+        self._replays: List[Tuple[float, Set[ChangeKey]]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler: Callable[[Set[ChangeKey]], None]) -> None:
+        """
+        註冊失效處理函數
+
+        參數:
+            handler: 接收變更鍵集合的函數
+        """
+        self.handlers.append(handler)
+
+    def _dispatch(self, keys: Set[ChangeKey]) -> None:
+        for handler in self.handlers:
+            try:
+                handler(keys)
+            except Exception as e:
+                logger.error(f"清除快取時出錯: {e}")
+
+    def poll_once(self) -> int:
+        """
+        執行一次輪詢
+
+        返回:
+            處理的變更鍵數量
+        """
+        if self.position is None:
+            self.position = self.latest_change_id()
+            return 0
+
+        now = time.monotonic()
+        due = [keys for replay_at, keys in self._replays if replay_at <= now]
+        self._replays = [(replay_at, keys) for replay_at, keys in self._replays if replay_at > now]
+        for keys in due:
+            self._dispatch(keys)
+
+        changes = self.fetch_changes(self.position)
+        if not changes:
+            return 0
+
+        self.position = changes[-1][0]
+        keys = {key for _, key in changes}
+        self._dispatch(keys)
+        if self.replay_after > 0:
+            self._replays.append((now + self.replay_after, keys))
+        self.invalidated += len(keys)
+        logger.info(f"依 {len(changes)} 筆航班變更清除 {len(keys)} 組航線與日期的快取")
+        return len(keys)
+
+    def start(self) -> None:
+        """在背景執行緒中開始輪詢 (重複呼叫不會建立多個執行緒)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='cache-invalidator', daemon=True)
+            self._thread.start()
+            logger.info(f"快取失效輪詢已啟動，間隔 {self.interval} 秒")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"輪詢航班變更紀錄時出錯: {e}")
+            time.sleep(self.interval)
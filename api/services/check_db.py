@@ -1,6 +1,14 @@
-import pyodbc
+import os
+import sys
 import logging
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import connect
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -8,13 +16,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("DatabaseCheck")
 
-# 硬编码连接字符串
-conn_str = "Driver={SQL Server};SERVER=LAPTOP-QJNCMBU4;DATABASE=FlightBookingDB;UID=sa;PWD=Id1001624"
-logger.info(f"连接字符串: {conn_str}")
-
 try:
     # 连接到数据库
-    conn = pyodbc.connect(conn_str)
+    conn = connect()
     cursor = conn.cursor()
     
     # 查询表结构和数据
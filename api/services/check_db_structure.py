@@ -1,22 +1,23 @@
 import os
-import pyodbc
+import sys
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import connect
+
 # Load environment variables
 load_dotenv()
 
 def check_db_structure():
     """Check database structure"""
-    connection_string = os.getenv('DB_CONNECTION_STRING')
-    
-    if not connection_string:
-        print("Missing DB_CONNECTION_STRING environment variable")
-        return
-    
     try:
         # Connect to database
         print(f"Connecting to database...")
-        conn = pyodbc.connect(connection_string, timeout=30)
+        conn = connect()
         cursor = conn.cursor()
         print(f"Connected successfully!")
         
@@ -1,22 +1,23 @@
 import os
-import pyodbc
+import sys
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import connect, get_connection_string
+
 # 加载环境变量
 load_dotenv()
 
 def check_table_structure():
     """检查Flights表的结构"""
-    connection_string = os.getenv('DB_CONNECTION_STRING')
-    
-    if not connection_string:
-        print("缺少数据库连接字符串环境变量 DB_CONNECTION_STRING")
-        return
-    
     try:
         # 连接数据库
         print("尝试连接数据库...")
-        conn = pyodbc.connect(connection_string, timeout=30)
+        conn = connect()
         cursor = conn.cursor()
         print("数据库连接成功！")
         
@@ -63,7 +64,7 @@ def check_table_structure():
         
     except Exception as e:
         print(f"连接数据库或执行查询时出错: {e}")
-        print(f"连接字符串: {connection_string}")
+        print(f"连接字符串: {get_connection_string()}")
 
 if __name__ == "__main__":
     check_table_structure() 
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+AviationStack 查詢規劃
+給定某天需要涵蓋的 (航空公司, 出發機場, 到達機場) 組合，扣除資料庫中已有的部分後，
+以貪婪集合覆蓋選出每次API調用能涵蓋最多未涵蓋組合的航線、航空公司或機場查詢；
+已有緩存的查詢不消耗配額，優先選用。執行後可比較預期與實際的涵蓋率
+"""
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger('coverage_planner')
+
+# 不限航空公司的目標 (只要求該航線有任一航空公司的資料)，如未知營運航空公司的優先航線
+ANY_AIRLINE = '*'
+
+# 查詢類型，依查詢範圍由窄到寬排列；涵蓋數相同時選用範圍較窄的查詢 (回傳資料較少、較不易被分頁截斷)
+ROUTE = 'route'
+AIRLINE = 'airline'
+DEPARTURE = 'departure'
+ARRIVAL = 'arrival'
+
+QUERY_KINDS = (ROUTE, AIRLINE, DEPARTURE, ARRIVAL)
+
+Target = Tuple[str, str, str]
+
+
+def _covered_by(targets: Iterable[Target], pairs: Iterable[Target]) -> Set[Target]:
+    """targets 中已被 pairs (實際的航空公司與航線組合) 涵蓋的目標"""
+    pairs = set(pairs)
+    routes = {(dep, arr) for _, dep, arr in pairs}
+    return {
+        target for target in targets
+        if ((target[1], target[2]) in routes if target[0] == ANY_AIRLINE else target in pairs)
+    }
+
+
+class QueryPlan:
+    """
+    規劃結果
+    queries 的格式與 get_flights_for_configured_airlines_airports 的查詢列表相同，可直接交給批量查詢執行
+    """
+
+    def __init__(self, flight_date: str, targets: Set[Target], covered: Set[Target],
+                 queries: List[Tuple[str, Dict]], expected: Dict[str, Set[Target]], cached: Set[str]):
+        self.flight_date = flight_date
+        self.targets = targets
+        self.covered = covered
+        self.queries = queries
+        self.expected = expected
+        self.cached = cached
+
+    @property
+    def planned_calls(self) -> int:
+        """預計消耗配額的查詢數 (不含已有緩存的查詢)"""
+        return sum(1 for label, _ in self.queries if label not in self.cached)
+
+    @property
+    def expected_covered(self) -> Set[Target]:
+        """執行計劃後預期涵蓋的目標"""
+        covered = set(self.covered)
+        for targets in self.expected.values():
+            covered |= targets
+        return covered
+
+    def report(self, flights: Iterable[Dict]) -> Dict[str, Any]:
+        """
+        比較預期與實際涵蓋率
+
+        參數:
+            flights: 執行計劃後取得的航班 (transform_flight_data_for_db 的格式)
+
+        返回:
+            涵蓋率報告
+        """
+        fetched = {
+            (flight.get('airline_id'), flight.get('departure_airport_code'), flight.get('arrival_airport_code'))
+            for flight in flights
+        }
+        achieved = self.covered | _covered_by(self.targets, fetched)
+        expected = self.expected_covered
+        total = len(self.targets)
+
+        def ratio(count: int) -> float:
+            return round(count / total, 4) if total else 1.0
+
+        return {
+            'flight_date': self.flight_date,
+            'targets': total,
+            'already_covered': len(self.covered),
+            'queries': len(self.queries),
+            'planned_calls': self.planned_calls,
+            'cached_queries': len(self.cached),
+            'expected_coverage': ratio(len(expected)),
+            'achieved_coverage': ratio(len(achieved)),
+            # 預期會涵蓋但實際沒有取得的目標 (當天沒有飛、資料被分頁截斷或查詢失敗)
+            'missed': sorted(expected - achieved),
+            # 計劃外額外涵蓋的目標 (如機場查詢帶回其他航空公司的航班)
+            'unexpected': sorted(achieved - expected)
+        }
+
+
+def _candidates(uncovered: Set[Target], flight_date: str) -> Dict[Tuple[str, Any], Tuple[str, Dict, Set[Target]]]:
+    """依未涵蓋的目標產生所有可能的查詢 {(類型, 鍵): (說明, 查詢參數, 可涵蓋的目標)}"""
+    candidates: Dict[Tuple[str, Any], Tuple[str, Dict, Set[Target]]] = {}
+
+    def add(kind: str, key: Any, label: str, params: Dict, target: Target) -> None:
+        if (kind, key) not in candidates:
+            candidates[(kind, key)] = (label, dict(params, flight_date=flight_date), set())
+        candidates[(kind, key)][2].add(target)
+
+    for target in uncovered:
+        airline, dep, arr = target
+        add(ROUTE, (dep, arr), f"航線 {dep}-{arr}", {'dep_iata': dep, 'arr_iata': arr}, target)
+        if airline != ANY_AIRLINE:
+            add(AIRLINE, airline, f"航空公司 {airline}", {'airline_iata': airline}, target)
+        add(DEPARTURE, dep, f"出發機場 {dep}", {'dep_iata': dep}, target)
+        add(ARRIVAL, arr, f"到達機場 {arr}", {'arr_iata': arr}, target)
+    return candidates
+
+
+def plan_queries(
+    flight_date: str,
+    targets: Iterable[Target],
+    covered_pairs: Iterable[Target] = (),
+    max_calls: int = 20,
+    is_cached: Optional[Callable[[Dict], bool]] = None
+) -> QueryPlan:
+    """
+    以貪婪集合覆蓋規劃查詢
+
+    參數:
+        flight_date: 航班日期 (YYYY-MM-DD)
+        targets: 需要涵蓋的 (航空公司, 出發機場, 到達機場)，航空公司為 ANY_AIRLINE 時只要求該航線有資料
+        covered_pairs: 資料庫中當天已有的 (航空公司, 出發機場, 到達機場)
+        max_calls: 最多消耗配額的查詢數
+        is_cached: 判斷查詢參數是否已有有效緩存的函數，已緩存的查詢不計入 max_calls
+
+    返回:
+        QueryPlan
+    """
+    targets = set(targets)
+    covered = _covered_by(targets, covered_pairs)
+    uncovered = targets - covered
+    candidates = _candidates(uncovered, flight_date)
+    cached_keys = {key for key, (_, params, _) in candidates.items() if is_cached and is_cached(params)}
+
+    queries: List[Tuple[str, Dict]] = []
+    expected: Dict[str, Set[Target]] = {}
+    cached: Set[str] = set()
+    paid = 0
+    while uncovered and candidates:
+        best_key, best_rank = None, None
+        for key, (label, _, covers) in candidates.items():
+            is_free = key in cached_keys
+            if not is_free and paid >= max_calls:
+                continue
+            gain = len(covers & uncovered)
+            if gain == 0:
+                continue
+            # 已緩存的查詢優先，其次是涵蓋數，再依查詢範圍與說明排序以確保結果穩定
+            rank = (is_free, gain, -QUERY_KINDS.index(key[0]), label)
+            if best_key is None or rank > best_rank:
+                best_key, best_rank = key, rank
+        if best_key is None:
+            break
+
+        label, params, covers = candidates.pop(best_key)
+        gained = covers & uncovered
+        uncovered -= gained
+        queries.append((label, params))
+        expected[label] = gained
+        if best_key in cached_keys:
+            cached.add(label)
+        else:
+            paid += 1
+
+    plan = QueryPlan(flight_date, targets, covered, queries, expected, cached)
+    logger.info(
+        f"{flight_date} 查詢規劃: 目標 {len(targets)} 組，已涵蓋 {len(covered)} 組，"
+        f"規劃 {len(queries)} 個查詢 (需調用API {plan.planned_calls} 次)，"
+        f"預期涵蓋率 {len(plan.expected_covered)}/{len(targets)}"
+    )
+    if uncovered:
+        logger.info(f"調用次數不足，仍有 {len(uncovered)} 組無法涵蓋")
+    return plan
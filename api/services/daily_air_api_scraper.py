@@ -1,11 +1,18 @@
-import requests
 import logging
 import time
 import random
 import json
 import os
+import sys
 from datetime import datetime, timedelta
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.services.http_client import HttpSession
+
 # 設置日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -60,7 +67,7 @@ class DailyAirAPIScraper:
             {"origin": "CMJ", "destination": "MZG"}   # 七美 -> 馬公
         ]
         # 初始化請求session
-        self.session = requests.Session()
+        self.session = HttpSession()
         self.session.headers.update(self.headers)
         logger.info("德安航空API爬蟲初始化完成")
 
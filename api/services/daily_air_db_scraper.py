@@ -1,19 +1,26 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import logging
 import os
+import sys
 import json
 from datetime import datetime, timedelta
 import time
 import random
 import re
-import pyodbc
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import connect
+from api.services.http_client import HttpSession
+
 # 加载环境变量
 load_dotenv()
 
@@ -71,7 +78,7 @@ class DailyAirDBScraper:
         }
         
         # 創建會話
-        self.session = requests.Session()
+        self.session = HttpSession()
         self.session.headers.update(self.headers)
         
         # 初始化資料庫連接
@@ -110,7 +117,7 @@ class DailyAirDBScraper:
             
             logger.info("初始化数据库连接")
             try:
-                self.conn = pyodbc.connect(self.connection_string, timeout=30)
+                self.conn = connect()
                 self.cursor = self.conn.cursor()
                 logger.info("数据库连接成功")
             except Exception as e:
@@ -1,18 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import requests
 from bs4 import BeautifulSoup
 import logging
 import os
+import sys
 import json
-import pyodbc
 from datetime import datetime, timedelta
 import time
 import random
 import re
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import connect
+from api.services.http_client import HttpSession
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -34,7 +41,7 @@ class DailyAirImprovedScraper:
         self.name = "德安航空"
         self.airline_id = "DAC"  # 航空公司代码
         self.base_url = "https://www.dailyair.com.tw/Dailyair/Page/"
-        self.session = requests.Session()
+        self.session = HttpSession()
         
         # 设置请求头，模拟浏览器访问
         self.session.headers.update({
@@ -221,14 +228,8 @@ class DailyAirImprovedScraper:
             return
         
         try:
-            # 获取数据库连接字符串
-            connection_string = os.getenv('DB_CONNECTION_STRING')
-            if not connection_string:
-                logger.error("未设置数据库连接字符串")
-                return
-            
             # 连接到数据库
-            conn = pyodbc.connect(connection_string)
+            conn = connect()
             cursor = conn.cursor()
             
             # 准备批量插入
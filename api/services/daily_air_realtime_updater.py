@@ -6,15 +6,23 @@ from bs4 import BeautifulSoup
 import pandas as pd
 import logging
 import os
+import sys
 import json
 from datetime import datetime, timedelta
 import time
 import random
 import re
-import pyodbc
 from dotenv import load_dotenv
 import traceback
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import Session, connect, flight_change_key, record_flight_changes, track_queries
+from api.services.http_client import HttpSession
+
 # 加載環境變數
 load_dotenv()
 
@@ -108,7 +116,7 @@ class DailyAirRealTimeUpdater:
             'CMJ': None,
         }
         
-        self.session = requests.Session()
+        self.session = HttpSession()
         # 設置請求頭，模擬瀏覽器訪問
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -144,8 +152,9 @@ class DailyAirRealTimeUpdater:
             
             logger.info("初始化數據庫連接")
             try:
-                self.conn = pyodbc.connect(self.connection_string, timeout=30)
-                self.cursor = self.conn.cursor()
+                self.conn = connect()
+                self.db_session = Session(self.conn)
+                self.cursor = self.db_session.cursor
                 logger.info("數據庫連接成功")
             except Exception as e:
                 logger.error(f"數據庫連接失敗: {e}")
@@ -176,16 +185,8 @@ class DailyAirRealTimeUpdater:
             today = datetime.now().date()
             tomorrow = today + timedelta(days=1)
             
-            self.cursor.execute("""
-            SELECT flight_number, airline_id, departure_airport_code, arrival_airport_code,
-                   scheduled_departure, scheduled_arrival, flight_status
-            FROM Flights
-            WHERE airline_id = 'DA'
-            AND CONVERT(date, scheduled_departure) BETWEEN ? AND ?
-            """, (today, tomorrow))
-            
             flights = []
-            for row in self.cursor.fetchall():
+            for row in self.db_session.fetch_all('flights.airline_schedule', ('DA', today, tomorrow)):
                 flights.append({
                     'flight_number': row.flight_number,
                     'airline_id': row.airline_id,
@@ -805,6 +806,7 @@ class DailyAirRealTimeUpdater:
         
         return flights_list
     
+    @track_queries('update_flights_in_db')
     def update_flights_in_db(self, flights_info):
         """更新數據庫中的航班資訊"""
         if self.test_mode:
@@ -821,7 +823,8 @@ class DailyAirRealTimeUpdater:
             # 獲取當前時間
             update_time = datetime.now()
             
-            # 執行更新
+            # 執行更新，OUTPUT 取回實際更新的航班與航線，用於記錄航班變更
+            change_keys = []
             for flight_info in flights_info:
                 flight_number = flight_info['flight_number']
                 flight_status = flight_info['flight_status']
@@ -832,27 +835,26 @@ class DailyAirRealTimeUpdater:
                 if len(flight_number) == 4:
                     flight_number = flight_number
                 
-                # 更新數據庫
-                self.cursor.execute("""
-                UPDATE Flights
-                SET flight_status = ?,
-                    actual_departure = ?,
-                    actual_arrival = ?,
-                    updated_at = ?
-                WHERE flight_number = ?
-                AND airline_id = 'DA'
-                AND CONVERT(date, scheduled_departure) = CONVERT(date, GETDATE())
-                """, (
+                # 更新數據庫 (同一語句重複執行，游標會重複使用已準備的語句)
+                self.db_session.execute('flights.update_realtime_status', (
                     flight_status,
                     actual_departure,
                     actual_arrival,
                     update_time,
-                    flight_number
+                    flight_number,
+                    'DA'
                 ))
+                
+                for row in self.cursor.fetchall():
+                    change_keys.append(flight_change_key(row[2], row[3], row[1]))
+            
+            # 與更新同一交易記錄受影響的航線與日期，API 據此清除航班搜尋與狀態快取；
+            # 狀態變更事件由 API 的 StatusChangePoller 依 updated_at 取得後推送給 /flights/stream
+            record_flight_changes(self.db_session, change_keys)
             
             # 提交更新
             self.conn.commit()
-            logger.info(f"成功更新了 {self.cursor.rowcount} 個航班的實時資訊")
+            logger.info(f"成功更新了 {len(change_keys)} 個航班的實時資訊")
             
             return True
             
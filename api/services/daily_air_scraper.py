@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import logging
-import requests
 import json
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
@@ -11,6 +11,13 @@ import time
 import random
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.services.http_client import HttpSession
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -30,7 +37,7 @@ class DailyAirScraper:
         self.airline_id = "DAC"  # 德安航空代码
         self.base_url = "https://www.dailyair.com.tw"
         self.schedule_url = "https://www.dailyair.com.tw/Dailyair/Page/"
-        self.session = requests.Session()
+        self.session = HttpSession()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.159 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -1,12 +1,19 @@
-import requests
 import logging
 import time
 import random
 import json
 import os
+import sys
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.services.http_client import get_http_session
+
 # 設置日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -45,7 +52,7 @@ class DailyAirSimpleScraper:
             time.sleep(random.uniform(1, 3))
             
             # 獲取首頁內容
-            response = requests.get(self.base_url, headers=self.headers, timeout=30)
+            response = get_http_session().get(self.base_url, headers=self.headers, timeout=30)
             response.raise_for_status()
             
             # 保存cookies
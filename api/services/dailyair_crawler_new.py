@@ -1,13 +1,20 @@
-import requests
 import logging
 from bs4 import BeautifulSoup
 import json
 import os
+import sys
 import re
 from datetime import datetime, timedelta
 import time
 import random
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.services.http_client import HttpSession
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -64,7 +71,7 @@ class DailyAirDirectCrawler:
         self.airline_name = "德安航空"
         
         # 创建会话对象
-        self.session = requests.Session()
+        self.session = HttpSession()
         self.session.headers.update(self.headers)
         
         logger.info("德安航空直接爬虫初始化完成")
@@ -553,23 +560,16 @@ class DailyAirDirectCrawler:
             bool: 是否成功保存
         """
         try:
-            import pyodbc
-            from dotenv import load_dotenv
-            
-            # 加载环境变量
-            load_dotenv()
+            from api.database import connect, get_connection_string
             
-            # 获取数据库连接字符串
+            # 未提供连接字符串时使用共用数据访问层的设置
             if not connection_string:
-                connection_string = os.getenv("DB_CONNECTION_STRING")
-                if not connection_string:
-                    logger.error("未提供数据库连接字符串，且环境变量DB_CONNECTION_STRING未设置")
-                    return False
+                connection_string = get_connection_string()
             
             logger.info(f"连接到数据库: {connection_string.split(';')[1] if ';' in connection_string else '(隐藏)'}")
             
             # 建立数据库连接
-            conn = pyodbc.connect(connection_string)
+            conn = connect(connection_string)
             cursor = conn.cursor()
             
             # 插入或更新航班数据
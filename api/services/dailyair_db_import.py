@@ -1,11 +1,17 @@
 import os
+import sys
 import json
-import pyodbc
 import logging
-import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import Session, connect, flight_change_key, record_flight_changes, track_queries
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -33,37 +39,9 @@ def load_flight_data(date_str):
 def connect_to_database():
     """连接到数据库"""
     try:
-        # 尝试使用系统命令读取.env文件内容
-        try:
-            result = subprocess.run(["type", ".env"], capture_output=True, text=True, shell=True)
-            env_content = result.stdout
-            logger.info(f"读取.env文件成功，内容长度: {len(env_content)} 字符")
-            
-            # 从内容中提取连接字符串
-            connection_string = None
-            for line in env_content.splitlines():
-                if line.startswith("DB_CONNECTION_STRING="):
-                    connection_string = line[len("DB_CONNECTION_STRING="):].strip()
-                    break
-        except Exception as e:
-            logger.error(f"使用系统命令读取.env文件时出错: {str(e)}")
-            connection_string = None
-        
-        # 如果上面的方法失败，尝试使用硬编码的连接字符串
-        if not connection_string:
-            logger.warning("未能从.env文件读取连接字符串，使用硬编码值")
-            connection_string = "Driver={ODBC Driver 17 for SQL Server};Server=localhost;Database=FlightBookingDB;Trusted_Connection=yes;"
-        
-        logger.info(f"数据库连接字符串: {connection_string[:20]}...")
-        
-        # 检查连接字符串是否有效
-        if not connection_string or len(connection_string) < 10:
-            logger.error("数据库连接字符串无效")
-            return None
-        
-        # 创建数据库连接
+        # 连接字符串、超时与重试由共用的数据访问层统一处理
         logger.info("尝试连接到数据库...")
-        conn = pyodbc.connect(connection_string)
+        conn = connect()
         logger.info("成功连接到数据库")
         
         # 检查并添加德安航空记录
@@ -102,13 +80,14 @@ def ensure_airline_exists(conn):
         logger.error(f"检查或添加航空公司记录时出错: {str(e)}")
         # 错误不应终止程序，所以不抛出异常
 
+@track_queries('dailyair_db_import')
 def import_flight_data(conn, flights):
     """将航班数据导入到数据库"""
     if not conn or not flights:
         logger.warning("数据库连接无效或没有航班数据，无法导入")
         return 0, 0
     
-    cursor = conn.cursor()
+    session = Session(conn)
     insert_count = 0
     update_count = 0
     error_count = 0
@@ -118,6 +97,8 @@ def import_flight_data(conn, flights):
         start_time = datetime.now()
         logger.info(f"开始导入 {len(flights)} 个航班数据")
         
+        # 解析航班时间，格式错误的航班单独记录
+        rows = {}
         for flight in flights:
             try:
                 # 确保时间格式正确（处理中文冒号等情况）
@@ -128,68 +109,52 @@ def import_flight_data(conn, flights):
                 departure_time = datetime.strptime(dep_time_str, "%Y-%m-%d %H:%M:%S")
                 arrival_time = datetime.strptime(arr_time_str, "%Y-%m-%d %H:%M:%S")
                 
-                # 检查航班是否已存在
-                check_sql = """
-                SELECT COUNT(*) FROM flights 
-                WHERE flight_number = ? AND scheduled_departure = ?
-                """
-                
-                cursor.execute(check_sql, (flight["flight_number"], departure_time))
-                exists = cursor.fetchone()[0] > 0
-                
-                if exists:
-                    # 更新现有航班
-                    update_sql = """
-                    UPDATE flights SET
-                        airline_id = ?,
-                        departure_airport_code = ?,
-                        arrival_airport_code = ?,
-                        scheduled_arrival = ?,
-                        updated_at = GETDATE()
-                    WHERE flight_number = ? AND scheduled_departure = ?
-                    """
-                    
-                    cursor.execute(update_sql, (
-                        3,  # 德安航空的airline_id改为3
-                        flight["origin_airport"],
-                        flight["destination_airport"],
-                        arrival_time,
-                        flight["flight_number"],
-                        departure_time
-                    ))
-                    update_count += 1
-                else:
-                    # 插入新航班
-                    insert_sql = """
-                    INSERT INTO flights (
-                        flight_number, scheduled_departure, airline_id,
-                        departure_airport_code, arrival_airport_code, scheduled_arrival,
-                        flight_status, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE())
-                    """
-                    
-                    cursor.execute(insert_sql, (
-                        flight["flight_number"],
-                        departure_time,
-                        3,  # 德安航空的airline_id改为3
-                        flight["origin_airport"],
-                        flight["destination_airport"],
-                        arrival_time,
-                        "on_time"  # 默认状态
-                    ))
-                    insert_count += 1
-                
-                # 每100条提交一次，避免大事务
-                if (insert_count + update_count) % 100 == 0:
-                    conn.commit()
-                    logger.info(f"已处理 {insert_count + update_count} 条记录")
-            
+                rows[(flight["flight_number"], departure_time)] = (
+                    flight["origin_airport"],
+                    flight["destination_airport"],
+                    arrival_time
+                )
             except Exception as e:
                 logger.error(f"处理航班 {flight.get('flight_number')} 时出错: {str(e)}")
                 error_count += 1
-                
-        # 提交剩余事务
-        conn.commit()
+        
+        if not rows:
+            return 0, 0
+        
+        # 以一次查询取得已存在的航班，再分别批量插入与更新，避免逐笔查询
+        flight_numbers = sorted({flight_number for flight_number, _ in rows})
+        departure_times = [departure_time for _, departure_time in rows]
+        range_start = min(departure_times).replace(hour=0, minute=0, second=0)
+        range_end = max(departure_times).replace(hour=0, minute=0, second=0) + timedelta(days=1)
+        existing = {
+            (row.flight_number, row.scheduled_departure)
+            for row in session.fetch_all(
+                'flights.existing_keys',
+                flight_numbers + [range_start, range_end],
+                flight_numbers=len(flight_numbers)
+            )
+        }
+        
+        updates = []
+        inserts = []
+        for (flight_number, departure_time), (origin, destination, arrival_time) in rows.items():
+            if (flight_number, departure_time) in existing:
+                # 德安航空的airline_id为3
+                updates.append((3, origin, destination, arrival_time, flight_number, departure_time))
+            else:
+                # 默认状态 on_time
+                inserts.append((flight_number, departure_time, 3, origin, destination, arrival_time, "on_time"))
+        
+        update_count = session.execute_many('flights.update_schedule', updates)
+        insert_count = session.execute_many('flights.insert_schedule', inserts)
+        # 记录受影响的航线与日期，API 据此清除对应的缓存
+        record_flight_changes(session, [
+            flight_change_key(origin, destination, departure_time)
+            for (_, departure_time), (origin, destination, _) in rows.items()
+        ])
+        
+        # 提交事务
+        session.commit()
         
         # 计算耗时
         end_time = datetime.now()
@@ -201,11 +166,11 @@ def import_flight_data(conn, flights):
     except Exception as e:
         logger.error(f"导入数据时出错: {str(e)}")
         # 回滚事务
-        conn.rollback()
+        session.rollback()
         return 0, 0
     
     finally:
-        cursor.close()
+        session.close()
 
 def main():
     # 加载最近7天的数据
@@ -10,12 +10,21 @@ import logging
 import time
 import random
 import hashlib
-from typing import Dict, List, Optional, Any, Union, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Any, Union, Tuple
 from dotenv import load_dotenv
 import pytz
-import pickle
 from pathlib import Path
 
+from api.services.cache import get_cache
+from api.services.coverage_planner import ANY_AIRLINE, QueryPlan, plan_queries
+from api.services.http_client import HttpSession
+from api.services.quota import QuotaAllocator, QuotaLedger
+from api.services.rate_limiter import TokenBucket
+from api.services.revalidation import BackgroundRefresher
+from api.services.ttl_policy import AUTH_ERROR, BUCKETS, EMPTY, NEGATIVE_CLASSES, PLAN_ERROR, TTLPolicy
+
 # 設置日誌
 logging.basicConfig(
     level=logging.INFO,
@@ -44,6 +53,38 @@ else:
     print("API金鑰未設置，請檢查.env文件")
 AVIATIONSTACK_BASE_URL = 'http://api.aviationstack.com/v1/'
 
+# 所有對 AviationStack 的即時請求共用的速率限制 (每秒請求數與允許的突發請求數)，
+# 並行查詢的工作執行緒數預設為1 (依序查詢)
+aviation_stack_rate_limiter = TokenBucket(
+    float(os.getenv('AVIATION_STACK_RATE_PER_SECOND', '1')),
+    float(os.getenv('AVIATION_STACK_RATE_BURST', '3'))
+)
+AVIATION_STACK_WORKERS = int(os.getenv('AVIATION_STACK_WORKERS', '1'))
+# 分頁查詢每頁的筆數 (免費方案上限為100)
+AVIATION_STACK_PAGE_SIZE = int(os.getenv('AVIATION_STACK_PAGE_SIZE', '100'))
+
+# 預設優先查詢的航線：台北出發的主要航線
+DEFAULT_PRIORITY_ROUTES = [
+    ('TPE', 'HKG'), ('TPE', 'NRT'), ('TPE', 'HND'),
+    ('TPE', 'ICN'), ('TPE', 'BKK'), ('TPE', 'SIN')
+]
+
+# 每月配額帳本與預算分配，多個排程共用同一個帳本檔案；
+# AVIATION_STACK_JOB_BUDGETS 以 "工作=每日次數" 逗號分隔設定個別工作的每日預算 (如 bulk_import=8,revalidation=4)
+quota_allocator = QuotaAllocator(
+    QuotaLedger(os.getenv('AVIATION_STACK_QUOTA_LEDGER', os.path.join(project_root, 'cache', 'aviation_stack_quota.sqlite'))),
+    monthly_limit=int(os.getenv('AVIATION_STACK_MONTHLY_QUOTA', '500')),
+    reset_day=int(os.getenv('AVIATION_STACK_QUOTA_RESET_DAY', '1')),
+    job_budgets={
+        job.strip(): int(budget)
+        for job, budget in (item.split('=') for item in os.getenv('AVIATION_STACK_JOB_BUDGETS', '').split(',') if '=' in item)
+    }
+)
+QUOTA_EXCEEDED = 'quota_exceeded'
+
+# AviationStack 專用的 HTTP Session (連接重用，每次送出與重試都先經過速率限制)
+aviation_stack_http = HttpSession(rate_limiter=aviation_stack_rate_limiter)
+
 # 載入航空公司與機場配置
 def load_airlines_airports_config():
     try:
@@ -56,54 +97,160 @@ def load_airlines_airports_config():
 # 創建緩存目錄
 def ensure_cache_dir():
     """確保緩存目錄存在"""
-    cache_dir = Path(os.path.join(project_root, 'cache', 'aviation_stack'))
+    cache_dir = Path(os.path.join(project_root, 'cache'))
     cache_dir.mkdir(parents=True, exist_ok=True)
     return cache_dir
 
 # 緩存管理
 def get_cache_key(endpoint: str, params: Dict) -> str:
-    """生成緩存鍵"""
+    """生成緩存鍵 (不包含API金鑰，更換金鑰後仍可使用原有緩存)"""
     # 排序參數以確保相同參數的不同順序產生相同的鍵
-    param_str = json.dumps(params, sort_keys=True)
+    param_str = json.dumps({k: v for k, v in params.items() if k != 'access_key'}, sort_keys=True)
     # 創建緩存鍵
     cache_key = hashlib.md5(f"{endpoint}:{param_str}".encode()).hexdigest()
     return cache_key
 
-def get_from_cache(endpoint: str, params: Dict) -> Optional[Dict]:
-    """從緩存獲取數據"""
-    cache_dir = ensure_cache_dir()
+# AviationStack 回應快取，使用 Redis 時各 worker 共用，否則保存在 cache/aviation_stack.sqlite
+aviation_stack_cache = get_cache('aviation_stack', default_ttl=24 * 60 * 60, persistent=True)
+
+# 各分組的有效時間(秒)，可由 AVIATION_STACK_TTL_<分組> 環境變數覆寫 (如 AVIATION_STACK_TTL_TODAY=300)；
+# 沒有資料與被拒絕的請求另由 AVIATION_STACK_NEGATIVE_TTL_<錯誤類別> 覆寫 (如 AVIATION_STACK_NEGATIVE_TTL_PLAN_ERROR=86400)
+cache_ttl_policy = TTLPolicy(
+    {
+        bucket: float(os.getenv(f'AVIATION_STACK_TTL_{bucket.upper()}'))
+        for bucket in BUCKETS
+        if os.getenv(f'AVIATION_STACK_TTL_{bucket.upper()}')
+    },
+    negative_ttls={
+        error_class: float(os.getenv(f'AVIATION_STACK_NEGATIVE_TTL_{error_class.upper()}'))
+        for error_class in NEGATIVE_CLASSES
+        if os.getenv(f'AVIATION_STACK_NEGATIVE_TTL_{error_class.upper()}')
+    }
+)
+
+# 過期後仍可先回傳舊資料並於背景刷新的時間(秒)，超過後呼叫端等待即時請求
+STALE_WHILE_REVALIDATE = os.getenv('AVIATION_STACK_STALE_WHILE_REVALIDATE', 'true').lower() == 'true'
+MAX_STALE_SECONDS = float(os.getenv('AVIATION_STACK_MAX_STALE_SECONDS', '3600'))
+
+# 背景刷新每天最多使用的API請求次數 (每月500次配額平均每天約16次，保留部分給即時請求)
+cache_refresher = BackgroundRefresher(int(os.getenv('AVIATION_STACK_REFRESH_DAILY_BUDGET', '10')))
+
+class CachedResponse(NamedTuple):
+    """緩存中的API回應"""
+    response: Dict
+    fetched_at: float
+    expires_at: float
+    # 負面快取的錯誤類別，正常回應為None
+    negative: Optional[str] = None
+    # 寫入時API金鑰的指紋，授權錯誤只對同一把金鑰有效
+    credential: Optional[str] = None
+
+def _credential_fingerprint() -> str:
+    return hashlib.md5((AVIATIONSTACK_API_KEY or '').encode()).hexdigest()[:12]
+
+def _get_cached_entry(endpoint: str, params: Dict) -> Optional[CachedResponse]:
+    entry = aviation_stack_cache.get(get_cache_key(endpoint, params))
+    return entry if isinstance(entry, CachedResponse) else None
+
+def is_cached(endpoint: str, params: Dict) -> bool:
+    """是否已有未過期的緩存 (包含負面快取)，不計入命中率統計"""
+    entry = _get_cached_entry(endpoint, params)
+    if entry is None or time.time() >= entry.expires_at:
+        return False
+    return entry.negative != AUTH_ERROR or entry.credential == _credential_fingerprint()
+
+def get_from_cache(endpoint: str, params: Dict, allow_stale: bool = False) -> Optional[Dict]:
+    """
+    從緩存獲取數據
+
+    參數:
+        endpoint: API端點
+        params: 查詢參數
+        allow_stale: 過期未超過 MAX_STALE_SECONDS 時是否先回傳舊資料並在背景刷新
+
+    返回:
+        緩存的API回應，未命中時返回None
+    """
+    bucket = cache_ttl_policy.bucket(endpoint, params)
     cache_key = get_cache_key(endpoint, params)
-    cache_file = cache_dir / f"{cache_key}.pkl"
-    
-    if cache_file.exists():
-        try:
-            # 檢查緩存是否過期（預設24小時）
-            cache_age = datetime.datetime.now().timestamp() - cache_file.stat().st_mtime
-            if cache_age < 24 * 60 * 60:  # 24小時
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            else:
-                logger.info(f"緩存已過期: {endpoint} {params}")
-        except Exception as e:
-            logger.error(f"讀取緩存出錯: {e}")
-    
+    entry = _get_cached_entry(endpoint, params)
+    if entry is not None and entry.negative:
+        # 負面快取過期後不回傳舊結果；更換金鑰後不再沿用授權錯誤
+        if time.time() < entry.expires_at and (entry.negative != AUTH_ERROR or entry.credential == _credential_fingerprint()):
+            cache_ttl_policy.record(bucket, True)
+            cache_ttl_policy.record_negative(entry.negative, True)
+            return dict(entry.response, from_cache=True)
+    elif entry is not None:
+        now = time.time()
+        if now < entry.expires_at:
+            cache_ttl_policy.record(bucket, True)
+            return dict(entry.response, from_cache=True)
+        if allow_stale and now < entry.expires_at + MAX_STALE_SECONDS and cache_refresher.submit(
+            cache_key, lambda: _request_live(endpoint, dict(params), job='revalidation')
+        ):
+            logger.info(f"緩存已過期 {now - entry.expires_at:.0f} 秒，先回傳舊資料並於背景刷新: {endpoint}")
+            cache_ttl_policy.record(bucket, True, stale=True)
+            return dict(entry.response, from_cache=True)
+    cache_ttl_policy.record(bucket, False)
     return None
 
 def save_to_cache(endpoint: str, params: Dict, data: Dict) -> None:
-    """保存數據到緩存"""
-    cache_dir = ensure_cache_dir()
-    cache_key = get_cache_key(endpoint, params)
-    cache_file = cache_dir / f"{cache_key}.pkl"
-    
-    try:
-        with open(cache_file, 'wb') as f:
-            pickle.dump(data, f)
-        logger.info(f"已保存到緩存: {endpoint}")
-    except Exception as e:
-        logger.error(f"保存緩存出錯: {e}")
+    """保存數據到緩存，有效時間依端點與航班日期決定"""
+    bucket = cache_ttl_policy.bucket(endpoint, params)
+    ttl = cache_ttl_policy.ttl(bucket)
+    now = time.time()
+    # 多保留 MAX_STALE_SECONDS，過期後仍可先回傳舊資料
+    aviation_stack_cache.set(
+        get_cache_key(endpoint, params),
+        CachedResponse(data, now, now + ttl),
+        ttl=ttl + MAX_STALE_SECONDS
+    )
+    logger.info(f"已保存到緩存: {endpoint} ({bucket}，{ttl:.0f} 秒)")
+
+def save_negative_to_cache(endpoint: str, params: Dict, response: Dict, error_class: str) -> None:
+    """
+    保存沒有資料或被拒絕的結果，在較短的有效時間內不再重複請求
+
+    參數:
+        endpoint: API端點
+        params: 查詢參數
+        response: 要回傳給呼叫端的結果
+        error_class: 錯誤類別 (empty、plan_error、auth_error)
+    """
+    bucket = cache_ttl_policy.bucket(endpoint, params)
+    ttl = cache_ttl_policy.negative_ttl(error_class, bucket)
+    now = time.time()
+    aviation_stack_cache.set(
+        get_cache_key(endpoint, params),
+        CachedResponse(response, now, now + ttl, error_class, _credential_fingerprint()),
+        ttl=ttl
+    )
+    cache_ttl_policy.record_negative(error_class, False)
+    logger.info(f"已保存負面緩存: {endpoint} ({error_class}，{ttl:.0f} 秒)")
+
+def get_quota_status() -> Dict:
+    """取得本期配額用量、每日預算、平均每日用量與推算的用盡日期"""
+    return quota_allocator.get_status()
+
+def get_cache_stats() -> Dict:
+    """取得緩存統計資訊，包含各有效時間分組的命中率、負面緩存與背景刷新狀態"""
+    stats = aviation_stack_cache.backend.get_stats()
+    stats['buckets'] = cache_ttl_policy.get_stats()
+    stats['negative'] = cache_ttl_policy.get_negative_stats()
+    stats['revalidation'] = cache_refresher.get_stats()
+    stats['rate_limiter'] = aviation_stack_rate_limiter.get_stats()
+    return stats
 
 # API請求函數（增加緩存和重試機制）
-def make_api_request(endpoint: str, params: Dict = None, use_cache: bool = True, max_retries: int = 3, retry_delay: int = 2) -> Dict:
+def make_api_request(
+    endpoint: str,
+    params: Dict = None,
+    use_cache: bool = True,
+    max_retries: int = 3,
+    retry_delay: int = 2,
+    allow_stale: Optional[bool] = None,
+    job: str = 'default'
+) -> Dict:
     """
     向AviationStack API發送請求（帶緩存和重試機制）
 
@@ -112,91 +259,197 @@ def make_api_request(endpoint: str, params: Dict = None, use_cache: bool = True,
         params: 查詢參數
         use_cache: 是否使用緩存
         max_retries: 最大重試次數
-        retry_delay: 重試延遲(秒)
+        retry_delay: 重試的初始退避秒數 (之後每次加倍並加入隨機抖動)
+        allow_stale: 緩存過期時是否先回傳舊資料並於背景刷新，預設依 AVIATION_STACK_STALE_WHILE_REVALIDATE
+        job: 工作名稱，用於配額帳本與各工作的每日預算
 
     返回:
         API回應的JSON數據
     """
     if params is None:
         params = {}
-    
-    # 確保有API金鑰
-    params['access_key'] = AVIATIONSTACK_API_KEY
+    if allow_stale is None:
+        allow_stale = STALE_WHILE_REVALIDATE
     
     # 檢查緩存
     if use_cache:
-        cached_data = get_from_cache(endpoint, params)
+        cached_data = get_from_cache(endpoint, params, allow_stale=allow_stale)
         if cached_data:
             logger.info(f"從緩存獲取數據: {endpoint}")
             return cached_data
     
+    result = _request_live(endpoint, params, use_cache, max_retries, retry_delay, job)
+    
+    # 預算不足時延後刷新，有任何舊資料都先使用
+    if result.get('source') == QUOTA_EXCEEDED and use_cache:
+        entry = _get_cached_entry(endpoint, params)
+        if entry is not None and not entry.negative:
+            logger.warning(f"API預算不足，使用已過期的緩存: {endpoint}")
+            return dict(entry.response, from_cache=True)
+    return result
+
+def _request_live(
+    endpoint: str,
+    params: Dict,
+    use_cache: bool = True,
+    max_retries: int = 3,
+    retry_delay: int = 2,
+    job: str = 'default'
+) -> Dict:
+    """發送即時請求 (連線錯誤、逾時、429與5xx由 aviation_stack_http 退避重試)，成功時寫入緩存"""
+    # 每次送出的請求 (含重試) 都記錄在配額帳本中，超出每月、每日或工作預算時不送出
+    params_hash = get_cache_key(endpoint, params)
+    allowed, reason = quota_allocator.try_acquire(endpoint, params_hash, job)
+    if not allowed:
+        return {"error": reason, "data": None, "source": QUOTA_EXCEEDED}
+    
+    # API金鑰只加在實際送出的參數中，不影響緩存鍵與日誌
+    request_params = dict(params, access_key=AVIATIONSTACK_API_KEY)
+    
     # 記錄請求信息
     logger.info(f"發送請求到 {AVIATIONSTACK_BASE_URL}{endpoint} 參數: {params}")
     
-    # 重試邏輯
-    for retry in range(max_retries):
-        try:
-            # 發起請求
-            response = requests.get(f"{AVIATIONSTACK_BASE_URL}{endpoint}", params=params)
-            
-            # 處理成功響應
-            if response.status_code == 200:
-                try:
-                    json_response = response.json()
-                    
-                    # 檢查API錯誤
-                    if 'error' in json_response:
-                        error_info = json_response.get('error', {})
-                        error_code = error_info.get('code', 'unknown')
-                        error_message = error_info.get('message', 'Unknown error')
-                        logger.error(f"API返回錯誤: {error_code} - {error_message}")
-                        
-                        # 處理配額限制
-                        if error_code == 'usage_limit_reached':
-                            logger.warning("月度API配額已用盡，將使用緩存或模擬數據")
-                            return {"error": error_info, "data": None, "source": "api_error"}
-                    
-                    # 保存到緩存
-                    if use_cache and 'data' in json_response:
-                        save_to_cache(endpoint, params, json_response)
-                    
-                    return json_response
-                except Exception as e:
-                    logger.error(f"處理API回應時出錯: {e}")
-                    if retry < max_retries - 1:
-                        time.sleep(retry_delay)
-                        continue
-                    return {"error": str(e), "data": None, "source": "parse_error"}
-            
-            # 處理HTTP錯誤
-            else:
-                logger.error(f"API請求失敗: {response.status_code} {response.reason}")
-                logger.error(f"回應內容: {response.text}")
-                
-                # 處理特定錯誤
-                if response.status_code == 429:  # Too Many Requests
-                    # 如果達到限制，等待更長時間
-                    wait_time = retry_delay * (retry + 1) * 2
-                    logger.warning(f"達到API速率限制，等待{wait_time}秒後重試")
-                    time.sleep(wait_time)
-                elif response.status_code == 401:  # Unauthorized
-                    return {"error": "API金鑰無效或未授權", "data": None, "source": "auth_error"}
-                elif response.status_code == 403:  # Forbidden
-                    return {"error": "API功能受限，該功能在您的方案中不可用", "data": None, "source": "plan_error"}
-                elif retry < max_retries - 1:
-                    # 一般錯誤重試
-                    time.sleep(retry_delay)
-                else:
-                    return {"error": f"{response.status_code} {response.reason}", "data": None, "source": "http_error"}
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API請求異常: {e}")
-            if retry < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                return {"error": str(e), "data": None, "source": "request_error"}
-    
-    return {"error": "達到最大重試次數", "data": None, "source": "max_retries"}
+    try:
+        response = aviation_stack_http.get(
+            f"{AVIATIONSTACK_BASE_URL}{endpoint}",
+            params=request_params,
+            retries=max(0, max_retries - 1),
+            backoff=retry_delay,
+            before_retry=lambda: quota_allocator.try_acquire(endpoint, params_hash, job)[0]
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"API請求異常: {e}")
+        return {"error": str(e), "data": None, "source": "request_error"}
+    
+    # 處理HTTP錯誤
+    if response.status_code != 200:
+        logger.error(f"API請求失敗: {response.status_code} {response.reason}")
+        logger.error(f"回應內容: {response.text}")
+        
+        if response.status_code == 401:  # Unauthorized
+            result = {"error": "API金鑰無效或未授權", "data": None, "source": AUTH_ERROR}
+            if use_cache:
+                save_negative_to_cache(endpoint, params, result, AUTH_ERROR)
+            return result
+        if response.status_code == 403:  # Forbidden
+            result = {"error": "API功能受限，該功能在您的方案中不可用", "data": None, "source": PLAN_ERROR}
+            if use_cache:
+                save_negative_to_cache(endpoint, params, result, PLAN_ERROR)
+            return result
+        if response.status_code == 429:  # Too Many Requests
+            return {"error": "達到最大重試次數", "data": None, "source": "max_retries"}
+        return {"error": f"{response.status_code} {response.reason}", "data": None, "source": "http_error"}
+    
+    # 處理成功響應
+    try:
+        json_response = response.json()
+    except ValueError as e:
+        logger.error(f"處理API回應時出錯: {e}")
+        return {"error": str(e), "data": None, "source": "parse_error"}
+    
+    # 檢查API錯誤
+    if 'error' in json_response:
+        error_info = json_response.get('error', {})
+        error_code = error_info.get('code', 'unknown')
+        error_message = error_info.get('message', 'Unknown error')
+        logger.error(f"API返回錯誤: {error_code} - {error_message}")
+        
+        # 處理配額限制
+        if error_code == 'usage_limit_reached':
+            logger.warning("月度API配額已用盡，將使用緩存或模擬數據")
+            cache_refresher.pause(24 * 60 * 60)
+            return {"error": error_info, "data": None, "source": "api_error"}
+    
+    # 保存到緩存，沒有資料的結果使用較短的有效時間
+    if use_cache and 'data' in json_response:
+        if json_response['data']:
+            save_to_cache(endpoint, params, json_response)
+        else:
+            save_negative_to_cache(endpoint, params, json_response, EMPTY)
+    
+    return json_response
+
+def _page_params(params: Dict, offset: int, page_size: int = AVIATION_STACK_PAGE_SIZE) -> Dict:
+    return dict(params, limit=page_size, offset=offset)
+
+def iter_api_pages(
+    endpoint: str,
+    params: Dict = None,
+    page_size: int = AVIATION_STACK_PAGE_SIZE,
+    use_cache: bool = True,
+    job: str = 'default',
+    budget: Optional[Callable[[], bool]] = None
+) -> Iterator[Dict]:
+    """
+    依 limit/offset 逐頁取得API回應，每頁分別緩存；只有在呼叫端取用下一頁時才會送出請求
+
+    參數:
+        endpoint: API端點
+        params: 查詢參數 (不含 limit/offset)
+        page_size: 每頁筆數
+        use_cache: 是否使用緩存
+        job: 工作名稱，用於配額帳本與各工作的每日預算
+        budget: 送出未緩存的頁面請求前呼叫，返回 False 時停止 (如已達呼叫端的API調用次數上限)
+
+    返回:
+        逐頁的API回應；錯誤回應 (含配額不足) 會作為最後一頁返回
+    """
+    params = dict(params or {})
+    offset = 0
+    while True:
+        page_params = _page_params(params, offset, page_size)
+        if budget is not None and not (use_cache and is_cached(endpoint, page_params)) and not budget():
+            logger.info(f"已達API調用上限，停止取得 {endpoint} 的後續頁面 (offset {offset})")
+            return
+        
+        response = make_api_request(endpoint, page_params, use_cache=use_cache, job=job)
+        yield response
+        
+        data = response.get('data')
+        if not data or 'error' in response:
+            return
+        offset += len(data)
+        total = (response.get('pagination') or {}).get('total')
+        if len(data) < page_size or (total is not None and offset >= total):
+            return
+
+def iter_flights(
+    params: Dict,
+    limit: Optional[int] = None,
+    use_cache: bool = True,
+    job: str = 'default',
+    budget: Optional[Callable[[], bool]] = None,
+    processed_flights: Optional[set] = None,
+    on_page: Optional[Callable[[Dict], None]] = None
+) -> Iterator[Dict]:
+    """
+    逐頁取得航班並逐筆轉換為數據庫格式 (去除重複航班)，取得 limit 筆後不再請求後續頁面
+
+    參數:
+        params: 查詢參數
+        limit: 最多取得的航班數，None 表示取得所有頁面
+        use_cache: 是否使用緩存
+        job: 工作名稱，用於配額帳本與各工作的每日預算
+        budget: 同 iter_api_pages
+        processed_flights: 已處理的航班鍵，跨多個查詢去重時傳入同一個集合
+        on_page: 取得每頁回應後、產出該頁航班前呼叫 (如計算API調用次數、檢查配額錯誤)
+
+    返回:
+        transform_flight_data_for_db 格式的航班
+    """
+    if limit is not None and limit <= 0:
+        return
+    if processed_flights is None:
+        processed_flights = set()
+    count = 0
+    for response in iter_api_pages('flights', params, use_cache=use_cache, job=job, budget=budget):
+        if on_page is not None:
+            on_page(response)
+        for flight in _new_flights(response, params.get('flight_date', ''), processed_flights):
+            yield flight
+            count += 1
+            if limit is not None and count >= limit:
+                return
 
 # 獲取實時航班狀態
 def get_real_time_flights(
@@ -407,6 +660,104 @@ def transform_flight_data_for_db(flight_data: Dict) -> Dict:
     
     return db_record
 
+def _new_flights(response: Dict, flight_date: str, processed_flights: set) -> Iterator[Dict]:
+    """逐筆轉換回應中尚未處理過的航班"""
+    for flight_data in response.get('data') or []:
+        flight_key = f"{flight_data.get('flight', {}).get('iata', '')}-{flight_date}"
+        if flight_key not in processed_flights:
+            processed_flights.add(flight_key)
+            yield transform_flight_data_for_db(flight_data)
+
+def _is_quota_or_auth_error(response: Dict) -> bool:
+    """回應是否表示配額用盡或授權問題 (應停止後續查詢)"""
+    return response.get('source') in [AUTH_ERROR, PLAN_ERROR, QUOTA_EXCEEDED] or 'usage_limit_reached' in str(response.get('error', {}))
+
+def _fetch_flights_concurrently(
+    queries: List[Tuple[str, Dict]],
+    flight_date: str,
+    max_api_calls: int,
+    use_cache: bool,
+    max_workers: int,
+    processed_flights: set,
+    all_flights: List[Dict],
+    job: str = 'default',
+    limit: Optional[int] = None
+) -> int:
+    """
+    以工作執行緒池並行查詢，請求間隔由 aviation_stack_rate_limiter 控制；
+    各執行緒逐頁轉換並去重，取得 limit 筆後所有執行緒都不再請求後續頁面
+
+    參數:
+        queries: [(說明, 查詢參數)]，依優先順序排列
+        flight_date: 航班日期
+        max_api_calls: 最大API調用次數
+        use_cache: 是否使用緩存
+        max_workers: 工作執行緒數
+        processed_flights: 已處理的航班鍵 (用於去重)
+        all_flights: 結果列表
+        job: 工作名稱 (配額帳本)
+        limit: 最多取得的航班數，None 表示不限制
+
+    返回:
+        實際API調用次數
+    """
+    api_calls = 0
+    collected = len(all_flights)
+    calls_lock = threading.Lock()
+    stop = threading.Event()
+    
+    def full() -> bool:
+        return limit is not None and collected >= limit
+    
+    def run(label: str, params: Dict) -> List[Dict]:
+        nonlocal api_calls, collected
+        reserved = False
+        
+        def reserve() -> bool:
+            # 每頁請求前先預留一次調用，命中緩存時歸還
+            nonlocal api_calls, reserved
+            with calls_lock:
+                if stop.is_set() or full() or api_calls >= max_api_calls:
+                    return False
+                api_calls += 1
+            reserved = True
+            return True
+        
+        with calls_lock:
+            if stop.is_set() or full():
+                return []
+        logger.info(f"查詢{label}的航班...")
+        flights = []
+        for response in iter_api_pages('flights', params, use_cache=use_cache, job=job, budget=reserve):
+            # 去重與計數在鎖內進行，同一航班只會由一個執行緒加入
+            with calls_lock:
+                if reserved and response.get('from_cache'):
+                    api_calls -= 1
+                for flight in _new_flights(response, flight_date, processed_flights):
+                    if full():
+                        break
+                    flights.append(flight)
+                    collected += 1
+                done = full()
+            reserved = False
+            if _is_quota_or_auth_error(response):
+                stop.set()
+            if done:
+                break
+        return flights
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='aviation-stack') as executor:
+        futures = [executor.submit(run, label, params) for label, params in queries]
+        # 依提交順序合併結果
+        for future in futures:
+            all_flights.extend(future.result())
+    
+    if stop.is_set():
+        logger.warning("API配額限制或授權問題，停止API調用")
+    elif api_calls >= max_api_calls:
+        logger.warning(f"已達最大API調用次數({max_api_calls})，停止查詢")
+    return api_calls
+
 # 批量獲取指定航空公司和機場的航班資訊（優化版）
 def get_flights_for_configured_airlines_airports(
     flight_date: Optional[str] = None,
@@ -415,7 +766,11 @@ def get_flights_for_configured_airlines_airports(
     max_api_calls: int = 20,
     use_cache: bool = True,
     use_mock_data: bool = False,
-    priority_routes: Optional[List[Tuple[str, str]]] = None
+    priority_routes: Optional[List[Tuple[str, str]]] = None,
+    max_workers: Optional[int] = None,
+    job: str = 'configured_flights',
+    plan: Optional[QueryPlan] = None,
+    limit: Optional[int] = None
 ) -> List[Dict]:
     """
     獲取配置中指定航空公司和機場的所有航班信息(優化版)
@@ -428,10 +783,18 @@ def get_flights_for_configured_airlines_airports(
         use_cache: 是否使用緩存
         use_mock_data: 是否在無法從API獲取數據時使用模擬數據
         priority_routes: 優先查詢的航線列表，格式為[(出發機場, 到達機場),...]
+        max_workers: 並行查詢的工作執行緒數，大於1時改為並行查詢並由共用的速率限制控制請求間隔，
+                     預設依 AVIATION_STACK_WORKERS
+        job: 工作名稱，用於配額帳本與各工作的每日預算
+        plan: plan_flight_queries 產生的查詢計劃，提供時依計劃查詢並記錄預期與實際涵蓋率
+        limit: 最多取得的航班數，達到後不再請求後續頁面與查詢，None 表示不限制
 
     返回:
         符合條件的航班資料列表
     """
+    if max_workers is None:
+        max_workers = AVIATION_STACK_WORKERS
+    
     # 加載配置
     config = load_airlines_airports_config()
     airlines = limit_airlines or config.get('airlines', [])[:5]  # 只使用前5個航空公司作為默認值
@@ -439,11 +802,7 @@ def get_flights_for_configured_airlines_airports(
     
     # 設置優先級路線
     if priority_routes is None:
-        # 默認優先級：台北出發的主要航線
-        priority_routes = [
-            ('TPE', 'HKG'), ('TPE', 'NRT'), ('TPE', 'HND'), 
-            ('TPE', 'ICN'), ('TPE', 'BKK'), ('TPE', 'SIN')
-        ]
+        priority_routes = DEFAULT_PRIORITY_ROUTES
     
     # 初始化結果容器
     all_flights = []
@@ -452,85 +811,70 @@ def get_flights_for_configured_airlines_airports(
     mock_data_used = False
     
     # 設置日期
-    if not flight_date:
+    if plan is not None:
+        flight_date = plan.flight_date
+    elif not flight_date:
         flight_date = datetime.datetime.now().strftime('%Y-%m-%d')
     
     logger.info(f"批量獲取航班信息 - 日期: {flight_date}, " + 
                 f"最大API調用: {max_api_calls}, 使用緩存: {use_cache}, 使用模擬: {use_mock_data}")
     
-    # 首先處理優先航線
-    for dep, arr in priority_routes:
-        if api_calls >= max_api_calls:
-            logger.warning(f"已達最大API調用次數({max_api_calls})，停止查詢")
-            break
+    # 先查詢優先航線，再查詢各航空公司
+    queries = plan.queries if plan is not None else [
+        (f"優先航線 {dep}-{arr}", {'dep_iata': dep, 'arr_iata': arr, 'flight_date': flight_date})
+        for dep, arr in priority_routes
+        if dep in airports and arr in airports
+    ] + [
+        (f"航空公司 {airline}", {'airline_iata': airline, 'flight_date': flight_date})
+        for airline in airlines
+    ]
+    
+    if max_workers > 1:
+        api_calls = _fetch_flights_concurrently(
+            queries, flight_date, max_api_calls, use_cache, max_workers, processed_flights, all_flights, job, limit
+        )
+    else:
+        stopped = False
         
-        if dep in airports and arr in airports:
-            logger.info(f"查詢優先航線 {dep}-{arr} 的航班...")
-            response = make_api_request(
-                'flights', 
-                {
-                    'dep_iata': dep,
-                    'arr_iata': arr,
-                    'flight_date': flight_date
-                },
-                use_cache=use_cache
-            )
-            api_calls += 1
-            
-            if 'data' in response and response['data']:
-                for flight_data in response['data']:
-                    flight_key = f"{flight_data.get('flight', {}).get('iata', '')}-{flight_date}"
-                    if flight_key not in processed_flights:
-                        processed_flights.add(flight_key)
-                        db_record = transform_flight_data_for_db(flight_data)
-                        all_flights.append(db_record)
-            
+        def on_page(response: Dict) -> None:
+            nonlocal api_calls, stopped
+            if not response.get('from_cache'):
+                api_calls += 1
             # 檢查配額限制
-            elif response.get('source') in ['auth_error', 'plan_error'] or 'usage_limit_reached' in str(response.get('error', {})):
+            if _is_quota_or_auth_error(response):
                 logger.warning("API配額限制或授權問題，停止API調用")
-                break
-            
-            # 隨機延遲以避免速率限制
-            time.sleep(random.uniform(1.0, 2.5))
-    
-    # 如果還沒達到最大API調用次數，查詢其他航空公司
-    remaining_calls = max_api_calls - api_calls
-    if remaining_calls > 0 and len(airlines) > 0:
-        logger.info(f"查詢航空公司航班，剩餘API調用次數: {remaining_calls}")
+                stopped = True
+            elif not response.get('from_cache'):
+                # 隨機延遲以避免速率限制 (緩存結果不需要)
+                time.sleep(random.uniform(1.0, 3.0))
         
-        # 計算每個航空公司分配的API調用次數
-        calls_per_airline = max(1, remaining_calls // len(airlines))
-        
-        for airline in airlines:
+        for label, params in queries:
             if api_calls >= max_api_calls:
+                logger.warning(f"已達最大API調用次數({max_api_calls})，停止查詢")
                 break
-                
-            logger.info(f"查詢航空公司 {airline} 的航班...")
-            response = make_api_request(
-                'flights', 
-                {
-                    'airline_iata': airline,
-                    'flight_date': flight_date
-                },
-                use_cache=use_cache
-            )
-            api_calls += 1
-            
-            if 'data' in response and response['data']:
-                for flight_data in response['data']:
-                    flight_key = f"{flight_data.get('flight', {}).get('iata', '')}-{flight_date}"
-                    if flight_key not in processed_flights:
-                        processed_flights.add(flight_key)
-                        db_record = transform_flight_data_for_db(flight_data)
-                        all_flights.append(db_record)
-            
-            # 檢查配額限制
-            elif response.get('source') in ['auth_error', 'plan_error'] or 'usage_limit_reached' in str(response.get('error', {})):
-                logger.warning("API配額限制或授權問題，停止API調用")
+            if limit is not None and len(all_flights) >= limit:
+                logger.info(f"已取得 {limit} 個航班，停止查詢")
                 break
             
-            # 隨機延遲以避免速率限制
-            time.sleep(random.uniform(1.5, 3.0))
+            logger.info(f"查詢{label}的航班...")
+            all_flights.extend(iter_flights(
+                params,
+                limit=None if limit is None else limit - len(all_flights),
+                use_cache=use_cache,
+                job=job,
+                budget=lambda: api_calls < max_api_calls,
+                processed_flights=processed_flights,
+                on_page=on_page
+            ))
+            if stopped:
+                break
+    
+    if plan is not None:
+        report = plan.report(all_flights)
+        logger.info(f"{flight_date} 涵蓋率: 預期 {report['expected_coverage']:.1%}，實際 {report['achieved_coverage']:.1%} "
+                    f"(目標 {report['targets']} 組，查詢前已涵蓋 {report['already_covered']} 組)")
+        if report['missed']:
+            logger.info(f"預期涵蓋但未取得: {report['missed'][:10]}")
     
     # 如果沒有查詢到航班或被要求使用模擬數據，生成模擬數據
     if (len(all_flights) == 0 or use_mock_data) and not mock_data_used:
@@ -538,10 +882,55 @@ def get_flights_for_configured_airlines_airports(
         mock_flights = generate_mock_flight_data(flight_date, airlines, airports, priority_routes)
         all_flights.extend(mock_flights)
         mock_data_used = True
+        if limit is not None:
+            del all_flights[limit:]
     
     logger.info(f"總共獲取了 {len(all_flights)} 個航班資訊，API調用次數：{api_calls}")
     return all_flights
 
+def plan_flight_queries(
+    flight_date: str,
+    routes: List[Dict],
+    covered_pairs: List[Tuple[str, str, str]] = (),
+    max_api_calls: int = 20,
+    priority_routes: Optional[List[Tuple[str, str]]] = None,
+    use_cache: bool = True
+) -> QueryPlan:
+    """
+    規劃涵蓋配置中航空公司與機場的查詢 (貪婪集合覆蓋)
+
+    參數:
+        flight_date: 航班日期 (YYYY-MM-DD)
+        routes: 已知航線及其營運航空公司 (fetch_route_summaries 的格式)
+        covered_pairs: 資料庫中當天已有的 (航空公司, 出發機場, 到達機場)
+        max_api_calls: 最大API調用次數
+        priority_routes: 優先航線，營運航空公司未知時只要求該航線有任一航班
+        use_cache: 是否將已有緩存的查詢視為不消耗配額
+
+    返回:
+        QueryPlan，交給 get_flights_for_configured_airlines_airports 的 plan 參數執行
+    """
+    config = load_airlines_airports_config()
+    airlines = set(config.get('airlines', []))
+    airports = set(config.get('airports', []))
+    
+    targets = {
+        (airline, route['departure'], route['arrival'])
+        for route in routes
+        if route['departure'] in airports and route['arrival'] in airports
+        for airline in route['airlines']
+        if airline in airlines
+    }
+    targets.update(
+        (ANY_AIRLINE, dep, arr)
+        for dep, arr in (DEFAULT_PRIORITY_ROUTES if priority_routes is None else priority_routes)
+    )
+    
+    return plan_queries(
+        flight_date, targets, covered_pairs, max_api_calls,
+        is_cached=(lambda params: is_cached('flights', _page_params(params, 0))) if use_cache else None
+    )
+
 # 生成模擬航班數據
 def generate_mock_flight_data(flight_date: str, airlines: List[str], airports: List[str], priority_routes: List[Tuple[str, str]]) -> List[Dict]:
     """生成模擬的航班數據用於開發和測試"""
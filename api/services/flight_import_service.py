@@ -10,13 +10,12 @@ import os
 import datetime
 import logging
 import time
-import random
 from typing import Dict, List, Optional, Any, Tuple, Type, Union
 
 from api.services.providers.base import FlightProvider
 from api.services.providers.aviation_stack_provider import AviationStackProvider
 from api.services.providers.daily_air_provider import DailyAirProvider
-from api.services.aviation_stack_importer import import_flight, get_import_statistics
+from api.services.aviation_stack_importer import import_flights_batch, get_import_statistics
 
 # 設置日誌
 logging.basicConfig(
@@ -105,29 +104,19 @@ class FlightImportService:
         logger.info(f"從 {provider_name} 導入 {flight_date} 的航班資料")
         
         try:
-            # 獲取航班資料
-            flights = provider.get_flights(flight_date=flight_date, **kwargs)
+            # 獲取航班資料，支援 limit 的提供者取得足夠數量後即停止請求
+            flights = provider.get_flights(flight_date=flight_date, limit=limit if limit > 0 else None, **kwargs)
             
-            # 限制數量
+            # 限制數量 (不支援 limit 的提供者)
             if limit > 0 and len(flights) > limit:
                 flights = flights[:limit]
             
-            # 開始導入
-            successful = 0
+            # 開始導入 (單一交易批次寫入)
             total = len(flights)
             
             logger.info(f"開始導入 {total} 個航班...")
             
-            for i, flight in enumerate(flights):
-                if import_flight(flight):
-                    successful += 1
-                
-                # 每導入10個航班顯示進度
-                if (i + 1) % 10 == 0 or i == total - 1:
-                    logger.info(f"進度: {i+1}/{total} ({successful} 成功)")
-                
-                # 隨機延遲，避免過快寫入
-                time.sleep(random.uniform(0.1, 0.3))
+            successful = import_flights_batch(flights)
             
             success_rate = (successful / total * 100) if total > 0 else 0
             logger.info(f"導入完成: {successful}/{total} 成功率: {success_rate:.2f}%")
@@ -0,0 +1,363 @@
+"""
+航班讀取模型
+在記憶體中保存未來數天的航班，依 (出發機場, 到達機場, 日期) 分組；
+每組以依起飛時間排序的平行陣列保存，時間範圍篩選只需二分搜尋，查詢時完全不經過資料庫。
+背景執行緒依 updated_at 增量刷新
+"""
+import datetime
+import decimal
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('flight_read_model')
+
+# 保存的天數 (含今天)
+READ_MODEL_DAYS = int(os.getenv('FLIGHT_READ_MODEL_DAYS', '7'))
+# 刷新間隔(秒)
+READ_MODEL_REFRESH_SECONDS = float(os.getenv('FLIGHT_READ_MODEL_REFRESH_SECONDS', '30'))
+
+# 分組鍵: (出發機場, 到達機場, 日期 YYYY-MM-DD)
+GroupKey = Tuple[str, str, str]
+
+EPOCH = datetime.datetime(1970, 1, 1)
+# 第一次載入的起始時間 (取得全部資料)
+INITIAL_WATERMARK = datetime.datetime(1900, 1, 1)
+# 陣列中表示沒有值
+MISSING = -1
+
+
+def _code(value: Optional[str]) -> str:
+    """機場與航空公司代碼正規化 (與資料庫不分大小寫的比對一致)"""
+    return (value or '').strip().upper()
+
+
+def _to_seconds(value: Optional[datetime.datetime]) -> int:
+    return int((value - EPOCH).total_seconds()) if value else MISSING
+
+
+def _from_seconds(value: int) -> Optional[datetime.datetime]:
+    return EPOCH + datetime.timedelta(seconds=value) if value != MISSING else None
+
+
+def _to_cents(price: Any) -> int:
+    if price is None:
+        return MISSING
+    return int((decimal.Decimal(str(price)) * 100).to_integral_value())
+
+
+def _from_cents(cents: int) -> Optional[decimal.Decimal]:
+    return decimal.Decimal(cents).scaleb(-2) if cents != MISSING else None
+
+
+class RouteDayFlights:
+    """
+    單一航線單日的航班
+    每個欄位各為一個陣列，同一索引為同一航班，依起飛時間排序
+    """
+
+    __slots__ = ('departures', 'arrivals', 'numbers', 'statuses', 'aircraft', 'prices')
+
+    def __init__(self):
+        self.departures = array('q')  # 預定起飛時間 (秒)
+        self.arrivals = array('q')    # 預定抵達時間 (秒)
+        self.numbers = array('l')     # 航班編號索引
+        self.statuses = array('h')    # 航班狀態索引
+        self.aircraft = array('h')    # 機型索引
+        self.prices = array('q')      # 價格 (分)
+
+    def _columns(self) -> Tuple[array, ...]:
+        return (self.departures, self.arrivals, self.numbers, self.statuses, self.aircraft, self.prices)
+
+    def __len__(self) -> int:
+        return len(self.departures)
+
+    def find(self, departure: int, number: int) -> int:
+        """找出指定航班的位置，不存在時返回 -1"""
+        index = bisect_left(self.departures, departure)
+        while index < len(self.departures) and self.departures[index] == departure:
+            if self.numbers[index] == number:
+                return index
+            index += 1
+        return -1
+
+    def insert(self, values: Tuple[int, ...]) -> None:
+        """依起飛時間插入一筆航班，values 順序同欄位順序"""
+        index = bisect_right(self.departures, values[0])
+        for column, value in zip(self._columns(), values):
+            column.insert(index, value)
+
+    def remove(self, index: int) -> None:
+        for column in self._columns():
+            del column[index]
+
+    def window(self, start: int, end: int) -> range:
+        """起飛時間在 [start, end) 之間的索引範圍"""
+        return range(bisect_left(self.departures, start), bisect_left(self.departures, end))
+
+
+class FlightReadModel:
+    """
+    記憶體航班讀取模型
+    航班編號、狀態與機型以索引保存，重複的字串只存一份
+    """
+
+    def __init__(
+        self,
+        load_flights: Callable[[datetime.datetime, datetime.datetime, datetime.datetime], List[Dict[str, Any]]],
+        days: int = READ_MODEL_DAYS,
+        interval: float = READ_MODEL_REFRESH_SECONDS,
+        max_staleness: Optional[float] = None
+    ):
+        """
+        初始化讀取模型
+
+        參數:
+            load_flights: 取得起飛時間在 [開始, 結束) 之間且 updated_at 不早於指定時間之航班的函數，
+                          每筆需包含 flight_number、airline_id、airline_name、departure_airport_code、
+                          arrival_airport_code、scheduled_departure、scheduled_arrival、flight_status、
+                          aircraft_type、price、updated_at
+            days: 保存的天數 (含今天)
+            interval: 刷新間隔(秒)
+            max_staleness: 超過此秒數未成功刷新時不再提供查詢，預設為刷新間隔的3倍
+        """
+        self.load_flights = load_flights
+        self.days = days
+        self.interval = interval
+        self.max_staleness = max_staleness if max_staleness is not None else interval * 3
+
+        self._groups: Dict[GroupKey, RouteDayFlights] = {}
+        # (航班編號索引, 起飛時間) -> 所在分組，更新時用於移除舊資料
+        self._locations: Dict[Tuple[int, int], GroupKey] = {}
+
+        self._numbers: List[str] = []
+        self._number_ids: Dict[str, int] = {}
+        # 依航班編號索引保存 (航空公司ID, 航空公司名稱)
+        self._number_airlines: List[Tuple[str, str]] = []
+        self._statuses: List[Optional[str]] = []
+        self._status_ids: Dict[Optional[str], int] = {}
+        self._aircraft: List[Optional[str]] = []
+        self._aircraft_ids: Dict[Optional[str], int] = {}
+
+        self.window_start: Optional[datetime.date] = None
+        self.window_end: Optional[datetime.date] = None
+        self.watermark = INITIAL_WATERMARK
+        self.refreshed_at: Optional[float] = None
+        self._loaded = threading.Event()
+
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    @staticmethod
+    def _intern(values: List[Any], ids: Dict[Any, int], value: Any) -> int:
+        index = ids.get(value)
+        if index is None:
+            index = len(values)
+            values.append(value)
+            ids[value] = index
+        return index
+
+    def _apply(self, flight: Dict[str, Any]) -> None:
+        """加入或更新一筆航班"""
+        scheduled_departure = flight['scheduled_departure']
+        if not (self.window_start <= scheduled_departure.date() < self.window_end):
+            return
+
+        flight_number = flight['flight_number']
+        number = self._number_ids.get(flight_number)
+        if number is None:
+            number = self._intern(self._numbers, self._number_ids, flight_number)
+            self._number_airlines.append((flight['airline_id'], flight['airline_name']))
+        else:
+            self._number_airlines[number] = (flight['airline_id'], flight['airline_name'])
+
+        departure = _to_seconds(scheduled_departure)
+        location = (number, departure)
+
+        # 先移除舊資料 (航線可能已變更)
+        old_key = self._locations.get(location)
+        if old_key is not None:
+            group = self._groups[old_key]
+            index = group.find(departure, number)
+            if index >= 0:
+                group.remove(index)
+            if not group:
+                del self._groups[old_key]
+
+        key = (
+            _code(flight['departure_airport_code']),
+            _code(flight['arrival_airport_code']),
+            scheduled_departure.strftime('%Y-%m-%d')
+        )
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = RouteDayFlights()
+        group.insert((
+            departure,
+            _to_seconds(flight['scheduled_arrival']),
+            number,
+            self._intern(self._statuses, self._status_ids, flight['flight_status']),
+            self._intern(self._aircraft, self._aircraft_ids, flight['aircraft_type']),
+            _to_cents(flight['price'])
+        ))
+        self._locations[location] = key
+
+    def _evict_before(self, start: datetime.date) -> None:
+        """移除已不在保存範圍內的日期"""
+        cutoff = start.strftime('%Y-%m-%d')
+        for key in [key for key in self._groups if key[2] < cutoff]:
+            del self._groups[key]
+        for location in [location for location, key in self._locations.items() if key[2] < cutoff]:
+            del self._locations[location]
+
+    def _load(self, start: datetime.date, end: datetime.date, since: datetime.datetime) -> int:
+        flights = self.load_flights(
+            datetime.datetime.combine(start, datetime.time.min),
+            datetime.datetime.combine(end, datetime.time.min),
+            since
+        )
+        with self._lock:
+            for flight in flights:
+                self._apply(flight)
+                if flight.get('updated_at') and flight['updated_at'] > self.watermark:
+                    self.watermark = flight['updated_at']
+        return len(flights)
+
+    def refresh(self) -> int:
+        """
+        刷新一次：日期變更時移除過期的日期並完整載入新進入範圍的日期，再依 updated_at 增量取得變更
+
+        返回:
+            取得的航班數量
+        """
+        started_at = time.time()
+        start = datetime.date.today()
+        end = start + datetime.timedelta(days=self.days)
+        count = 0
+
+        if self.window_start != start:
+            # 第一次載入或日期變更
+            load_from = start if self.window_end is None else max(start, self.window_end)
+            with self._lock:
+                self._evict_before(start)
+                self.window_start, previous_end, self.window_end = start, self.window_end, end
+            if load_from < end:
+                try:
+                    count += self._load(load_from, end, INITIAL_WATERMARK)
+                except Exception:
+                    # 載入失敗時還原範圍，下次刷新重新載入新進入範圍的日期
+                    with self._lock:
+                        self.window_start, self.window_end = None, previous_end
+                    raise
+                if previous_end is None:
+                    self.refreshed_at = started_at
+                    self._loaded.set()
+                    logger.info(f"航班讀取模型已載入: {count} 筆航班，{len(self._groups)} 個航線日")
+                    return count
+
+        count += self._load(start, end, self.watermark)
+        self.refreshed_at = started_at
+        self._loaded.set()
+        return count
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待第一次載入完成 (需先呼叫 start)
+
+        參數:
+            timeout: 最長等待秒數
+
+        返回:
+            是否已載入
+        """
+        return self._loaded.wait(timeout)
+
+    def covers(self, flight_date: datetime.date) -> bool:
+        """指定日期是否在保存範圍內且資料未過期"""
+        if self.refreshed_at is None or time.time() - self.refreshed_at > self.max_staleness:
+            return False
+        return self.window_start is not None and self.window_start <= flight_date < self.window_end
+
+    def query(
+        self,
+        departure: str,
+        arrival: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        airline: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        查詢起飛時間在 [start, end) 之間的航班
+
+        參數:
+            departure: 出發機場代碼 (不分大小寫)
+            arrival: 到達機場代碼 (不分大小寫)
+            start: 起飛時間下限
+            end: 起飛時間上限 (不含)
+            airline: (可選) 航空公司ID
+
+        返回:
+            依起飛時間排序的航班列表
+        """
+        departure, arrival = _code(departure), _code(arrival)
+        airline = _code(airline) or None
+        start_seconds, end_seconds = _to_seconds(start), _to_seconds(end)
+        flights = []
+        with self._lock:
+            day = start.date()
+            while datetime.datetime.combine(day, datetime.time.min) < end:
+                group = self._groups.get((departure, arrival, day.strftime('%Y-%m-%d')))
+                day += datetime.timedelta(days=1)
+                if group is None:
+                    continue
+                for index in group.window(start_seconds, end_seconds):
+                    airline_id, airline_name = self._number_airlines[group.numbers[index]]
+                    if airline and _code(airline_id) != airline:
+                        continue
+                    flights.append({
+                        'flight_number': self._numbers[group.numbers[index]],
+                        'airline_id': airline_id,
+                        'airline_name': airline_name,
+                        'departure_airport_code': departure,
+                        'arrival_airport_code': arrival,
+                        'scheduled_departure': _from_seconds(group.departures[index]),
+                        'scheduled_arrival': _from_seconds(group.arrivals[index]),
+                        'flight_status': self._statuses[group.statuses[index]],
+                        'aircraft_type': self._aircraft[group.aircraft[index]],
+                        'price': _from_cents(group.prices[index])
+                    })
+        return flights
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得讀取模型統計資訊"""
+        with self._lock:
+            return {
+                'route_days': len(self._groups),
+                'flights': len(self._locations),
+                'window_start': self.window_start.isoformat() if self.window_start else None,
+                'window_end': self.window_end.isoformat() if self.window_end else None,
+                'watermark': self.watermark.isoformat(),
+                'age_seconds': round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None
+            }
+
+    def start(self) -> None:
+        """在背景執行緒中開始定期刷新 (重複呼叫不會建立多個執行緒)"""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='flight-read-model', daemon=True)
+            self._thread.start()
+            logger.info(f"航班讀取模型刷新已啟動，保存 {self.days} 天，間隔 {self.interval} 秒")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"刷新航班讀取模型時出錯: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,212 @@
+"""
+航班狀態快取
+保存最近查詢或更新的航班狀態 (flight_status、actual_departure、actual_arrival)，
+讓出發看板的批次輪詢不必每次都查詢資料庫；即時更新器等其他行程寫入航班後，
+API 由航班變更紀錄 (cache_invalidation) 得知受影響的日期並清除該日期的項目
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('flight_status_cache')
+
+# 快取鍵: (航班編號, 日期 YYYY-MM-DD)
+StatusKey = Tuple[str, str]
+
+# 狀態欄位，用於判斷航班狀態是否有變化
+STATUS_FIELDS = ('flight_status', 'actual_departure', 'actual_arrival')
+
+
+def make_status_key(flight_number: str, flight_date: Any) -> StatusKey:
+    """建立快取鍵，日期可為字串、date或datetime"""
+    if isinstance(flight_date, (datetime.date, datetime.datetime)):
+        flight_date = flight_date.strftime('%Y-%m-%d')
+    return (str(flight_number).strip().upper(), str(flight_date)[:10])
+
+
+def _format_time(value: Any) -> Optional[str]:
+    """將時間轉為ISO格式字串"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def make_status_entry(
+    flight_number: str,
+    flight_date: Any,
+    flight_status: Optional[str] = None,
+    actual_departure: Any = None,
+    actual_arrival: Any = None,
+    scheduled_departure: Any = None,
+    found: bool = True
+) -> Dict[str, Any]:
+    """
+    建立航班狀態資料
+
+    參數:
+        flight_number: 航班編號
+        flight_date: 航班日期
+        flight_status: 航班狀態
+        actual_departure: 實際起飛時間
+        actual_arrival: 實際抵達時間
+        scheduled_departure: 預定起飛時間
+        found: 資料庫中是否有此航班
+
+    返回:
+        可直接序列化為JSON的狀態字典
+    """
+    flight_number, date_str = make_status_key(flight_number, flight_date)
+    return {
+        'flight_number': flight_number,
+        'date': date_str,
+        'flight_status': flight_status,
+        'actual_departure': _format_time(actual_departure),
+        'actual_arrival': _format_time(actual_arrival),
+        'scheduled_departure': _format_time(scheduled_departure),
+        'found': found
+    }
+
+
+class FlightStatusCache:
+    """
+    小型航班狀態LRU快取
+    只保存熱門航班 (如出發看板輪詢的航班)，超過容量時淘汰最久未使用的項目
+    """
+
+    def __init__(self, max_entries: int = 500, ttl: float = 60.0):
+        """
+        初始化快取
+
+        參數:
+            max_entries: 最大快取筆數
+            ttl: 快取有效時間(秒)，過期後重新查詢資料庫
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[StatusKey, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[StatusKey]) -> Tuple[Dict[StatusKey, Dict[str, Any]], List[StatusKey]]:
+        """
+        批次取得航班狀態
+
+        參數:
+            keys: 快取鍵列表
+
+        返回:
+            (命中的狀態字典, 未命中的快取鍵列表)
+        """
+        now = time.monotonic()
+        found = {}
+        missing = []
+
+        with self._lock:
+            for key in keys:
+                cached = self._entries.get(key)
+                if cached and cached[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = cached[1]
+                else:
+                    if cached:
+                        del self._entries[key]
+                    missing.append(key)
+
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        return found, missing
+
+    def put_many(self, entries: Iterable[Dict[str, Any]], ttl: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        批次寫入航班狀態
+
+        參數:
+            entries: make_status_entry 建立的狀態列表
+            ttl: 有效時間(秒)，不提供時使用預設值
+
+        返回:
+            與快取中舊值相比狀態有變化的項目列表
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        changed = []
+
+        with self._lock:
+            for entry in entries:
+                key = make_status_key(entry['flight_number'], entry['date'])
+                previous = self._entries.get(key)
+                if previous is None or any(
+                    previous[1].get(field) != entry.get(field) for field in STATUS_FIELDS
+                ):
+                    changed.append(entry)
+
+                self._entries[key] = (expires_at, entry)
+                self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return changed
+
+    def invalidate(self, keys: Optional[Iterable[StatusKey]] = None) -> None:
+        """清除指定航班的快取，不提供時清除全部"""
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate_dates(self, dates: Iterable[str]) -> int:
+        """
+        清除指定日期 (YYYY-MM-DD) 的所有航班
+
+        返回:
+            清除的筆數
+        """
+        dates = set(dates)
+        with self._lock:
+            stale = [key for key in self._entries if key[1] in dates]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取統計資訊"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# 單例實現
+_status_cache_instance = None
+
+
+def get_status_cache() -> FlightStatusCache:
+    """
+    獲取航班狀態快取的單例實例
+
+    返回:
+        航班狀態快取實例
+    """
+    global _status_cache_instance
+    if _status_cache_instance is None:
+        _status_cache_instance = FlightStatusCache(
+            max_entries=int(os.getenv('FLIGHT_STATUS_CACHE_SIZE', '500')),
+            ttl=float(os.getenv('FLIGHT_STATUS_CACHE_TTL', '60'))
+        )
+    return _status_cache_instance
@@ -0,0 +1,172 @@
+"""
+共用 HTTP 用戶端
+以 requests.Session 為基礎，加上連接池、預設逾時、指數退避 (含隨機抖動) 重試、Retry-After 支援，
+並限制同一主機同時進行的請求數；AviationStack 與德安航空、機場網站的爬蟲都使用此用戶端
+"""
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('http_client')
+
+# 連接與讀取逾時(秒)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+# 同一主機同時進行的請求數上限 (所有用戶端共用)
+HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', '4'))
+
+# 會重試的狀態碼與方法 (POST 不重試，避免重複送出)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_host_limits: Dict[str, threading.BoundedSemaphore] = {}
+_host_limits_lock = threading.Lock()
+
+
+def _host_limit(url: str) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc.lower()
+    with _host_limits_lock:
+        semaphore = _host_limits.get(host)
+        if semaphore is None:
+            semaphore = _host_limits[host] = threading.BoundedSemaphore(HTTP_MAX_PER_HOST)
+        return semaphore
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 標頭
+
+    參數:
+        value: 標頭內容 (秒數或 HTTP 日期)
+
+    返回:
+        需要等待的秒數，無法解析時返回None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpSession(requests.Session):
+    """
+    帶重試與逾時的 Session，用法與 requests.Session 相同；
+    單次請求可用 retries、backoff 參數覆寫重試次數與初始退避秒數，
+    before_retry 在每次重試送出前呼叫 (如扣除API配額)，返回 False 時不再重試
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        max_retry_after: float = 120.0,
+        timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        rate_limiter: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        """
+        初始化 Session
+
+        參數:
+            max_retries: 連線錯誤、逾時或可重試狀態碼的最大重試次數
+            backoff: 初始退避秒數，每次重試加倍，實際等待時間在0到該值之間隨機
+            max_backoff: 退避秒數上限
+            max_retry_after: 可接受的 Retry-After 秒數上限，超過時不重試直接返回回應
+            timeout: 預設的 (連接逾時, 讀取逾時)
+            rate_limiter: 每次送出請求前呼叫其 acquire() 的速率限制器 (如 TokenBucket)
+            headers: 預設請求頭
+        """
+        super().__init__()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        if headers:
+            self.headers.update(headers)
+
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=HTTP_MAX_PER_HOST)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def _backoff_delay(self, attempt: int, backoff: float) -> float:
+        # 完全隨機抖動，避免多個工作同時重試
+        return random.uniform(0, min(self.max_backoff, backoff * (2 ** attempt)))
+
+    def request(self, method: str, url: str, *args, retries: Optional[int] = None,
+                backoff: Optional[float] = None, before_retry: Optional[Callable[[], bool]] = None,
+                **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.max_retries if retries is None else retries
+        backoff = self.backoff if backoff is None else backoff
+        if method.upper() not in RETRY_METHODS:
+            retries = 0
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            response = None
+            try:
+                with _host_limit(url):
+                    response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= retries:
+                    raise
+                error = e
+                delay = self._backoff_delay(attempt, backoff)
+                logger.warning(f"{method} {url} 失敗 ({e})，{delay:.1f} 秒後重試 ({attempt + 1}/{retries})")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    logger.warning(f"{method} {url} 要求等待 {retry_after:.0f} 秒，超過上限不重試")
+                    return response
+                delay = retry_after if retry_after is not None else self._backoff_delay(attempt, backoff)
+                logger.warning(f"{method} {url} 返回 {response.status_code}，{delay:.1f} 秒後重試 ({attempt + 1}/{retries})")
+            time.sleep(delay)
+            if before_retry is not None and not before_retry():
+                logger.warning(f"{method} {url} 不再重試 ({attempt + 1}/{retries})")
+                if response is None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            attempt += 1
+
+
+# 單例實現
+_session_instance: Optional[HttpSession] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> HttpSession:
+    """
+    獲取共用 Session 的單例實例 (不需要自訂請求頭或速率限制的呼叫端使用)
+
+    返回:
+        HttpSession 實例
+    """
+    global _session_instance
+    if _session_instance is None:
+        with _session_lock:
+            if _session_instance is None:
+                _session_instance = HttpSession()
+    return _session_instance
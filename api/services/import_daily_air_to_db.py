@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import logging
-import pyodbc
 import json
 from datetime import datetime
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import Session, connect, flight_change_key, record_flight_changes, track_queries
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -18,6 +25,16 @@ logger = logging.getLogger('ImportDailyAirToDB')
 # 加载环境变量
 load_dotenv()
 
+def parse_datetime(value):
+    """将JSON中的时间字符串转为datetime，无法解析时返回原值"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+@track_queries('import_daily_air_to_db')
 def import_flights_to_db(json_file):
     """将航班数据从JSON文件导入到数据库"""
     logger.info(f"开始从 {json_file} 导入航班数据到数据库...")
@@ -29,59 +46,44 @@ def import_flights_to_db(json_file):
         
         logger.info(f"从JSON文件读取了 {len(flights)} 个航班")
         
-        # 获取数据库连接字符串
-        connection_string = os.getenv('DB_CONNECTION_STRING')
-        if not connection_string:
-            logger.error("未设置数据库连接字符串")
-            return
+        # 连接到数据库 (连接字符串、超时与重试由共用的数据访问层处理)
+        conn = connect()
+        session = Session(conn)
         
-        # 连接到数据库
-        conn = pyodbc.connect(connection_string)
-        cursor = conn.cursor()
+        # 以一次查询取得TempFlights中已存在的航班，再分别批量插入与更新
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = {}
+        for flight in flights:
+            rows[(flight["flight_number"], parse_datetime(flight["scheduled_departure"]))] = flight
         
-        # 准备导入
-        inserted_count = 0
-        updated_count = 0
+        flight_numbers = sorted({flight_number for flight_number, _ in rows})
+        existing = {
+            (row.flight_number, row.scheduled_departure)
+            for row in session.fetch_all(
+                'temp_flights.existing_keys',
+                flight_numbers,
+                flight_numbers=len(flight_numbers)
+            )
+        } if flight_numbers else set()
         
-        # 先将航班信息插入到TempFlights表
-        for flight in flights:
-            # 检查是否已存在相同航班
-            check_query = """
-            SELECT COUNT(*) FROM TempFlights 
-            WHERE flight_number = ? AND scheduled_departure = ?
-            """
-            cursor.execute(check_query, 
-                        (flight["flight_number"], flight["scheduled_departure"]))
-            count = cursor.fetchone()[0]
-            
-            if count == 0:
-                # 插入新航班
-                insert_query = """
-                INSERT INTO TempFlights (
-                    flight_number, airline_id, departure_airport_code, 
-                    arrival_airport_code, scheduled_departure, scheduled_arrival, 
-                    aircraft_type, scrape_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                cursor.execute(insert_query, 
-                            (flight["flight_number"], flight["airline_id"],
-                            flight["departure_airport_code"], flight["arrival_airport_code"],
-                            flight["scheduled_departure"], flight["scheduled_arrival"],
-                            flight["aircraft_type"], flight.get("scrape_date", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))))
-                inserted_count += 1
-            else:
+        inserts = []
+        updates = []
+        for (flight_number, scheduled_departure), flight in rows.items():
+            scrape_date = flight.get("scrape_date", now_str)
+            if (flight_number, scheduled_departure) in existing:
                 # 更新已存在航班
-                update_query = """
-                UPDATE TempFlights SET
-                    scheduled_arrival = ?,
-                    scrape_date = ?
-                WHERE flight_number = ? AND scheduled_departure = ?
-                """
-                cursor.execute(update_query, 
-                            (flight["scheduled_arrival"], 
-                            flight.get("scrape_date", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                            flight["flight_number"], flight["scheduled_departure"]))
-                updated_count += 1
+                updates.append((flight["scheduled_arrival"], scrape_date, flight_number, scheduled_departure))
+            else:
+                # 插入新航班
+                inserts.append((
+                    flight_number, flight["airline_id"],
+                    flight["departure_airport_code"], flight["arrival_airport_code"],
+                    scheduled_departure, flight["scheduled_arrival"],
+                    flight["aircraft_type"], scrape_date
+                ))
+        
+        inserted_count = session.execute_many('temp_flights.insert', inserts)
+        updated_count = session.execute_many('temp_flights.update_schedule', updates)
         
         # 提交事务
         conn.commit()
@@ -93,67 +95,16 @@ def import_flights_to_db(json_file):
         # 获取当前时间作为更新时间标记
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # 合并数据到Flights表，如果存在则更新，不存在则插入
-        merge_query = """
-        MERGE INTO Flights AS target
-        USING (
-            SELECT 
-                flight_number, 
-                airline_id, 
-                departure_airport_code, 
-                arrival_airport_code, 
-                scheduled_departure, 
-                scheduled_arrival, 
-                aircraft_type,
-                scrape_date
-            FROM TempFlights
-            WHERE airline_id = 'DAC'  -- 仅处理德安航空的数据
-        ) AS source
-        ON (
-            target.flight_number = source.flight_number AND 
-            target.scheduled_departure = source.scheduled_departure
-        )
-        WHEN MATCHED THEN
-            UPDATE SET 
-                target.scheduled_arrival = source.scheduled_arrival,
-                target.updated_at = ?
-        WHEN NOT MATCHED THEN
-            INSERT (
-                flight_number, 
-                airline_id, 
-                departure_airport_code, 
-                arrival_airport_code, 
-                scheduled_departure, 
-                scheduled_arrival, 
-                aircraft_type,
-                flight_status,
-                created_at,
-                updated_at,
-                scrape_date
-            )
-            VALUES (
-                source.flight_number, 
-                source.airline_id, 
-                source.departure_airport_code, 
-                source.arrival_airport_code, 
-                source.scheduled_departure, 
-                source.scheduled_arrival, 
-                source.aircraft_type,
-                'Scheduled',
-                ?,
-                ?,
-                source.scrape_date
-            );
-        """
-        
+        # 合并数据到Flights表，如果存在则更新，不存在则插入 (仅处理德安航空的数据)
         try:
-            cursor.execute(merge_query, (now, now, now))
+            affected_rows = session.execute('temp_flights.merge_into_flights', ('DAC', now, now, now)).rowcount
+            # 记录本次文件涉及的航线与日期，API 据此清除对应的缓存
+            record_flight_changes(session, [
+                flight_change_key(flight["departure_airport_code"], flight["arrival_airport_code"], scheduled_departure)
+                for (_, scheduled_departure), flight in rows.items()
+            ])
             conn.commit()
             
-            # 获取操作影响的行数
-            cursor.execute("SELECT @@ROWCOUNT")
-            affected_rows = cursor.fetchone()[0]
-            
             logger.info(f"Flights表合并完成: 共影响 {affected_rows} 条记录")
         except Exception as e:
             logger.error(f"合并到Flights表时出错: {str(e)}")
@@ -165,7 +116,7 @@ def import_flights_to_db(json_file):
         # logger.info("临时表清理完成")
         
         # 关闭连接
-        cursor.close()
+        session.close()
         conn.close()
         
         logger.info("数据导入完成")
@@ -42,6 +42,9 @@ class AviationStackProvider(FlightProvider):
                 use_cache: 是否使用緩存
                 use_mock_data: 是否在無法從API獲取資料時使用模擬資料
                 priority_routes: 優先查詢的航線列表
+                max_workers: 並行查詢的工作執行緒數
+                job: 工作名稱 (配額帳本)，預設為 'provider'
+                limit: 最多取得的航班數，達到後不再請求後續頁面
             
         返回:
             航班資料列表
@@ -55,6 +58,9 @@ class AviationStackProvider(FlightProvider):
         use_cache = kwargs.get('use_cache', True)
         use_mock_data = kwargs.get('use_mock_data', False)
         priority_routes = kwargs.get('priority_routes')
+        max_workers = kwargs.get('max_workers')
+        job = kwargs.get('job', 'provider')
+        limit = kwargs.get('limit')
         
         # 調用API獲取航班
         flights = get_flights_for_configured_airlines_airports(
@@ -64,7 +70,10 @@ class AviationStackProvider(FlightProvider):
             max_api_calls=max_api_calls,
             use_cache=use_cache,
             use_mock_data=use_mock_data,
-            priority_routes=priority_routes
+            priority_routes=priority_routes,
+            max_workers=max_workers,
+            job=job,
+            limit=limit
         )
         
         self.logger.info(f"從AviationStack獲取到 {len(flights)} 個航班")
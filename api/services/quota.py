@@ -0,0 +1,249 @@
+"""
+AviationStack 每月配額帳本與預算分配
+每次即時請求都記錄在 SQLite 帳本中 (端點、參數雜湊、工作名稱、時間)，多個排程同時執行時共用同一份紀錄；
+分配器依本期剩餘配額計算每日預算與各工作的每日預算，超出時拒絕請求，由呼叫端改用緩存或延後到隔天
+"""
+import datetime
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger('quota')
+
+LEDGER_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS api_calls (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        called_at REAL NOT NULL,
+        endpoint TEXT NOT NULL,
+        params_hash TEXT NOT NULL,
+        job TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_api_calls_called_at ON api_calls (called_at)"
+]
+
+
+class QuotaLedger:
+    """
+    API調用帳本
+    每個執行緒使用自己的連線，寫入使用 BEGIN IMMEDIATE，檢查與記錄在同一交易中完成
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化帳本
+
+        參數:
+            path: SQLite 檔案路徑
+        """
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.transaction() as conn:
+            for statement in LEDGER_SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        """取得目前執行緒的 SQLite 連接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """取得寫入鎖的交易，其他行程需等待交易結束"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def count(self, since: float, until: Optional[float] = None, job: Optional[str] = None,
+              conn: Optional[sqlite3.Connection] = None) -> int:
+        """
+        計算期間內的調用次數
+
+        參數:
+            since: 開始時間 (Unix 時間)
+            until: 結束時間，None 表示到現在
+            job: 只計算指定工作
+            conn: 使用的連接 (在交易中呼叫時傳入)
+        """
+        sql = 'SELECT COUNT(*) FROM api_calls WHERE called_at >= ?'
+        params: list = [since]
+        if until is not None:
+            sql += ' AND called_at < ?'
+            params.append(until)
+        if job is not None:
+            sql += ' AND job = ?'
+            params.append(job)
+        return (conn or self._connection()).execute(sql, params).fetchone()[0]
+
+    def record(self, endpoint: str, params_hash: str, job: str,
+               conn: Optional[sqlite3.Connection] = None, called_at: Optional[float] = None) -> None:
+        """記錄一次調用"""
+        (conn or self._connection()).execute(
+            'INSERT INTO api_calls (called_at, endpoint, params_hash, job) VALUES (?, ?, ?, ?)',
+            (called_at or time.time(), endpoint, params_hash, job)
+        )
+
+    def jobs(self, since: float) -> Dict[str, int]:
+        """各工作在期間內的調用次數"""
+        rows = self._connection().execute(
+            'SELECT job, COUNT(*) FROM api_calls WHERE called_at >= ? GROUP BY job', (since,)
+        ).fetchall()
+        return {job: count for job, count in rows}
+
+
+def _timestamp(day: datetime.date) -> float:
+    return time.mktime(day.timetuple())
+
+
+class QuotaAllocator:
+    """
+    依本期剩餘配額分配每日與各工作的預算
+    每日預算 = 今天開始前的剩餘配額 / 本期剩餘天數 (含今天，無條件進位)，未使用的預算會分攤到之後的日子
+    """
+
+    def __init__(
+        self,
+        ledger: QuotaLedger,
+        monthly_limit: int = 500,
+        reset_day: int = 1,
+        job_budgets: Optional[Dict[str, int]] = None
+    ):
+        """
+        初始化預算分配器
+
+        參數:
+            ledger: 調用帳本
+            monthly_limit: 每期配額
+            reset_day: 配額重置日 (每月幾號)
+            job_budgets: {工作名稱: 每日最多調用次數}，未列出的工作只受每日預算限制
+        """
+        self.ledger = ledger
+        self.monthly_limit = monthly_limit
+        self.reset_day = reset_day
+        self.job_budgets = dict(job_budgets or {})
+        self.refused = 0
+
+    def period(self, today: Optional[datetime.date] = None) -> Tuple[datetime.date, datetime.date]:
+        """
+        取得目前配額期間
+
+        返回:
+            (開始日期, 下一期開始日期)
+        """
+        today = today or datetime.date.today()
+
+        def reset_in(year: int, month: int) -> datetime.date:
+            # 重置日超過該月天數時使用月底
+            for day in range(self.reset_day, 0, -1):
+                try:
+                    return datetime.date(year, month, day)
+                except ValueError:
+                    continue
+            return datetime.date(year, month, 1)
+
+        start = reset_in(today.year, today.month)
+        if today < start:
+            start = reset_in(today.year - (today.month == 1), 12 if today.month == 1 else today.month - 1)
+        next_month = start.month % 12 + 1
+        end = reset_in(start.year + (start.month == 12), next_month)
+        return start, end
+
+    def _budgets(self, conn: Optional[sqlite3.Connection], job: str, today: datetime.date) -> Dict[str, int]:
+        start, end = self.period(today)
+        today_start = _timestamp(today)
+        used_before_today = self.ledger.count(_timestamp(start), today_start, conn=conn)
+        remaining_at_start = max(0, self.monthly_limit - used_before_today)
+        days_left = max(1, (end - today).days)
+        daily_budget = math.ceil(remaining_at_start / days_left)
+        return {
+            'used_before_today': used_before_today,
+            'daily_budget': daily_budget,
+            'used_today': self.ledger.count(today_start, conn=conn),
+            'job_used_today': self.ledger.count(today_start, job=job, conn=conn)
+        }
+
+    def try_acquire(self, endpoint: str, params_hash: str, job: str = 'default') -> Tuple[bool, Optional[str]]:
+        """
+        檢查預算並記錄一次調用 (檢查與記錄在同一交易中，多個行程不會同時超出預算)
+
+        參數:
+            endpoint: API端點
+            params_hash: 參數雜湊 (不含API金鑰)
+            job: 工作名稱
+
+        返回:
+            (是否允許, 拒絕原因)
+        """
+        today = datetime.date.today()
+        with self.ledger.transaction() as conn:
+            budgets = self._budgets(conn, job, today)
+            reason = None
+            if budgets['used_before_today'] + budgets['used_today'] >= self.monthly_limit:
+                reason = '本期配額已用盡'
+            elif budgets['used_today'] >= budgets['daily_budget']:
+                reason = f"今日預算 {budgets['daily_budget']} 次已用完"
+            elif job in self.job_budgets and budgets['job_used_today'] >= self.job_budgets[job]:
+                reason = f"工作 {job} 今日預算 {self.job_budgets[job]} 次已用完"
+            if reason is None:
+                self.ledger.record(endpoint, params_hash, job, conn=conn)
+                return True, None
+        self.refused += 1
+        logger.warning(f"拒絕 AviationStack 調用 {endpoint} ({job}): {reason}")
+        return False, reason
+
+    def get_status(self, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """
+        取得配額狀態，包含最近7天的平均每日用量與依此推算的配額用盡日期
+        """
+        today = today or datetime.date.today()
+        start, end = self.period(today)
+        budgets = self._budgets(None, 'default', today)
+        used = budgets['used_before_today'] + budgets['used_today']
+        remaining = max(0, self.monthly_limit - used)
+
+        # 最近7天 (含今天已過的部分) 的平均每日用量
+        window_start = max(start, today - datetime.timedelta(days=6))
+        window_days = (today - window_start).days + (time.time() - _timestamp(today)) / 86400
+        window_calls = self.ledger.count(_timestamp(window_start))
+        burn_rate = window_calls / max(1.0, window_days)
+
+        exhaustion = None
+        if burn_rate > 0:
+            exhaustion_date = today + datetime.timedelta(days=remaining / burn_rate)
+            if exhaustion_date < end:
+                exhaustion = exhaustion_date.isoformat()
+
+        return {
+            'period_start': start.isoformat(),
+            'period_end': end.isoformat(),
+            'monthly_limit': self.monthly_limit,
+            'used': used,
+            'remaining': remaining,
+            'daily_budget': budgets['daily_budget'],
+            'used_today': budgets['used_today'],
+            'jobs_today': self.ledger.jobs(_timestamp(today)),
+            'job_budgets': self.job_budgets,
+            'refused': self.refused,
+            'burn_rate_per_day': round(burn_rate, 2),
+            # 依目前用量推算在本期結束前用盡的日期，不會用盡時為None
+            'projected_exhaustion': exhaustion
+        }
@@ -0,0 +1,77 @@
+"""
+令牌桶速率限制
+同一個行程內所有對外請求共用同一個桶 (包含並行查詢的工作執行緒與背景刷新)，
+短時間內最多送出 capacity 個請求，之後以 rate 的速度補充
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('rate_limiter')
+
+
+class TokenBucket:
+    """執行緒安全的令牌桶"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        初始化令牌桶
+
+        參數:
+            rate: 每秒補充的令牌數
+            capacity: 桶的容量 (允許的突發請求數)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        取得令牌，不足時等待
+
+        參數:
+            tokens: 需要的令牌數
+            timeout: 最長等待秒數，None 表示一直等待
+
+        返回:
+            是否取得令牌
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    if waited:
+                        self.waits += 1
+                        self.waited_seconds += now - started
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+            waited = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得速率限制統計資訊"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'available': round(self._tokens, 2),
+                'waits': self.waits,
+                'waited_seconds': round(self.waited_seconds, 3)
+            }
@@ -0,0 +1,126 @@
+"""
+背景重新驗證
+快取過期但仍在可接受的陳舊時間內時，呼叫端先取得舊資料，由背景執行緒重新請求；
+相同的鍵同時只會排入一次，並受每日請求預算限制，避免背景刷新耗盡API配額
+"""
+import datetime
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger('revalidation')
+
+
+class BackgroundRefresher:
+    """
+    以單一背景執行緒依序執行刷新工作
+    """
+
+    def __init__(self, daily_budget: Optional[int] = None):
+        """
+        初始化背景刷新器
+
+        參數:
+            daily_budget: 每天最多執行的刷新次數，None 表示不限制
+        """
+        self.daily_budget = daily_budget
+        self.submitted = 0
+        self.deduplicated = 0
+        self.over_budget = 0
+        self.refreshed = 0
+        self.errors = 0
+
+        self._queue: 'queue.Queue[tuple]' = queue.Queue()
+        self._pending: Set[str] = set()
+        self._spent = 0
+        self._spent_date = datetime.date.today()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def _reserve(self) -> bool:
+        """在 self._lock 內呼叫：預算足夠時扣除一次並返回 True"""
+        today = datetime.date.today()
+        if today != self._spent_date:
+            self._spent_date = today
+            self._spent = 0
+        if time.time() < self._paused_until:
+            return False
+        if self.daily_budget is not None and self._spent >= self.daily_budget:
+            return False
+        self._spent += 1
+        return True
+
+    def submit(self, key: str, task: Callable[[], Any]) -> bool:
+        """
+        排入刷新工作
+
+        參數:
+            key: 工作鍵，相同鍵的工作尚未完成前不會重複排入
+            task: 執行刷新的函數
+
+        返回:
+            是否已排入 (或已在佇列中)；超出預算時返回 False，呼叫端應自行決定是否等待即時請求
+        """
+        with self._lock:
+            if key in self._pending:
+                self.deduplicated += 1
+                return True
+            if not self._reserve():
+                self.over_budget += 1
+                return False
+            self._pending.add(key)
+            self.submitted += 1
+        self.start()
+        self._queue.put((key, task))
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """
+        暫停排入新的刷新工作 (如API配額已用盡時)
+
+        參數:
+            seconds: 暫停秒數
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+        logger.warning(f"背景刷新暫停 {seconds:.0f} 秒")
+
+    def start(self) -> None:
+        """啟動背景執行緒 (重複呼叫不會建立多個執行緒)"""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='background-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            key, task = self._queue.get()
+            try:
+                task()
+                self.refreshed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"背景刷新 {key} 時出錯: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得背景刷新統計資訊"""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'over_budget': self.over_budget,
+                'refreshed': self.refreshed,
+                'errors': self.errors,
+                'spent_today': self._spent,
+                'daily_budget': self.daily_budget,
+                'paused': time.time() < self._paused_until
+            }
@@ -0,0 +1,129 @@
+"""
+記憶體航線表
+從 RouteSummary 載入航線並預先序列化為 JSON，/routes 直接回傳同一份內容與 ETag；
+只在航線摘要版本變更時重新載入；請求只觸發背景執行緒檢查，不等待資料庫
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('route_table')
+
+
+class RouteTable:
+    """航線表，保存序列化後的回應內容與對應的 ETag"""
+
+    def __init__(
+        self,
+        loader: Callable[[], List[Dict[str, Any]]],
+        signature: Optional[Callable[[], Any]] = None,
+        check_interval: float = 30.0
+    ):
+        """
+        初始化航線表
+
+        參數:
+            loader: 載入航線列表的函數
+            signature: 取得航線資料版本的函數 (如筆數與最後更新時間)，用於判斷是否需要重新載入
+            check_interval: 檢查資料是否變更的最短間隔(秒)
+        """
+        self.loader = loader
+        self.signature = signature
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        # (航線列表, JSON 內容, ETag)
+        self._state: Optional[Tuple[List[Dict[str, Any]], bytes, str]] = None
+        self._signature: Any = None
+        self._last_check = 0.0
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def build(self, routes: List[Dict[str, Any]]) -> None:
+        """
+        以航線列表更新內容
+
+        參數:
+            routes: 航線列表
+        """
+        body = json.dumps(routes, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.md5(body).hexdigest()
+        # 以整體替換的方式更新，讀取中的執行緒不會看到半成品
+        self._state = (list(routes), body, etag)
+        logger.info(f"航線表已載入: {len(routes)} 條航線")
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        若航線資料已變更則重新載入
+
+        參數:
+            force: 是否忽略檢查間隔強制重新載入
+
+        返回:
+            是否重新載入
+        """
+        now = time.monotonic()
+        loaded = self._state is not None
+        if not force and loaded and now - self._last_check < self.check_interval:
+            return False
+
+        # 同一時間只允許一個執行緒載入，其他執行緒繼續使用舊內容
+        if not self._lock.acquire(blocking=not loaded):
+            return False
+
+        try:
+            loaded = self._state is not None
+            if not force and loaded and now - self._last_check < self.check_interval:
+                return False
+            self._last_check = now
+
+            current_signature = None
+            if self.signature:
+                try:
+                    current_signature = self.signature()
+                except Exception as e:
+                    logger.error(f"取得航線資料版本時出錯: {e}")
+
+            if loaded and not force and current_signature is not None \
+                    and current_signature == self._signature:
+                return False
+
+            self.build(self.loader())
+            self._signature = current_signature
+            return True
+        except Exception as e:
+            logger.error(f"載入航線表時出錯: {e}")
+            return False
+        finally:
+            self._lock.release()
+
+    def refresh_in_background(self) -> None:
+        """
+        超過檢查間隔 (或尚未載入) 時交給背景執行緒檢查與重新載入，
+        呼叫端不等待資料庫，繼續使用目前的內容
+        """
+        if self._last_check and time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._thread_lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name='route-table-refresh', daemon=True)
+            self._refresh_thread.start()
+
+    def snapshot(self) -> Optional[Tuple[bytes, str]]:
+        """
+        取得目前的回應內容
+
+        返回:
+            (JSON 內容, ETag)，尚未成功載入時返回None
+        """
+        state = self._state
+        return (state[1], state[2]) if state else None
+
+    def routes(self) -> List[Dict[str, Any]]:
+        """取得航線列表"""
+        state = self._state
+        return state[0] if state else []
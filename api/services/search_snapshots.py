@@ -0,0 +1,254 @@
+"""
+熱門航線搜尋結果快照
+大部分流量集中在少數 (航線, 日期)；背景執行緒預先將這些查詢的回應序列化並壓縮，
+請求只需查表並複製位元組。航班寫入後依變更紀錄先移除受影響的快照再重新產生
+"""
+import datetime
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger('search_snapshots')
+
+# (端點名稱, 出發機場, 到達機場, 日期 YYYY-MM-DD)
+SnapshotKey = Tuple[str, str, str, str]
+
+
+class Snapshot(NamedTuple):
+    """預先產生的回應"""
+    version: int
+    etag: str
+    body: bytes
+    gzipped: bytes
+    rendered_at: float
+
+
+class SnapshotStore:
+    """行程內的快照表，以 (端點, 航線, 日期) 為鍵，內容變更時版本加一"""
+
+    def __init__(self):
+        self._snapshots: Dict[SnapshotKey, Snapshot] = {}
+        self._versions: Dict[SnapshotKey, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: SnapshotKey) -> Optional[Snapshot]:
+        return self._snapshots.get(key)
+
+    def put(self, key: SnapshotKey, body: bytes) -> Snapshot:
+        """
+        保存回應內容，與目前內容相同時不重新壓縮
+
+        參數:
+            key: 快照鍵
+            body: 序列化後的回應內容
+
+        返回:
+            快照
+        """
+        etag = hashlib.md5(body).hexdigest()
+        with self._lock:
+            current = self._snapshots.get(key)
+            if current is not None and current.etag == etag:
+                snapshot = current._replace(rendered_at=time.time())
+            else:
+                version = self._versions.get(key, 0) + 1
+                self._versions[key] = version
+                snapshot = Snapshot(version, etag, body, gzip.compress(body, compresslevel=6), time.time())
+            self._snapshots[key] = snapshot
+        return snapshot
+
+    def discard(self, keys: Iterable[SnapshotKey]) -> int:
+        """移除快照，返回移除的數量"""
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._snapshots.pop(key, None) is not None:
+                    removed += 1
+        return removed
+
+    def retain(self, keys: Set[SnapshotKey]) -> int:
+        """只保留指定的快照，返回移除的數量"""
+        with self._lock:
+            stale = [key for key in self._snapshots if key not in keys]
+            for key in stale:
+                del self._snapshots[key]
+        return len(stale)
+
+    def keys(self) -> List[SnapshotKey]:
+        return list(self._snapshots)
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshots = list(self._snapshots.values())
+        return {
+            'snapshots': len(snapshots),
+            'bytes': sum(len(snapshot.body) for snapshot in snapshots),
+            'gzipped_bytes': sum(len(snapshot.gzipped) for snapshot in snapshots)
+        }
+
+
+class SnapshotMaterializer:
+    """
+    定期選出熱門航線並產生未來數天的快照；收到航班變更時只重新產生受影響的快照
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        load_top_routes: Callable[[List[datetime.date], int], List[Tuple[str, str]]],
+        dumps: Callable[[Any], str],
+        days: int = 14,
+        route_limit: int = 20,
+        interval: float = 600.0
+    ):
+        """
+        初始化快照產生器
+
+        參數:
+            store: 快照表
+            load_top_routes: 取得指定日期內航班最多之航線的函數 (日期列表, 航線數量)
+            dumps: 將回應物件序列化為 JSON 字串的函數 (應與端點回應使用相同的設定)
+            days: 產生快照的天數 (含今天)
+            route_limit: 熱門航線數量
+            interval: 重新選出熱門航線並產生所有快照的間隔(秒)
+        """
+        self.store = store
+        self.load_top_routes = load_top_routes
+        self.dumps = dumps
+        self.days = days
+        self.route_limit = route_limit
+        self.interval = interval
+        # {端點名稱: 產生回應物件的函數 (出發機場, 到達機場, 日期)，返回None表示不產生快照}
+        self.renderers: Dict[str, Callable[[str, str, str], Any]] = {}
+        self.routes: Set[Tuple[str, str]] = set()
+        self.dates: List[str] = []
+        self.rendered = 0
+        self.errors = 0
+        self.last_full_run: Optional[float] = None
+
+        self._pending: Set[Tuple[str, str, str]] = set()
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def add_renderer(self, endpoint: str, render: Callable[[str, str, str], Any]) -> None:
+        """
+        註冊端點的回應產生函數
+
+        參數:
+            endpoint: 端點名稱
+            render: 接收 (出發機場, 到達機場, 日期) 並返回回應物件的函數
+        """
+        self.renderers[endpoint] = render
+
+    def lookup(self, endpoint: str, departure: str, arrival: str, date_str: str) -> Optional[Snapshot]:
+        """取得快照，不存在時返回None"""
+        return self.store.get((endpoint, departure, arrival, date_str))
+
+    def _render(self, route_dates: Iterable[Tuple[str, str, str]]) -> int:
+        count = 0
+        for departure, arrival, date_str in route_dates:
+            for endpoint, render in self.renderers.items():
+                key = (endpoint, departure, arrival, date_str)
+                try:
+                    response = render(departure, arrival, date_str)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"產生快照 {key} 時出錯: {e}")
+                    continue
+                if response is None:
+                    self.store.discard([key])
+                    continue
+                self.store.put(key, self.dumps(response).encode('utf-8'))
+                count += 1
+        self.rendered += count
+        return count
+
+    def materialize_all(self) -> int:
+        """
+        重新選出熱門航線並產生所有快照，移除已不在範圍內的快照
+
+        返回:
+            產生的快照數量
+        """
+        today = datetime.date.today()
+        dates = [today + datetime.timedelta(days=offset) for offset in range(self.days)]
+        routes = self.load_top_routes(dates, self.route_limit)
+        self.routes = set(routes)
+        self.dates = [day.strftime('%Y-%m-%d') for day in dates]
+
+        route_dates = [(departure, arrival, date_str) for departure, arrival in routes for date_str in self.dates]
+        self.store.retain({
+            (endpoint, departure, arrival, date_str)
+            for departure, arrival, date_str in route_dates
+            for endpoint in self.renderers
+        })
+        count = self._render(route_dates)
+        self.last_full_run = time.monotonic()
+        logger.info(f"已產生 {count} 個搜尋結果快照 ({len(routes)} 條熱門航線，{self.days} 天)")
+        return count
+
+    def notify(self, changes: Set[Tuple[str, str, str]]) -> None:
+        """
+        航班變更時呼叫：立即移除受影響的快照，由背景執行緒重新產生
+
+        參數:
+            changes: (出發機場, 到達機場, 日期) 集合
+        """
+        affected = {change for change in changes if (change[0], change[1]) in self.routes and change[2] in self.dates}
+        if not affected:
+            return
+        self.store.discard(
+            (endpoint, departure, arrival, date_str)
+            for departure, arrival, date_str in affected
+            for endpoint in self.renderers
+        )
+        with self._pending_lock:
+            self._pending.update(affected)
+        self._wake.set()
+
+    def start(self) -> None:
+        """在背景執行緒中開始產生快照 (重複呼叫不會建立多個執行緒)"""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='search-snapshots', daemon=True)
+            self._thread.start()
+            logger.info(f"搜尋結果快照已啟動: {self.route_limit} 條熱門航線，{self.days} 天，每 {self.interval} 秒完整更新")
+
+    def _run(self) -> None:
+        while True:
+            # 先清除喚醒旗標，處理期間收到的變更會讓下一次等待立即返回
+            self._wake.clear()
+            try:
+                full_run_due = self.last_full_run is None or time.monotonic() - self.last_full_run >= self.interval
+                if full_run_due or (self.dates and self.dates[0] != datetime.date.today().strftime('%Y-%m-%d')):
+                    with self._pending_lock:
+                        self._pending.clear()
+                    self.materialize_all()
+                else:
+                    with self._pending_lock:
+                        pending, self._pending = self._pending, set()
+                    if pending:
+                        self._render(sorted(pending))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"產生搜尋結果快照時出錯: {e}")
+                # 一分鐘後再重試完整更新，避免資料庫無法連線時持續重試
+                self.last_full_run = time.monotonic() - self.interval + min(self.interval, 60.0)
+            self._wake.wait(min(self.interval, 60.0))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快照統計資訊"""
+        stats = self.store.get_stats()
+        stats.update({
+            'routes': len(self.routes),
+            'days': self.days,
+            'rendered': self.rendered,
+            'errors': self.errors,
+            'last_full_run_seconds_ago': round(time.monotonic() - self.last_full_run, 1) if self.last_full_run else None
+        })
+        return stats
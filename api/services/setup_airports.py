@@ -1,8 +1,15 @@
 import os
-import pyodbc
+import sys
 import logging
 from dotenv import load_dotenv
 
+# 添加專案根目錄到路徑以便導入模組
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from api.database import Session, connect
+
 # 加载环境变量
 load_dotenv()
 
@@ -44,17 +51,12 @@ airlines = [
 
 def check_airports():
     """检查德安航空使用的机场代码是否都存在于数据库中"""
-    connection_string = os.getenv('DB_CONNECTION_STRING')
-    
-    if not connection_string:
-        logger.error("缺少数据库连接字符串环境变量 DB_CONNECTION_STRING")
-        return False
-    
     try:
         # 连接数据库
         logger.info("正在连接数据库...")
-        conn = pyodbc.connect(connection_string, timeout=30)
-        cursor = conn.cursor()
+        conn = connect()
+        session = Session(conn)
+        cursor = session.cursor
         logger.info("数据库连接成功！")
         
         # 获取德安航空运营的机场代码
@@ -65,7 +67,7 @@ def check_airports():
         logger.info(f"德安航空使用的机场代码: {', '.join(sorted(daily_air_airport_codes))}")
         
         # 检查Airports表中是否存在这些机场
-        cursor.execute("SELECT airport_id FROM Airports")
+        session.execute('airports.ids')
         existing_airports = set([row.airport_id for row in cursor.fetchall()])
         logger.info(f"数据库中已有 {len(existing_airports)} 个机场记录")
         
@@ -75,7 +77,7 @@ def check_airports():
             logger.warning(f"以下 {len(missing_airports)} 个机场代码在数据库中不存在: {', '.join(sorted(missing_airports))}")
             
             # 检查数据库中Airports表的列名
-            cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'Airports'")
+            session.execute('airports.columns')
             columns = [row.COLUMN_NAME for row in cursor.fetchall()]
             logger.info(f"Airports表的列名: {columns}")
             
@@ -125,7 +127,7 @@ def check_airports():
             logger.info("机场数据导入完成")
             
             # 重新检查以确认导入成功
-            cursor.execute("SELECT airport_id FROM Airports")
+            session.execute('airports.ids')
             updated_airports = set([row.airport_id for row in cursor.fetchall()])
             still_missing = daily_air_airport_codes - updated_airports
             
@@ -150,32 +152,23 @@ def check_airports():
 
 def check_airlines():
     """检查航空公司是否存在于数据库中"""
-    connection_string = os.getenv('DB_CONNECTION_STRING')
-    
-    if not connection_string:
-        logger.error("缺少数据库连接字符串环境变量 DB_CONNECTION_STRING")
-        return False
-    
     try:
         # 连接数据库
         logger.info("正在连接数据库...")
-        conn = pyodbc.connect(connection_string, timeout=30)
-        cursor = conn.cursor()
+        conn = connect()
+        session = Session(conn)
+        cursor = session.cursor
         logger.info("数据库连接成功！")
         
         # 检查Airlines表中是否存在德安航空
-        cursor.execute("SELECT airline_id FROM Airlines WHERE airline_id = 'DA'")
-        result = cursor.fetchone()
+        result = session.fetch_one('airlines.get', ('DA',))
         
         if not result:
             logger.warning("德安航空(DA)在数据库中不存在")
             
             # 插入德安航空数据
             try:
-                cursor.execute("""
-                INSERT INTO Airlines (airline_id, airline_name_en, airline_name_zh, created_at, updated_at)
-                VALUES (?, ?, ?, GETDATE(), GETDATE())
-                """, ('DA', 'Daily Air', '德安航空'))
+                session.execute('airlines.insert', ('DA', 'Daily Air', '德安航空'))
                 
                 conn.commit()
                 logger.info("已导入德安航空数据")
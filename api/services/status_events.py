@@ -0,0 +1,273 @@
+"""
+航班狀態變更事件中心
+將即時更新器寫入的延誤、取消等狀態變更推送給 SSE 訂閱者
+
+所有訂閱者共用同一個事件環形緩衝區與條件變數，閒置的訂閱者只佔用一個等待中的執行緒，
+不需要各自的佇列；發佈事件只需附加到緩衝區並喚醒等待者。
+緩衝區同時保留最近的事件，讓斷線重連的用戶端可以依 Last-Event-ID 補收遺漏的事件。
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from api.services.flight_status_cache import STATUS_FIELDS, make_status_key
+
+logger = logging.getLogger('status_events')
+
+# 已知航班狀態的最大筆數，用於比對狀態是否變更 (需容納輪詢器啟動時載入的監看範圍)
+MAX_KNOWN_STATUSES = int(os.getenv('STATUS_KNOWN_MAX', '50000'))
+
+
+class StatusEventHub:
+    """航班狀態變更事件的扇出中心"""
+
+    def __init__(self, history_size: int = 1000):
+        """
+        初始化事件中心
+
+        參數:
+            history_size: 保留供補收的最近事件數量
+        """
+        self._events: deque = deque(maxlen=history_size)
+        self._condition = threading.Condition()
+        # 以毫秒時間戳作為起始編號，重新啟動後的事件編號仍大於舊事件
+        self._last_id = int(time.time() * 1000)
+        self._known: 'OrderedDict[Tuple[str, str], Tuple]' = OrderedDict()
+        self._known_lock = threading.Lock()
+
+    @property
+    def last_event_id(self) -> int:
+        """最新的事件編號"""
+        return self._last_id
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """
+        發佈事件並喚醒所有訂閱者
+
+        參數:
+            event: 事件內容
+
+        返回:
+            事件編號
+        """
+        with self._condition:
+            self._last_id += 1
+            event = dict(event, event_id=self._last_id)
+            self._events.append(event)
+            self._condition.notify_all()
+            return self._last_id
+
+    def remember(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        記錄航班目前的狀態作為比對基準，不發佈事件
+
+        參數:
+            entries: 航班狀態列表，格式同 publish_changes
+
+        返回:
+            記錄的筆數
+        """
+        count = 0
+        with self._known_lock:
+            for entry in entries:
+                key = make_status_key(entry['flight_number'], entry['date'])
+                self._known[key] = tuple(entry.get(field) for field in STATUS_FIELDS)
+                self._known.move_to_end(key)
+                count += 1
+
+            while len(self._known) > MAX_KNOWN_STATUSES:
+                self._known.popitem(last=False)
+        return count
+
+    def publish_changes(self, entries: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        比對航班狀態，只發佈真正有變化的項目
+
+        參數:
+            entries: 航班狀態列表，需包含 flight_number、date 與狀態欄位；
+                     可附帶 previous (變更前的狀態欄位值) 供第一次看到的航班比對
+
+        返回:
+            已發佈的事件列表
+        """
+        changed = []
+        with self._known_lock:
+            for entry in entries:
+                key = make_status_key(entry['flight_number'], entry['date'])
+                current = tuple(entry.get(field) for field in STATUS_FIELDS)
+                baseline = self._known.get(key, entry.get('previous'))
+
+                self._known[key] = current
+                self._known.move_to_end(key)
+                if baseline is not None and tuple(baseline) != current:
+                    changed.append((entry, tuple(baseline)))
+
+            while len(self._known) > MAX_KNOWN_STATUSES:
+                self._known.popitem(last=False)
+
+        published = []
+        for entry, baseline in changed:
+            event = {key: value for key, value in entry.items() if key != 'previous'}
+            event['previous_status'] = baseline[STATUS_FIELDS.index('flight_status')]
+            event['changed_at'] = datetime.datetime.now().isoformat()
+            event_id = self.publish(event)
+            published.append(dict(event, event_id=event_id))
+
+        if published:
+            logger.info(f"發佈 {len(published)} 個航班狀態變更事件")
+        return published
+
+    def events_after(self, last_id: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        取得指定編號之後的事件
+
+        參數:
+            last_id: 用戶端最後收到的事件編號
+
+        返回:
+            (事件列表, 是否完整) 若要求的事件已不在緩衝區中則為不完整，用戶端應重新取得完整狀態
+        """
+        with self._condition:
+            events = [event for event in self._events if event['event_id'] > last_id]
+            oldest = self._events[0]['event_id'] if self._events else self._last_id + 1
+            complete = last_id >= oldest - 1 and last_id <= self._last_id
+            return events, complete
+
+    def wait_for_events(self, last_id: int, timeout: float) -> List[Dict[str, Any]]:
+        """
+        等待指定編號之後的新事件
+
+        參數:
+            last_id: 已收到的最後事件編號
+            timeout: 最長等待秒數
+
+        返回:
+            新事件列表，逾時則為空列表
+        """
+        with self._condition:
+            if self._last_id <= last_id:
+                self._condition.wait(timeout)
+            if self._last_id <= last_id:
+                return []
+            return [event for event in self._events if event['event_id'] > last_id]
+
+
+class StatusChangePoller:
+    """
+    定期輪詢資料庫中最近更新的航班，將其他行程 (如排程執行的即時更新器) 寫入的變更發佈到事件中心
+    變更紀錄不含變更前的狀態，因此第一次輪詢前先載入監看範圍內所有航班目前的狀態作為比對基準，
+    否則本行程啟動後才第一次出現的航班 (如匯入後第一次被取消) 沒有基準可比對而不會發佈
+    """
+
+    def __init__(
+        self,
+        hub: StatusEventHub,
+        fetch_changes: Callable[[datetime.datetime], List[Dict[str, Any]]],
+        interval: float = 5.0,
+        fetch_baseline: Optional[Callable[[], List[Dict[str, Any]]]] = None
+    ):
+        """
+        初始化輪詢器
+
+        參數:
+            hub: 事件中心
+            fetch_changes: 取得 updated_at 不早於指定時間之航班的函數，每筆需包含 updated_at；
+                           重複取得的航班若狀態未變不會再次發佈
+            interval: 輪詢間隔(秒)
+            fetch_baseline: 取得監看範圍內所有航班目前狀態的函數，第一次輪詢前載入作為比對基準
+        """
+        self.hub = hub
+        self.fetch_changes = fetch_changes
+        self.fetch_baseline = fetch_baseline
+        self.interval = interval
+        self._baseline_loaded = fetch_baseline is None
+        # 從今天開始載入，已有基準的航班狀態未變時不會發佈事件
+        self.watermark = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def poll_once(self) -> int:
+        """
+        執行一次輪詢
+
+        返回:
+            發佈的事件數量
+        """
+        if not self._baseline_loaded:
+            # 載入失敗時拋出例外，下次輪詢重試，避免在沒有基準的情況下漏掉變更
+            count = self.hub.remember(
+                {key: value for key, value in row.items() if key != 'updated_at'} for row in self.fetch_baseline()
+            )
+            self._baseline_loaded = True
+            logger.info(f"已載入 {count} 個航班狀態作為比對基準")
+
+        rows = self.fetch_changes(self.watermark)
+        if not rows:
+            return 0
+
+        timestamps = [row['updated_at'] for row in rows if row.get('updated_at')]
+        if timestamps:
+            self.watermark = max(timestamps)
+        entries = [{key: value for key, value in row.items() if key != 'updated_at'} for row in rows]
+        return len(self.hub.publish_changes(entries))
+
+    def start(self) -> None:
+        """在背景執行緒中開始輪詢 (重複呼叫不會建立多個執行緒)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='status-change-poller', daemon=True)
+            self._thread.start()
+            logger.info(f"航班狀態輪詢已啟動，間隔 {self.interval} 秒")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"輪詢航班狀態變更時出錯: {e}")
+            time.sleep(self.interval)
+
+
+def event_matches(event: Dict[str, Any], flights: set, routes: set, airports: set) -> bool:
+    """
+    判斷事件是否符合訂閱條件 (未指定任何條件時全部符合)
+
+    參數:
+        event: 事件內容
+        flights: 訂閱的航班編號
+        routes: 訂閱的航線 {(出發機場, 到達機場)}
+        airports: 訂閱的機場 (出發或到達)
+    """
+    if not flights and not routes and not airports:
+        return True
+
+    departure = event.get('departure_airport_code')
+    arrival = event.get('arrival_airport_code')
+    return (
+        event.get('flight_number') in flights
+        or (departure, arrival) in routes
+        or departure in airports
+        or arrival in airports
+    )
+
+
+# 單例實現
+_hub_instance = None
+
+
+def get_event_hub() -> StatusEventHub:
+    """
+    獲取航班狀態事件中心的單例實例
+
+    返回:
+        事件中心實例
+    """
+    global _hub_instance
+    if _hub_instance is None:
+        _hub_instance = StatusEventHub(history_size=int(os.getenv('STATUS_EVENT_HISTORY', '1000')))
+    return _hub_instance
@@ -18,6 +18,7 @@ sys.path.append(str(project_root))
 
 from api.services.external_apis import (
     ensure_cache_dir,
+    get_cache_stats,
     get_cache_key,
     generate_mock_flight_data,
     save_to_cache,
@@ -95,12 +96,15 @@ def test_cache_functionality():
     cached_data = get_from_cache(endpoint, test_params)
     logger.info(f"從緩存獲取數據: {cached_data['airline']['name'] if cached_data else '未找到'}")
     
-    # 檢查緩存目錄中的文件
-    files = list(cache_dir.glob('*.pkl'))
-    logger.info(f"緩存目錄中有 {len(files)} 個文件")
+    # 更換API金鑰後應該仍然命中同一筆緩存
+    rotated_data = get_from_cache(endpoint, dict(test_params, access_key='rotated_key'))
+    logger.info(f"更換金鑰後從緩存獲取數據: {'成功' if rotated_data else '未找到'}")
+    
+    # 檢查緩存統計
+    logger.info(f"緩存統計: {get_cache_stats()}")
     
     # 驗證數據是否正確保存和檢索
-    is_cached_correctly = (cached_data and cached_data['airline']['name'] == 'China Airlines')
+    is_cached_correctly = (cached_data and cached_data['airline']['name'] == 'China Airlines' and rotated_data == cached_data)
     logger.info(f"緩存功能測試結果: {'成功' if is_cached_correctly else '失敗'}")
     return is_cached_correctly
 
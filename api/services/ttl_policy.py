@@ -0,0 +1,169 @@
+"""
+AviationStack 回應快取的有效時間策略
+依端點與 flight_date 距今天的天數分組：過去的航班不會再變動、今天的航班狀態每幾分鐘就會改變、
+未來的班表數小時才更新一次，航空公司與機場等參考資料則數週才需要重新取得
+"""
+import datetime
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger('ttl_policy')
+
+# 分組名稱
+REFERENCE = 'reference'   # 航空公司、機場等參考資料端點
+PAST = 'past'             # flight_date 早於昨天
+TODAY = 'today'           # flight_date 為今天或昨天 (跨午夜的航班仍可能更新)
+FUTURE = 'future'         # flight_date 晚於今天
+LIVE = 'live'             # 未指定日期的即時查詢
+
+BUCKETS = (REFERENCE, PAST, TODAY, FUTURE, LIVE)
+
+# 負面快取的錯誤類別
+EMPTY = 'empty'             # 查詢成功但沒有資料
+PLAN_ERROR = 'plan_error'   # 目前方案不支援的功能 (HTTP 403)
+AUTH_ERROR = 'auth_error'   # API金鑰無效 (HTTP 401)，只對同一把金鑰有效
+
+NEGATIVE_CLASSES = (EMPTY, PLAN_ERROR, AUTH_ERROR)
+
+# 預設有效時間(秒)
+DEFAULT_TTLS = {
+    REFERENCE: 28 * 24 * 60 * 60,
+    PAST: 365 * 24 * 60 * 60,
+    TODAY: 10 * 60,
+    FUTURE: 6 * 60 * 60,
+    LIVE: 5 * 60
+}
+
+# 負面快取的預設有效時間(秒)；沒有資料的結果不會超過所屬分組的有效時間
+DEFAULT_NEGATIVE_TTLS = {
+    EMPTY: 6 * 60 * 60,
+    PLAN_ERROR: 7 * 24 * 60 * 60,
+    AUTH_ERROR: 60 * 60
+}
+
+# 依日期查詢的端點與日期參數名稱
+DATE_PARAMS = ('flight_date', 'date')
+
+
+class TTLPolicy:
+    """
+    決定每個請求所屬的分組與有效時間，並統計各分組的命中率
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        reference_endpoints: Iterable[str] = ('airlines', 'airports', 'airplanes', 'aircraft_types', 'cities', 'countries', 'taxes'),
+        negative_ttls: Optional[Dict[str, float]] = None
+    ):
+        """
+        初始化有效時間策略
+
+        參數:
+            ttls: {分組名稱: 有效時間(秒)}，未指定的分組使用預設值
+            reference_endpoints: 視為參考資料的端點
+            negative_ttls: {錯誤類別: 負面快取有效時間(秒)}，未指定的類別使用預設值
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.negative_ttls = dict(DEFAULT_NEGATIVE_TTLS)
+        if negative_ttls:
+            self.negative_ttls.update(negative_ttls)
+        self.reference_endpoints = set(reference_endpoints)
+        # {分組名稱: [命中, 陳舊命中, 未命中]}
+        self._counts = {bucket: [0, 0, 0] for bucket in BUCKETS}
+        # {錯誤類別: [寫入, 命中]}
+        self._negative_counts = {error_class: [0, 0] for error_class in NEGATIVE_CLASSES}
+        self._lock = threading.Lock()
+
+    def bucket(self, endpoint: str, params: Dict[str, Any], today: Optional[datetime.date] = None) -> str:
+        """
+        取得請求所屬的分組
+
+        參數:
+            endpoint: API端點
+            params: 查詢參數
+            today: 今天的日期 (預設為系統日期)
+
+        返回:
+            分組名稱
+        """
+        if endpoint in self.reference_endpoints:
+            return REFERENCE
+
+        date_str = next((params[name] for name in DATE_PARAMS if params.get(name)), None)
+        if not date_str:
+            return LIVE
+        try:
+            flight_date = datetime.datetime.strptime(str(date_str)[:10], '%Y-%m-%d').date()
+        except ValueError:
+            logger.warning(f"無法解析航班日期: {date_str}")
+            return LIVE
+
+        days = (flight_date - (today or datetime.date.today())).days
+        if days < -1:
+            return PAST
+        if days <= 0:
+            return TODAY
+        return FUTURE
+
+    def ttl(self, bucket: str) -> float:
+        """取得分組的有效時間(秒)"""
+        return self.ttls[bucket]
+
+    def negative_ttl(self, error_class: str, bucket: str) -> float:
+        """
+        取得負面快取的有效時間(秒)
+
+        參數:
+            error_class: 錯誤類別
+            bucket: 請求所屬的分組
+        """
+        ttl = self.negative_ttls[error_class]
+        if error_class == EMPTY:
+            # 今天的航班可能稍後才出現，沒有資料的結果不應比有資料的結果保留更久
+            ttl = min(ttl, self.ttls[bucket])
+        return ttl
+
+    def record_negative(self, error_class: str, hit: bool) -> None:
+        """記錄一次負面快取的寫入或命中"""
+        with self._lock:
+            self._negative_counts[error_class][1 if hit else 0] += 1
+
+    def record(self, bucket: str, hit: bool, stale: bool = False) -> None:
+        """
+        記錄一次快取查詢結果
+
+        參數:
+            bucket: 分組名稱
+            hit: 是否命中
+            stale: 命中的是否為已過期、於背景刷新的資料
+        """
+        with self._lock:
+            self._counts[bucket][(1 if stale else 0) if hit else 2] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """取得各分組的有效時間與命中率"""
+        with self._lock:
+            counts = {bucket: list(count) for bucket, count in self._counts.items()}
+        stats = {}
+        for bucket, (hits, stale_hits, misses) in counts.items():
+            total = hits + stale_hits + misses
+            stats[bucket] = {
+                'ttl': self.ttls[bucket],
+                'hits': hits,
+                'stale_hits': stale_hits,
+                'misses': misses,
+                'hit_rate': round((hits + stale_hits) / total, 4) if total else 0.0
+            }
+        return stats
+
+    def get_negative_stats(self) -> Dict[str, Dict[str, Any]]:
+        """取得各錯誤類別的負面快取有效時間、寫入與命中次數"""
+        with self._lock:
+            return {
+                error_class: {'ttl': self.negative_ttls[error_class], 'stored': stored, 'hits': hits}
+                for error_class, (stored, hits) in self._negative_counts.items()
+            }
@@ -0,0 +1,92 @@
+"""
+啟動預熱
+部署或重新啟動後，依序建立資料庫連接、載入參考資料並預取熱門航線，
+完成前 /ready 回報尚未就緒，讓負載平衡器不將流量導向尚未預熱的 worker
+"""
+import datetime
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('warmup')
+
+
+class WarmUp:
+    """
+    依序執行預熱步驟；個別步驟失敗只會記錄錯誤，不影響後續步驟，全部執行完畢即視為就緒
+    """
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable[[], Any]]] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[datetime.datetime] = None
+        self.finished_at: Optional[datetime.datetime] = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def add_step(self, name: str, step: Callable[[], Any]) -> None:
+        """
+        加入預熱步驟
+
+        參數:
+            name: 步驟名稱
+            step: 執行步驟的函數，返回值會記錄在狀態中 (需可序列化為JSON)
+        """
+        self.steps.append((name, step))
+
+    @property
+    def ready(self) -> bool:
+        """是否已完成預熱"""
+        return self._done.is_set()
+
+    def run(self) -> None:
+        """在目前執行緒中依序執行所有步驟"""
+        self.started_at = datetime.datetime.now()
+        for name, step in self.steps:
+            started = time.perf_counter()
+            try:
+                result = {'status': 'ok', 'result': step()}
+            except Exception as e:
+                logger.error(f"預熱步驟 {name} 失敗: {e}")
+                result = {'status': 'error', 'error': str(e)}
+            result['seconds'] = round(time.perf_counter() - started, 3)
+            self.results[name] = result
+            logger.info(f"預熱步驟 {name} 完成 ({result['status']}，{result['seconds']} 秒)")
+        self.finished_at = datetime.datetime.now()
+        self._done.set()
+        logger.info(f"預熱完成，耗時 {(self.finished_at - self.started_at).total_seconds():.2f} 秒")
+
+    def start(self) -> None:
+        """在背景執行緒中執行預熱 (重複呼叫不會重複執行)"""
+        with self._lock:
+            if self._thread is not None or self.ready:
+                return
+            self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+            self._thread.start()
+
+    def skip(self) -> None:
+        """不執行預熱，直接標記為就緒"""
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待預熱完成
+
+        參數:
+            timeout: 最長等待秒數
+
+        返回:
+            是否已完成
+        """
+        return self._done.wait(timeout)
+
+    def get_status(self) -> Dict[str, Any]:
+        """取得預熱狀態"""
+        return {
+            'ready': self.ready,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'steps': {name: dict(self.results[name]) for name, _ in self.steps if name in self.results}
+        }
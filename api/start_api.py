@@ -10,8 +10,21 @@ from pathlib import Path
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
-# 導入Flask應用
-from app import app
+# 導入Flask應用 (匯入時不會啟動預熱，由 wait_for_warmup 啟動)
+from app import WARMUP_ENABLED, WARMUP_TIMEOUT, app, start_background_services, warmup
+
+def wait_for_warmup():
+    """啟動預熱與背景更新，等待預熱完成後再開始接受請求，並顯示各步驟結果"""
+    start_background_services()
+    if not WARMUP_ENABLED:
+        print("已停用預熱 (WARMUP_ENABLED=false)")
+        return
+    print("正在預熱資料庫連接、參考資料與熱門航線...")
+    if not warmup.wait(WARMUP_TIMEOUT * 2):
+        print("預熱逾時，先開始接受請求 (/ready 會在預熱完成後才返回就緒)")
+        return
+    for name, result in warmup.get_status()['steps'].items():
+        print(f"  {name}: {result['status']} ({result['seconds']} 秒)")
 
 if __name__ == '__main__':
     # 檢查是否為生產環境
@@ -21,8 +34,12 @@ if __name__ == '__main__':
     if is_production:
         # 生產環境 - 使用gunicorn或其他WSGI服務器（需另外安裝）
         print("API服務正在生產模式下啟動...")
+        wait_for_warmup()
         # 這裡可以添加生產環境的配置
     else:
         # 開發環境 - 使用Flask內建的開發伺服器
         print("API服務正在開發模式下啟動...")
+        # 除錯模式的重新載入器會先啟動只負責監看檔案的行程，只在實際處理請求的子行程中預熱
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            wait_for_warmup()
         app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
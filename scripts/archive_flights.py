@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+歷史航班封存命令行工具
+
+將起飛時間早於保留天數的航班從 Flights 移到 FlightsArchive，並刪除過期的航班變更紀錄，建議每日排程執行一次
+
+使用方法:
+    python archive_flights.py
+    python archive_flights.py --days 60 --batch-size 2000
+
+    參數:
+        --days: Flights 保留的天數 (預設為環境變數 FLIGHTS_ARCHIVE_AFTER_DAYS 或30)
+        --batch-size: 每批移動的記錄數
+"""
+
+import sys
+import logging
+import argparse
+import datetime
+from pathlib import Path
+
+# 添加專案根目錄到路徑以便導入模組
+current_dir = Path(__file__).resolve().parent
+project_root = current_dir.parent
+sys.path.append(str(project_root))
+
+from api.database.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_cutoff, archive_flights
+from api.database.changes import purge_flight_changes
+
+# 設置日誌
+def setup_logging():
+    """設置日誌配置"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_dir = project_root / "logs"
+    log_dir.mkdir(exist_ok=True)
+
+    log_file = log_dir / f"archive_flights_{timestamp}.log"
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
+    return logging.getLogger('archive_flights')
+
+def main():
+    """主函數，處理命令行參數並執行封存"""
+    logger = setup_logging()
+
+    parser = argparse.ArgumentParser(description='歷史航班封存工具')
+    parser.add_argument('--days', type=int, help='Flights 保留的天數', default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--batch-size', type=int, help='每批移動的記錄數', default=ARCHIVE_BATCH_SIZE)
+
+    args = parser.parse_args()
+
+    if args.days < 1:
+        logger.error(f"保留天數至少為1天: {args.days}")
+        return 1
+
+    logger.info(f"開始封存起飛時間早於 {archive_cutoff(args.days):%Y-%m-%d} 的航班")
+
+    try:
+        archived = archive_flights(after_days=args.days, batch_size=args.batch_size)
+    except Exception as e:
+        logger.error(f"封存航班時出錯: {e}")
+        return 1
+
+    logger.info(f"共封存 {archived} 個航班")
+
+    # 快取失效只需要最近的變更紀錄
+    try:
+        purged = purge_flight_changes()
+        logger.info(f"刪除 {purged} 筆過期的航班變更紀錄")
+    except Exception as e:
+        logger.error(f"刪除航班變更紀錄時出錯: {e}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,7 @@
         --api-calls: 每天最大API調用次數 (默認為10)
         --no-cache: 禁用緩存
         --no-mock: 禁用模擬數據
+        --no-plan: 不規劃查詢，依固定順序查詢優先航線與航空公司
 """
 import os
 import sys
@@ -30,6 +31,7 @@ from api.services.aviation_stack_importer import (
     import_multiple_days,
     get_import_statistics
 )
+from api.services.external_apis import get_quota_status
 
 # 設置日誌
 def setup_logging():
@@ -62,7 +64,9 @@ def main():
     parser.add_argument('--api-calls', type=int, help='每天最大API調用次數', default=10)
     parser.add_argument('--no-cache', action='store_true', help='禁用緩存')
     parser.add_argument('--no-mock', action='store_true', help='禁用模擬數據')
+    parser.add_argument('--no-plan', action='store_true', help='不依已涵蓋的航線規劃查詢')
     parser.add_argument('--stats', action='store_true', help='顯示導入統計資訊')
+    parser.add_argument('--quota', action='store_true', help='顯示本期API配額用量與推算的用盡日期')
     
     args = parser.parse_args()
     
@@ -76,6 +80,16 @@ def main():
         logger.error(f"無效的日期格式: {start_date}，應為 YYYY-MM-DD")
         return 1
     
+    # 如果只請求配額狀態
+    if args.quota:
+        status = get_quota_status()
+        logger.info(f"配額期間 {status['period_start']} ~ {status['period_end']}: "
+                    f"已用 {status['used']}/{status['monthly_limit']}，剩餘 {status['remaining']}")
+        logger.info(f"今日已用 {status['used_today']}/{status['daily_budget']}，各工作: {status['jobs_today']}")
+        logger.info(f"最近平均每日 {status['burn_rate_per_day']} 次，"
+                    f"推算用盡日期: {status['projected_exhaustion'] or '本期內不會用盡'}")
+        return 0
+    
     # 如果只請求統計資訊
     if args.stats:
         logger.info("獲取導入統計資訊...")
@@ -113,7 +127,8 @@ def main():
             flights_per_day=args.limit,
             max_api_calls_per_day=args.api_calls,
             use_cache=not args.no_cache,
-            use_mock_data=not args.no_mock
+            use_mock_data=not args.no_mock,
+            use_planner=not args.no_plan
         )
         
         # 顯示每天的導入結果
@@ -137,7 +152,8 @@ def main():
             limit=args.limit,
             max_api_calls=args.api_calls,
             use_cache=not args.no_cache,
-            use_mock_data=not args.no_mock
+            use_mock_data=not args.no_mock,
+            use_planner=not args.no_plan
         )
         
         success_rate = (successful / total * 100) if total > 0 else 0